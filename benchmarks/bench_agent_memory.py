@@ -0,0 +1,97 @@
+"""
+Latency the agent memory adds to a chat turn, the in-process InMemoryStore against the persistent SQLiteMemoryStore.
+
+Writes --history memories the way the langmem manage memory tool does, then times:
+    - put    : one memory write, which a turn waits for
+    - search : one memory search over the whole history
+with fake embeddings that take --embed-latency-ms per request, standing in for the embedding API. The InMemoryStore embeds
+on every write and keeps every memory, the SQLiteMemoryStore embeds after the write returns and keeps at most --max-items
+memories per namespace, so its search latency stops growing with the history.
+
+Usage:
+    python -m benchmarks.bench_agent_memory --history 100 1000 5000 --embed-latency-ms 150
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langgraph.store.memory import InMemoryStore
+
+from benchmarks.bench_mcp_transport import percentile
+from src.mcp.memory_store import SQLiteMemoryStore
+
+NAMESPACE = ("memories",)
+DIMENSIONS = 1536
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    """
+    Fake embeddings taking a fixed time per request, whatever the number of texts
+    """
+    latency: float = 0.0
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(self.latency)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self.embed_query(text)
+
+
+async def fill(store, history: int):
+    #Written in batches, the per-write embedding latency would make filling the InMemoryStore too slow
+    for first in range(0, history, 500):
+        await asyncio.gather(*[
+            store.aput(NAMESPACE, str(uuid.uuid4()), {"content": f"The user mentioned fact number {n}"})
+            for n in range(first, min(first + 500, history))
+        ])
+    if isinstance(store, SQLiteMemoryStore):
+        await store.flush()
+
+
+async def timed(coroutine_factory, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coroutine_factory()
+        timings.append(time.perf_counter() - start)
+    return percentile(timings, 50) * 1000
+
+
+async def run(args):
+    embeddings = SlowEmbeddings(size=DIMENSIONS, latency=args.embed_latency_ms / 1000)
+    print(f"{args.embed_latency_ms} ms per embedding request, median of {args.repeat} operations")
+    print(f"{'store':>12} {'history':>8} {'kept':>6} {'put ms':>8} {'search ms':>10}")
+    for history in args.history:
+        directory = tempfile.mkdtemp()
+        stores = {
+            "in-memory": InMemoryStore(index={"dims": DIMENSIONS, "embed": embeddings}),
+            "sqlite": SQLiteMemoryStore(os.path.join(directory, "memory.sqlite3"), embeddings, max_items=args.max_items, flush_interval=0.05),
+        }
+        for name, store in stores.items():
+            await fill(store, history)
+            kept = len(await store.asearch(NAMESPACE, limit=history))
+            put = await timed(lambda: store.aput(NAMESPACE, str(uuid.uuid4()), {"content": "The user asked about expiring documents"}), args.repeat)
+            search = await timed(lambda: store.asearch(NAMESPACE, query="expiring documents", limit=5), args.repeat)
+            print(f"{name:>12} {history:>8} {kept:>6} {put:>8.2f} {search:>10.2f}")
+            if isinstance(store, SQLiteMemoryStore):
+                store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history", type=int, nargs="+", default=[100, 1000, 5000], help="Memories written before timing")
+    parser.add_argument("--max-items", type=int, default=1000, help="Memories kept per namespace by the SQLiteMemoryStore")
+    parser.add_argument("--embed-latency-ms", type=float, default=150)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Tokens per retrieve tool result, the repr of the retrieved Documents the tool used to return against the assembled context.
+
+Ingests a synthetic corpus (benchmarks.corpus) into a temporary vector store with the fake embeddings, plus --copies of
+some of its files under other names, as users upload the same contract twice. Hybrid retrieval is used so the chunks found
+are about the question, the fake embeddings alone rank at random. For every question of the corpus, reports:
+    - tokens of the tool result before (f"Context: {docs}") and after (context_assembly.assemble)
+    - whether the page answering the question is still cited after, among the questions where it was retrieved
+    - the time assembling takes
+Token counts use tiktoken when its encoding can be loaded, the 4 characters per token estimate otherwise.
+
+Usage:
+    python -m benchmarks.bench_context_assembly --docs 20 --pages 20 --k 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.corpus import make_corpus
+
+
+async def run(args, corpus: str):
+    #Imported once the environment of the temporary store is set, the settings are read on import
+    from benchmarks.bench_mcp_transport import percentile
+    from src.services.vector_store import context_assembly, retrieval, vector_store_ops
+    from src.services.vector_store.context_assembly import count_tokens
+
+    filenames = sorted(name for name in os.listdir(corpus) if name.endswith(".pdf"))
+    for n, filename in enumerate(filenames):
+        metadata = {"filename": filename, "content_hash": filename, "expiry date": "9999-12-31T00:00:00", "expiry_ts": 253402300799}
+        await vector_store_ops.embed_and_store(os.path.join(corpus, filename), metadata)
+        if n < args.copies:
+            #Same content under another name, its chunks are copied from the first upload
+            await vector_store_ops.embed_and_store(os.path.join(corpus, filename), metadata | {"filename": f"copy-of-{filename}"})
+
+    with open(os.path.join(corpus, "questions.json")) as f:
+        questions = json.load(f)
+
+    before, after, timings = [], [], []
+    retrieved = kept = 0
+    for entry in questions:
+        docs = await retrieval.retrieve(entry["question"], args.k)
+        start = time.perf_counter()
+        context = context_assembly.assemble(docs, args.budget)
+        timings.append(time.perf_counter() - start)
+        before.append(count_tokens(f"Context: {docs}"))
+        after.append(count_tokens(f"Context:\n{context}"))
+        citation = f"{entry['filename']} p.{entry['page'] + 1}"
+        if any(doc.metadata.get("filename") == entry["filename"] and doc.metadata.get("page") == entry["page"] for doc in docs):
+            retrieved += 1
+            kept += citation in context
+
+    print(f"{len(questions)} questions, {args.k} chunks each, budget of {args.budget} tokens, {args.copies} duplicated files")
+    print(f"{'':>7} {'mean':>7} {'p50':>7} {'max':>7}")
+    for name, values in (("before", before), ("after", after)):
+        print(f"{name:>7} {sum(values) / len(values):>7.0f} {percentile(values, 50):>7.0f} {max(values):>7.0f}")
+    print(f"tokens per tool result: {sum(after) / sum(before):.1%} of before")
+    print(f"answering page cited after assembly: {kept}/{retrieved} of the questions where it was retrieved")
+    print(f"assembly: {percentile(timings, 50) * 1000:.2f} ms p50, {max(timings) * 1000:.2f} ms max")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=5, help="Files uploaded a second time under another name")
+    parser.add_argument("--k", type=int, default=8, help="Chunks retrieved per question")
+    parser.add_argument("--budget", type=int, default=1500, help="Tokens of assembled context per question")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    vector_db = os.path.join(directory, "vector_db")
+    os.environ |= {
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_EMBEDDING_DIMENSIONS": "256",
+        "EMBEDDING_CACHE_PATH": os.path.join(directory, "embeddings.sqlite3"),
+        "VECTOR_DB_DIR": vector_db,
+        "KEYWORD_INDEX_PATH": os.path.join(vector_db, "keyword_index.sqlite3"),
+        "NUMPY_STORE_DIR": os.path.join(vector_db, "numpy_store"),
+        "FULL_VECTOR_STORE_PATH": os.path.join(vector_db, "full_vectors.sqlite3"),
+        "VECTOR_BACKEND": "numpy",
+        "RETRIEVAL_MODE": "hybrid",
+    }
+    try:
+        corpus = os.path.join(directory, "corpus")
+        make_corpus(corpus, args.docs, args.pages)
+        asyncio.run(run(args, corpus))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
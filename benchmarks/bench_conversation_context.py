@@ -0,0 +1,123 @@
+"""
+Prompt size of a long conversation, the full Gradio history against the token-budgeted ConversationContext.
+
+Plays a synthetic conversation of --turns turns (questions of about --user-tokens tokens, answers of about --assistant-tokens
+tokens) and reports, every --every turns:
+    - prompt  : tokens of the messages sent for the turn
+    - cached  : tokens of the longest message prefix shared with the previous turn's prompt, what a provider prompt cache can reuse
+    - build   : time spent building the messages, including waiting on summaries
+Summaries are made by a fake summarizer taking --summary-latency-ms and returning about CONTEXT_SUMMARY_MAX_TOKENS tokens,
+unless --live is given, which summarizes with CONTEXT_SUMMARY_MODEL and also sends every prompt to --model to report the
+provider's prompt tokens, cached tokens and latency (needs OPENAI_API_KEY, costs money).
+
+Usage:
+    python -m benchmarks.bench_conversation_context --turns 200 --every 20
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from src.core.config.settings import settings
+from src.mcp.conversation_context import ConversationContext, count_tokens, message_tokens, summarize_with_llm
+
+SYSTEM_PROMPT = "You are an AI assistant that can remember all conversation in memory. Store every message in memory"
+
+WORDS = (
+    "document contract expiry invoice clause renewal payment supplier report quarter summary policy section page "
+    "deadline amount customer agreement warranty delivery schedule review approval budget revision annex"
+).split()
+
+
+def sentence(rng: random.Random, tokens: int) -> str:
+    #About one token per word
+    return " ".join(rng.choice(WORDS) for _ in range(tokens)).capitalize() + "."
+
+
+def shared_prefix_tokens(previous, messages) -> int:
+    shared = 0
+    for before, after in zip(previous, messages):
+        if before != after:
+            break
+        shared += message_tokens([after])
+    return shared
+
+
+def fake_summarizer(latency: float):
+    async def summarize(summary, messages):
+        await asyncio.sleep(latency)
+        words = (summary + " " + " ".join(message["content"] for message in messages)).split()[-settings.CONTEXT_SUMMARY_MAX_TOKENS:]
+        while count_tokens(" ".join(words)) > settings.CONTEXT_SUMMARY_MAX_TOKENS:
+            words = words[len(words) // 10 + 1:]
+        return " ".join(words)
+    return summarize
+
+
+async def run(args):
+    rng = random.Random(0)
+    summarize = summarize_with_llm if args.live else fake_summarizer(args.summary_latency_ms / 1000)
+    context = ConversationContext(
+        SYSTEM_PROMPT, summarize, history_budget=args.budget, keep_ratio=settings.CONTEXT_KEEP_RATIO, summary_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS
+    )
+    model = None
+    if args.live:
+        from langchain_openai import ChatOpenAI
+        model = ChatOpenAI(model=args.model, max_tokens=args.assistant_tokens)
+
+    history = []
+    previous = {"full": [], "managed": []}
+    totals = {"full": 0, "managed": 0}
+    print(f"{args.turns} turns, history budget of {args.budget} tokens, {'live' if args.live else 'fake'} summaries")
+    print(f"{'turn':>5} {'full prompt':>12} {'cached':>7} {'managed prompt':>15} {'cached':>7} {'build ms':>9}" + (f" {'api prompt':>11} {'api cached':>11} {'api ms':>7}" if args.live else ""))
+    for turn in range(1, args.turns + 1):
+        message = sentence(rng, args.user_tokens)
+
+        full = [{"role": "system", "content": SYSTEM_PROMPT}] + history + [{"role": "user", "content": message}]
+        start = time.perf_counter()
+        managed = await context.build("bench", history, message)
+        build = (time.perf_counter() - start) * 1000
+
+        live = ""
+        if model is not None:
+            start = time.perf_counter()
+            response = await model.ainvoke(managed)
+            usage = response.usage_metadata or {}
+            live = f" {usage.get('input_tokens', 0):>11} {usage.get('input_token_details', {}).get('cache_read', 0):>11} {(time.perf_counter() - start) * 1000:>7.0f}"
+            answer = response.content
+        else:
+            answer = sentence(rng, args.assistant_tokens)
+
+        sizes = {name: message_tokens(messages) for name, messages in (("full", full), ("managed", managed))}
+        cached = {name: shared_prefix_tokens(previous[name], messages) for name, messages in (("full", full), ("managed", managed))}
+        for name in totals:
+            totals[name] += sizes[name]
+        previous = {"full": full, "managed": managed}
+        if turn % args.every == 0 or turn == 1:
+            print(f"{turn:>5} {sizes['full']:>12} {cached['full']:>7} {sizes['managed']:>15} {cached['managed']:>7} {build:>9.2f}{live}")
+
+        context.after_turn("bench", history, message, answer)
+        history += [{"role": "user", "content": message}, {"role": "assistant", "content": answer}]
+        #Leaves the background summary the time a user takes to read the answer and type
+        await asyncio.sleep(args.think_ms / 1000)
+
+    print(f"prompt tokens over the conversation: full {totals['full']}, managed {totals['managed']} ({totals['managed'] / totals['full']:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--every", type=int, default=20, help="Report every this many turns")
+    parser.add_argument("--budget", type=int, default=settings.CONTEXT_HISTORY_TOKEN_BUDGET)
+    parser.add_argument("--user-tokens", type=int, default=60)
+    parser.add_argument("--assistant-tokens", type=int, default=250)
+    parser.add_argument("--summary-latency-ms", type=float, default=800)
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause between turns, summaries made meanwhile are not waited on")
+    parser.add_argument("--live", action="store_true", help="Summarize and answer with the OpenAI API")
+    parser.add_argument("--model", default="gpt-4o")
+    args = parser.parse_args()
+    count_tokens("warm up the tokenizer")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Recall, index size and query latency of truncated embeddings, with and without full-dimension re-ranking.
+
+For every --dims setting the chunks are stored in a NumpyVectorStore with their vectors truncated to that many dimensions,
+and their full vectors in the FullVectorStore, then queried through retrieval._vector_search like EMBEDDING_DIMENSIONS would:
+    - truncated : the top k of the truncated search
+    - reranked  : the top --candidates of the truncated search, re-ranked by their full vectors
+Recall@k is measured against an exact search over the full float32 vectors. The index size is the memory a query needs
+to keep hot, the side store is read only for the candidates of a query.
+
+Without --vectors, synthetic vectors are generated whose variance decreases along the dimensions, so like Matryoshka trained
+embeddings the leading dimensions carry most of the signal. Pass an .npy of real embeddings (chunks x dimensions) for numbers
+that hold for a corpus, the queries are then taken near random chunks of it.
+
+Usage:
+    python -m benchmarks.bench_embedding_dims --chunks 50000 --dims 256 512 1024 3072
+    python -m benchmarks.bench_embedding_dims --vectors embeddings.npy --dims 256 1024 --candidates 100
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_mcp_transport import percentile
+from src.core.config.settings import settings
+from src.services.vector_store import vector_store_ops, retrieval
+from src.services.vector_store.full_vectors import FullVectorStore, truncate
+from src.services.vector_store.numpy_store import NumpyVectorStore
+
+BATCH_SIZE = 1000
+CLUSTERS = 256
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_vectors(path: str, chunks: int, dimensions: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    decay = (np.arange(dimensions) + 1.0) ** -0.5
+    centers = rng.normal(size=(CLUSTERS, dimensions)).astype(np.float32) * decay
+    vectors = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(chunks, dimensions))
+    for start in range(0, chunks, 10_000):
+        end = min(start + 10_000, chunks)
+        noise = 0.6 * rng.normal(size=(end - start, dimensions)).astype(np.float32) * decay
+        vectors[start:end] = normalize(centers[rng.integers(0, CLUSTERS, size=end - start)] + noise)
+    vectors.flush()
+    return vectors
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for start in range(0, len(vectors), 10_000):
+        scores[:, start:start + 10_000] = queries @ normalize(np.asarray(vectors[start:start + 10_000])).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def file_mb(directory: str, prefix: str) -> float:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory) if name.startswith(prefix)) / 1024**2
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, dims: int, args, directory: str) -> dict:
+    store = NumpyVectorStore(os.path.join(directory, f"index-{dims}"), dtype=args.dtype)
+    full_store = FullVectorStore(os.path.join(directory, f"full-{dims}.sqlite3"))
+    full_dims = vectors.shape[1]
+    for start in range(0, len(vectors), BATCH_SIZE):
+        batch = np.asarray(vectors[start:start + BATCH_SIZE]).tolist()
+        ids = [str(row) for row in range(start, start + len(batch))]
+        filenames = [f"file-{row // 100}.pdf" for row in range(start, start + len(batch))]
+        store.upsert(ids, ids, truncate(batch, dims), [{"filename": filename} for filename in filenames])
+        if dims < full_dims:
+            full_store.add(ids, filenames, batch)
+
+    vector_store_ops.vector_store = store
+    vector_store_ops.full_vectors = full_store
+    results = {}
+    for mode, dimensions in (("truncated", 0), ("reranked", dims if dims < full_dims else 0)):
+        if mode == "reranked" and not dimensions:
+            results[mode] = results["truncated"]
+            continue
+        settings.EMBEDDING_DIMENSIONS = dimensions
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            vector = query.tolist() if dimensions else truncate([query.tolist()], dims)[0]
+            start = time.perf_counter()
+            docs = retrieval._vector_search(vector, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len({int(doc.id) for doc in docs} & set(expected.tolist()))
+        results[mode] = {"recall": hits / truth.size, "p50_ms": percentile(latencies, 50), "p99_ms": percentile(latencies, 99)}
+
+    results["index_mb"] = file_mb(store.directory, "vectors") + file_mb(store.directory, "scales")
+    results["side_mb"] = os.path.getsize(full_store.path) / 1024**2 if dims < full_dims else 0.0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", help=".npy file of real embeddings, synthetic vectors are generated when omitted")
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--full-dims", type=int, default=3072, help="Dimensions of the synthetic vectors")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1024, 1536, 3072])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_K)
+    parser.add_argument("--candidates", type=int, default=settings.RERANK_CANDIDATES, help="RERANK_CANDIDATES")
+    parser.add_argument("--dtype", choices=["int8", "float16"], default=settings.NUMPY_STORE_DTYPE)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        if args.vectors:
+            vectors = np.load(args.vectors, mmap_mode="r")
+        else:
+            vectors = synthetic_vectors(os.path.join(directory, "vectors.npy"), args.chunks, args.full_dims)
+        rng = np.random.default_rng(1)
+        near = np.asarray(vectors[np.sort(rng.choice(len(vectors), size=args.queries, replace=False))])
+        queries = normalize(normalize(near) + 0.6 / np.sqrt(vectors.shape[1]) * rng.normal(size=near.shape).astype(np.float32))
+        truth = exact_top_k(vectors, queries, args.k)
+        settings.RERANK_CANDIDATES = args.candidates
+
+        print(f"{len(vectors)} chunks of {vectors.shape[1]} dims, {args.queries} queries, k={args.k}, "
+              f"{args.candidates} re-ranked candidates, {args.dtype} index")
+        print(f"{'dims':>6} {'index MB':>9} {'side MB':>8} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7} {'reranked':>9} {'p50 ms':>7} {'p99 ms':>7}")
+        for dims in args.dims:
+            result = run(vectors, queries, truth, dims, args, directory)
+            truncated, reranked = result["truncated"], result["reranked"]
+            print(f"{dims:>6} {result['index_mb']:>9.1f} {result['side_mb']:>8.1f} {truncated['recall']:>7.3f} {truncated['p50_ms']:>7.2f} "
+                  f"{truncated['p99_ms']:>7.2f} {reranked['recall']:>9.3f} {reranked['p50_ms']:>7.2f} {reranked['p99_ms']:>7.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
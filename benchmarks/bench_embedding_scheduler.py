@@ -0,0 +1,84 @@
+"""
+Offline throughput test of the embedding scheduler: several concurrent ingestions embed their chunks through one
+scheduler backed by the deterministic fake embedding model, with simulated request latency and rate limiting.
+
+Usage:
+    python -m benchmarks.bench_embedding_scheduler --documents 20 --chunks 500 --concurrency 4
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.services.vector_store.embedding_scheduler import EmbeddingScheduler
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class SimulatedProvider(DeterministicFakeEmbedding):
+    """
+    Fake embedding model that takes `latency` seconds per request and rejects requests above `max_requests_per_second`
+    """
+    latency: float = 0.05
+    max_requests_per_second: float = 50.0
+    calls: int = 0
+    rejected: int = 0
+    window: list = []
+
+    async def aembed_documents(self, texts):
+        now = time.monotonic()
+        self.window = [t for t in self.window if now - t < 1.0] + [now]
+        if len(self.window) > self.max_requests_per_second:
+            self.rejected += 1
+            raise RateLimitError("429 Too Many Requests")
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.embed_documents(texts)
+
+
+async def run(args):
+    provider = SimulatedProvider(size=args.dimensions, latency=args.latency, max_requests_per_second=args.rate_limit)
+    scheduler = EmbeddingScheduler(
+        provider,
+        batch_size=args.batch_size,
+        max_batch_tokens=100_000,
+        max_concurrency=args.concurrency,
+        max_retries=8,
+        linger_seconds=0.02,
+    )
+
+    async def ingest(document: int):
+        texts = [f"document {document} chunk {n} " * 20 for n in range(args.chunks)]
+        vectors = await scheduler.embed(texts)
+        # Every ingestion must get back its own vectors, in order
+        assert vectors[0] == provider.embed_query(texts[0])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[ingest(document) for document in range(args.documents)])
+    elapsed = time.perf_counter() - start
+
+    total = args.documents * args.chunks
+    print(f"chunks embedded   : {total}")
+    print(f"seconds           : {elapsed:.2f}")
+    print(f"chunks/s          : {total / elapsed:.0f}")
+    print(f"provider requests : {provider.calls} ({provider.rejected} rate limited)")
+    print(f"scheduler         : {scheduler.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=float, default=50.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
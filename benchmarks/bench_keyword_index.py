@@ -0,0 +1,129 @@
+"""
+Size and speed of the BM25 keyword index at scale.
+
+Builds an index of N synthetic chunks (prose with part numbers and clause references mixed in), then reports build
+throughput, size on disk, time to reopen the index, query latency percentiles for identifier and natural language queries,
+and the peak resident memory of the process.
+
+Usage:
+    python -m benchmarks.bench_keyword_index --chunks 100000 --queries 500
+"""
+import argparse
+import itertools
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_mcp_transport import percentile
+from src.services.vector_store.keyword_index import KeywordIndex
+
+WORDS = (
+    "contract maintenance schedule inspection report asbestos survey building floor plan clause section annex tenant "
+    "landlord payment warranty replacement supplier delivery invoice safety certificate valve pump boiler ventilation "
+    "electrical installation fire alarm lease term notice period liability insurance repair drawing revision"
+).split()
+
+NATURAL_QUERIES = [
+    "when is the next boiler inspection due",
+    "who is liable for fire alarm repairs",
+    "what notice period applies to the lease",
+    "which supplier delivers replacement valves",
+]
+
+
+def part_number(rng: random.Random) -> str:
+    return f"PN-{rng.randint(1000, 99999)}"
+
+
+def clause(rng: random.Random) -> str:
+    return f"{rng.randint(1, 20)}.{rng.randint(1, 9)}.{rng.randint(1, 9)}"
+
+
+def make_vocabulary(rng: random.Random, size: int) -> tuple:
+    """
+    Domain words followed by random pseudo-words, with Zipf weights so a few words are everywhere and most are rare, as in real text
+    """
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = WORDS + ["".join(rng.choices(letters, k=rng.randint(4, 10))) for _ in range(size)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return vocabulary, list(itertools.accumulate(weights))
+
+
+def make_chunk(rng: random.Random, vocabulary: tuple) -> str:
+    words = rng.choices(vocabulary[0], cum_weights=vocabulary[1], k=150)
+    words.insert(rng.randrange(len(words)), part_number(rng))
+    words.insert(rng.randrange(len(words)), f"clause {clause(rng)}")
+    return " ".join(words)
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=1000, help="Files the chunks are spread across")
+    parser.add_argument("--batch", type=int, default=1000, help="Chunks per add call, like one upserted document")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    directory = tempfile.mkdtemp(prefix="keyword_index_")
+    path = os.path.join(directory, "keyword_index.sqlite3")
+    try:
+        index = KeywordIndex(path)
+        start = time.perf_counter()
+        for offset in range(0, args.chunks, args.batch):
+            count = min(args.batch, args.chunks - offset)
+            index.add(
+                [f"chunk-{offset + n}" for n in range(count)],
+                [f"file-{(offset + n) % args.files}.pdf" for n in range(count)],
+                [make_chunk(rng, vocabulary) for _ in range(count)],
+            )
+        build_seconds = time.perf_counter() - start
+        index.optimize()
+        del index
+
+        start = time.perf_counter()
+        index = KeywordIndex(path)
+        index.search("warm up", 1)
+        open_seconds = time.perf_counter() - start
+
+        print(f"chunks            : {index.count()}")
+        print(f"build             : {build_seconds:.1f}s ({args.chunks / build_seconds:.0f} chunks/s)")
+        print(f"size on disk      : {directory_size(directory) / 1024**2:.1f} MB")
+        print(f"open              : {open_seconds * 1000:.1f} ms")
+
+        query_sets = {
+            "identifier": lambda: part_number(rng),
+            "clause": lambda: f"what does clause {clause(rng)} say",
+            "natural language": lambda: rng.choice(NATURAL_QUERIES),
+        }
+        for name, make_query in query_sets.items():
+            latencies = []
+            for _ in range(args.queries):
+                query = make_query()
+                start = time.perf_counter()
+                index.search(query, 20)
+                latencies.append(time.perf_counter() - start)
+            print(f"{name:<18}: p50 {percentile(latencies, 50) * 1000:.2f} ms, p99 {percentile(latencies, 99) * 1000:.2f} ms")
+
+        start = time.perf_counter()
+        removed = index.delete_filenames([f"file-{n}.pdf" for n in range(10)])
+        print(f"delete 10 files   : {removed} chunks in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # ru_maxrss is in kilobytes on Linux
+        print(f"peak RSS          : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
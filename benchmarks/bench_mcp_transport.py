@@ -0,0 +1,95 @@
+"""
+Load test of the MCP retrieve tool over stdio and streamable HTTP.
+
+With stdio every client spawns its own server process; with HTTP all clients share one server running MCP_WORKERS
+uvicorn workers. Each of the N clients calls retrieve M times back to back, and the script reports throughput and latency
+percentiles per transport. Run it with EMBEDDING_BACKEND=fake to stay offline.
+
+Usage:
+    EMBEDDING_BACKEND=fake python -m benchmarks.bench_mcp_transport --clients 16 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+from src.core.config.settings import settings
+
+QUESTIONS = ["What is the maintenance schedule?", "Which part numbers are covered?", "When does the contract expire?"]
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+async def client_run(connect, requests: int, latencies: list, ready: asyncio.Barrier):
+    async with connect() as streams:
+        async with ClientSession(streams[0], streams[1]) as session:
+            await session.initialize()
+            # Every client is connected before the clock starts, server start up is not part of the measurement
+            await ready.wait()
+            for n in range(requests):
+                start = time.perf_counter()
+                await session.call_tool("retrieve", {"question": QUESTIONS[n % len(QUESTIONS)]})
+                latencies.append(time.perf_counter() - start)
+
+
+async def run_transport(name: str, connect, clients: int, requests: int):
+    latencies = []
+    ready = asyncio.Barrier(clients + 1)
+    tasks = [asyncio.create_task(client_run(connect, requests, latencies, ready)) for _ in range(clients)]
+    await ready.wait()
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>16} {len(latencies) / elapsed:>10.1f} {statistics.median(latencies) * 1000:>9.1f} "
+        f"{percentile(latencies, 99) * 1000:>9.1f}"
+    )
+
+
+def wait_for_port(host: str, port: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex((host, port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"MCP server did not start listening on {host}:{port}")
+
+
+async def main_async(args):
+    print(f"{'transport':>16} {'calls/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+
+    stdio_params = StdioServerParameters(command=sys.executable, args=["-m", "src.mcp.server"], env=dict(os.environ, MCP_TRANSPORT="stdio"))
+    await run_transport("stdio", lambda: stdio_client(stdio_params), args.clients, args.requests)
+
+    env = dict(os.environ, MCP_TRANSPORT="streamable-http", MCP_WORKERS=str(args.workers))
+    server = subprocess.Popen([sys.executable, "-m", "src.mcp.server"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(settings.MCP_HOST, settings.MCP_PORT)
+        await run_transport(f"http x{args.workers}", lambda: streamablehttp_client(settings.MCP_SERVER_URL), args.clients, args.requests)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=settings.MCP_WORKERS)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
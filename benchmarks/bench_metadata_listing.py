@@ -0,0 +1,111 @@
+"""
+Latency of listing document metadata at increasing depths, keyset pagination against skip/limit.
+
+Fills a scratch database of the MongoDB server in MONGO_DB_URI (or --uri) with --documents metadata documents, creates the
+indexes of database.ensure_indexes and times pages of --limit documents starting at several depths of the collection:
+    - keyset : database.list_documents with the cursor of the document before the page, as '/list' does
+    - skip   : the same query with skip(depth), as offset pagination would
+in both orders, and with an expiry range filter. Keyset pages should cost the same at any depth, skipped pages grow with it.
+Also reports the time of a delete by filename, which the filename index turns from a collection scan into a lookup.
+The scratch database is dropped at the end unless --keep is given, a kept one is reused by the next run.
+
+Usage:
+    MONGO_DB_URI=mongodb://localhost:27017 python -m benchmarks.bench_metadata_listing --documents 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from pymongo import ASCENDING, InsertOne
+
+from benchmarks.bench_mcp_transport import percentile
+from src.core.config.settings import settings
+from src.database import database
+
+BATCH_SIZE = 10_000
+
+
+async def fill(documents: int):
+    collection = database.db["documents_collection"]
+    existing = await collection.estimated_document_count()
+    if existing >= documents:
+        return
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for first in range(existing, documents, BATCH_SIZE):
+        writes = []
+        for n in range(first, min(first + BATCH_SIZE, documents)):
+            expiry_ts = 1_767_225_600 + rng.randrange(0, 3 * 365) * 86_400
+            writes.append(InsertOne({
+                "filename": f"document-{n:08d}.pdf",
+                "expiry date": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(expiry_ts)),
+                "expiry_ts": expiry_ts,
+                "content_hash": f"{rng.getrandbits(128):032x}",
+            }))
+        await collection.bulk_write(writes, ordered=False)
+    print(f"Inserted {documents - existing} documents in {time.perf_counter() - start:.0f}s")
+
+
+async def timed(coroutine_factory, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coroutine_factory()
+        timings.append(time.perf_counter() - start)
+    return percentile(timings, 50) * 1000
+
+
+async def run(args):
+    await database.connect_to_mongo()
+    database.db = database.client[args.database]
+    await fill(args.documents)
+    await database.ensure_indexes()
+    collection = database.db["documents_collection"]
+
+    filters = {"all": {}, "expiring in 2027": {"expiry_ts": {"$gte": 1_798_761_600, "$lt": 1_830_297_600}}}
+    print(f"{args.documents} documents, pages of {args.limit}, median of {args.repeat} queries, MongoDB pool of {settings.MONGO_MAX_POOL_SIZE}")
+    print(f"{'order':>9} {'filter':>17} {'depth':>9} {'keyset ms':>10} {'skip ms':>9}")
+    for order, fields in database.LIST_ORDERS.items():
+        for name, filter in filters.items():
+            matching = await collection.count_documents(filter)
+            for fraction in (0, 0.5, 0.99):
+                depth = int(matching * fraction)
+                sort = [(field, ASCENDING) for field in fields]
+                cursor = None
+                if depth:
+                    before = await collection.find(filter, {field: 1 for field in fields}).sort(sort).skip(depth - 1).limit(1).to_list()
+                    cursor = database.encode_cursor([before[0].get(field) for field in fields])
+                keyset = await timed(lambda: database.list_documents(filter, order, args.limit, cursor), args.repeat)
+                skip = await timed(lambda: collection.find(filter).sort(sort).skip(depth).limit(args.limit + 1).to_list(), args.repeat)
+                print(f"{order:>9} {name:>17} {depth:>9} {keyset:>10.2f} {skip:>9.2f}")
+
+    explain = await collection.find({"filename": "missing.pdf"}).explain()
+    plan = "index lookup" if "IXSCAN" in str(explain["queryPlanner"]["winningPlan"]) else "collection scan"
+    delete = await timed(lambda: collection.delete_many({"filename": "missing.pdf"}), args.repeat)
+    print(f"delete by filename: {delete:.2f} ms ({plan})")
+
+    if not args.keep:
+        await database.client.drop_database(args.database)
+    await database.close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uri", default=os.getenv("MONGO_DB_URI"), help="MongoDB server to use, MONGO_DB_URI by default")
+    parser.add_argument("--database", default="bench_metadata_listing", help="Scratch database, dropped at the end")
+    parser.add_argument("--documents", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=settings.LIST_DEFAULT_LIMIT)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database for the next run")
+    args = parser.parse_args()
+    if not args.uri:
+        parser.error("set MONGO_DB_URI or pass --uri")
+
+    database.uri = args.uri
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures PDF parsing throughput (pages per second) as the number of parsing processes grows.
+
+Usage:
+    python -m benchmarks.bench_pdf_parse --pages 400 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import pymupdf
+
+from src.services.vector_store import pdf_loader
+
+PARAGRAPH = (
+    "Clause {clause}. The contractor shall maintain the asset register for part number PN-{part} "
+    "and report any deviation from the agreed maintenance schedule within thirty days. "
+)
+
+
+def make_pdf(path: str, pages: int):
+    """
+    Writes a synthetic PDF with a few paragraphs of text on every page
+    """
+    doc = pymupdf.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = "".join(PARAGRAPH.format(clause=f"{number}.{n}", part=number * 100 + n) for n in range(12))
+        page.insert_textbox(pymupdf.Rect(50, 50, 550, 800), text, fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+async def parse_all(pdf_path: str, workers: int | None = None) -> list:
+    """
+    Parses every page of the PDF with iter_pages, the way ingestion does, and returns them in one list
+    """
+    return [page async for pages in pdf_loader.iter_pages(pdf_path, workers=workers) for page in pages]
+
+
+async def run(pdf_path: str, workers_list: list, repeat: int):
+    reference = await parse_all(pdf_path, workers=1)
+    print(f"{'workers':>8} {'seconds':>10} {'pages/s':>10}")
+    for workers in workers_list:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = await parse_all(pdf_path, workers=workers)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        # Parallel parsing must give exactly what PyMuPDFLoader gives
+        assert [(d.page_content, d.metadata) for d in data] == [(d.page_content, d.metadata) for d in reference]
+        print(f"{workers:>8} {best:>10.3f} {len(data) / best:>10.1f}")
+    pdf_loader.shutdown_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_pdf(pdf_path, args.pages)
+        asyncio.run(run(pdf_path, sorted(set(args.workers)), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures how long the MCP server and the API take to start, and checks the numbers against the budgets in
+benchmarks/budgets.json. Exits with status 1 when a budget is exceeded.
+
+    - import time of src.mcp.server and src.main, measured in a fresh interpreter
+    - time from spawning the MCP server over stdio to the first tools/list response
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+
+
+def import_seconds(module: str) -> float:
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+async def first_tools_list_seconds() -> float:
+    params = StdioServerParameters(command=sys.executable, args=["-m", "src.mcp.server"], env=dict(os.environ, MCP_TRANSPORT="stdio"))
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            await session.list_tools()
+            return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budgets", default=BUDGETS_PATH)
+    args = parser.parse_args()
+
+    results = {
+        "mcp_server_import_seconds": statistics.median(import_seconds("src.mcp.server") for _ in range(args.repeat)),
+        "api_import_seconds": statistics.median(import_seconds("src.main") for _ in range(args.repeat)),
+        "mcp_first_tools_list_seconds": statistics.median(asyncio.run(first_tools_list_seconds()) for _ in range(args.repeat)),
+    }
+
+    with open(args.budgets) as f:
+        budgets = json.load(f)["startup"]
+
+    failed = False
+    for name, value in results.items():
+        over = value > budgets[name]
+        failed = failed or over
+        print(f"{name:<32} {value:>7.3f}s  budget {budgets[name]:>5.2f}s  {'OVER BUDGET' if over else 'ok'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Object store throughput across file sizes, with the client and transfer settings of storage.py.
+
+Uploads (from a file and from an in-memory buffer) and downloads --parallel files of every size at once and reports MB/s.
+Without --endpoint a local moto server is started as the S3 stand-in, which measures client-side overhead rather than
+network throughput. Point --endpoint at a MinIO server or a real bucket for representative numbers.
+
+Usage:
+    python -m benchmarks.bench_storage_throughput --sizes-mb 1 16 64 256 --parallel 4
+    R2_PUBLIC_ACCESS_KEY_ID=... R2_PUBLIC_SECRET_ACCESS_KEY=... python -m benchmarks.bench_storage_throughput --endpoint http://localhost:9000 --bucket bench
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import time
+
+from src.core.config.settings import settings
+from src.services.object_store import storage
+
+
+async def timed(coroutines) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*coroutines)
+    return time.perf_counter() - start
+
+
+async def run(sizes_mb: list, parallel: int, bucket: str):
+    await storage.connect_to_storage()
+    try:
+        storage.s3.create_bucket(Bucket=bucket)
+    except Exception:
+        pass
+
+    print(f"multipart threshold {settings.S3_MULTIPART_THRESHOLD_BYTES // 1024**2} MB, part {settings.S3_MULTIPART_CHUNK_BYTES // 1024**2} MB, "
+          f"{settings.S3_MAX_CONCURRENCY} parts in flight, pool of {settings.S3_MAX_POOL_CONNECTIONS}")
+    print(f"{'size MB':>8} {'files':>6} {'upload MB/s':>12} {'fileobj MB/s':>13} {'download MB/s':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes_mb:
+            data = os.urandom(size * 1024**2)
+            source = os.path.join(directory, "source.pdf")
+            with open(source, "wb") as f:
+                f.write(data)
+            keys = [f"bench/{size}mb-{n}.pdf" for n in range(parallel)]
+            total_mb = size * parallel
+
+            upload = await timed(
+                storage.upload_file(source, "bench/", filename=f"{size}mb-{n}.pdf", bucket_name=bucket, raise_errors=True) for n in range(parallel)
+            )
+            fileobj = await timed(storage.upload_fileobj(io.BytesIO(data), key, bucket_name=bucket) for key in keys)
+            download = await timed(
+                storage.download_file(key, os.path.join(directory, f"download-{n}.pdf"), bucket_name=bucket) for n, key in enumerate(keys)
+            )
+
+            with open(os.path.join(directory, "download-0.pdf"), "rb") as f:
+                assert f.read() == data, "downloaded file differs from the upload"
+            print(f"{size:>8} {parallel:>6} {total_mb / upload:>12.1f} {total_mb / fileobj:>13.1f} {total_mb / download:>14.1f}")
+
+            await storage.delete_files(keys, bucket_name=bucket)
+    await storage.close_storage_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--parallel", type=int, default=4, help="Files transferred at the same time")
+    parser.add_argument("--endpoint", help="S3 compatible endpoint, a local moto server is started when omitted")
+    parser.add_argument("--bucket", default="bench")
+    args = parser.parse_args()
+
+    server = None
+    if args.endpoint:
+        settings.R2_PUBLIC_ENDPOINT = args.endpoint
+    else:
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        settings.R2_PUBLIC_ENDPOINT = f"http://{host}:{port}"
+        settings.S3_REGION = "us-east-1"
+        settings.R2_PUBLIC_ACCESS_KEY_ID = settings.R2_PUBLIC_ACCESS_KEY_ID or "testing"
+        settings.R2_PUBLIC_SECRET_ACCESS_KEY = settings.R2_PUBLIC_SECRET_ACCESS_KEY or "testing"
+    try:
+        asyncio.run(run(args.sizes_mb, args.parallel, args.bucket))
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Peak memory, duration and time to first searchable chunk of ingesting one large PDF.
+
+Each mode runs in a fresh process that ingests a synthetic PDF of --pages pages into an empty vector store, with the
+deterministic fake embeddings at --dims dimensions so the embedding API is not part of the measurement:
+    - whole  : the previous pipeline, every page is parsed, then everything is split, embedded and stored at once
+    - stream : embed_and_store, INGEST_WINDOW_PAGES pages are parsed, split, embedded and stored at a time
+
+The process reports the growth of its peak RSS over the baseline taken after the imports, and how long it took until
+a first chunk of the document could be retrieved. --fail-at-page makes the stream mode fail once at that page and resume
+from its checkpoint, the resumed run must end with the same chunks as an uninterrupted one.
+
+Usage:
+    python -m benchmarks.bench_streaming_ingest --pages 2000
+    python -m benchmarks.bench_streaming_ingest --pages 500 --fail-at-page 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_pdf_parse import make_pdf, parse_all
+from benchmarks.bench_vector_store import peak_rss_mb
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+async def ingest_whole(pdf_path: str, metadata: dict, first_chunk: dict):
+    """
+    The pipeline embed_and_store replaced, kept here for comparison
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from src.services.vector_store import vector_store_ops
+
+    data = await parse_all(pdf_path)
+    splits = await asyncio.to_thread(RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_documents, data)
+    for doc in splits:
+        doc.metadata.update(metadata)
+    texts = [doc.page_content for doc in splits]
+    vectors = await vector_store_ops.get_embeddings().aembed_documents(texts)
+    await asyncio.to_thread(vector_store_ops._upsert_chunks, vector_store_ops._chunk_ids(metadata, splits), texts, vectors, [doc.metadata for doc in splits])
+    first_chunk.setdefault("seconds", time.perf_counter() - first_chunk["start"])
+
+
+async def ingest_stream(pdf_path: str, metadata: dict, first_chunk: dict, fail_at_page: int):
+    from src.services.vector_store import vector_store_ops
+
+    checkpoint = {"pages_done": 0}
+
+    async def on_progress(pages_done, pages_total, chunks):
+        checkpoint["pages_done"] = pages_done
+        if chunks:
+            first_chunk.setdefault("seconds", time.perf_counter() - first_chunk["start"])
+        if fail_at_page and not checkpoint.get("failed") and pages_done >= fail_at_page:
+            checkpoint["failed"] = True
+            raise InjectedFailure(f"failing after page {pages_done}")
+
+    try:
+        await vector_store_ops.embed_and_store(pdf_path, metadata, 0, on_progress)
+    except InjectedFailure:
+        await vector_store_ops.embed_and_store(pdf_path, metadata, checkpoint["pages_done"], on_progress)
+    return checkpoint.get("failed", False)
+
+
+async def worker(mode: str, pdf_path: str, fail_at_page: int) -> dict:
+    from src.services.vector_store import vector_store_ops
+    #Imported before the baseline is taken, so both modes measure the ingestion and not the imports
+    import langchain_community.document_loaders  # noqa: F401
+    import langchain_text_splitters  # noqa: F401
+
+    #The stores are opened before the baseline, only the ingestion itself is measured
+    vector_store_ops.get_vector_store()
+    vector_store_ops.get_keyword_index()
+    vector_store_ops.get_embeddings()
+    baseline = peak_rss_mb()
+
+    metadata = {"filename": "large.pdf", "content_hash": "bench", "expiry_ts": 253402300799}
+    first_chunk = {"start": time.perf_counter()}
+    resumed = False
+    if mode == "whole":
+        await ingest_whole(pdf_path, metadata, first_chunk)
+    else:
+        resumed = await ingest_stream(pdf_path, metadata, first_chunk, fail_at_page)
+    seconds = time.perf_counter() - first_chunk["start"]
+
+    return {
+        "seconds": seconds,
+        "first_chunk_seconds": first_chunk.get("seconds"),
+        "rss_growth_mb": peak_rss_mb() - baseline,
+        "chunks": vector_store_ops.get_vector_store().count(),
+        "resumed": resumed,
+    }
+
+
+def run_worker(mode: str, pdf_path: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        env = os.environ | {
+            "EMBEDDING_BACKEND": "fake",
+            "FAKE_EMBEDDING_DIMENSIONS": str(args.dims),
+            "EMBEDDING_CACHE_PATH": os.path.join(directory, "embeddings.sqlite3"),
+            "VECTOR_DB_DIR": os.path.join(directory, "vector_db"),
+            "KEYWORD_INDEX_PATH": os.path.join(directory, "vector_db", "keyword_index.sqlite3"),
+            "VECTOR_BACKEND": args.backend,
+            "NUMPY_STORE_DIR": os.path.join(directory, "vector_db", "numpy_store"),
+        }
+        command = [sys.executable, "-m", "benchmarks.bench_streaming_ingest", "--worker", mode, pdf_path, "--fail-at-page", str(args.fail_at_page)]
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--dims", type=int, default=3072, help="Dimensions of the fake embeddings")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="numpy", help="VECTOR_BACKEND")
+    parser.add_argument("--fail-at-page", type=int, default=0, help="Fail the stream mode once after this page and resume it")
+    parser.add_argument("--modes", nargs="+", choices=["whole", "stream"], default=["whole", "stream"])
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, pdf_path = args.worker
+        print(json.dumps(asyncio.run(worker(mode, pdf_path, args.fail_at_page))))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, "large.pdf")
+        make_pdf(pdf_path, args.pages)
+        print(f"{args.pages} pages, {args.dims} dimension embeddings, {args.backend} vector store")
+        print(f"{'mode':>7} {'seconds':>8} {'first chunk s':>14} {'RSS growth MB':>14} {'chunks':>7}")
+        for mode in args.modes:
+            result = run_worker(mode, pdf_path, args)
+            note = " (failed once and resumed)" if result["resumed"] else ""
+            print(f"{mode:>7} {result['seconds']:>8.1f} {result['first_chunk_seconds']:>14.2f} {result['rss_growth_mb']:>14.0f} {result['chunks']:>7}{note}")
+
+
+if __name__ == "__main__":
+    main()
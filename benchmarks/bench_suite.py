@@ -0,0 +1,218 @@
+"""
+End to end benchmark of ingestion, retrieval and deletion on a synthetic corpus, checked against regression thresholds.
+
+A corpus of --docs PDFs of --pages pages is generated with benchmarks.corpus, then a fresh process with an empty vector
+store and the deterministic fake embeddings (no network, same vectors on every run):
+    1. ingests every PDF with embed_and_store and reports the throughput of each stage (parse, split, embed, store)
+    2. asks the corpus questions through the MCP retrieve tool, once (cold) and once more (served by the retrieval cache)
+    3. deletes half the documents one by one with delete_by_filename and the other half with one delete_by_filenames
+    4. reports its peak RSS, and its growth over the baseline taken after the imports
+
+Results are printed and written as JSON to --output. They are checked against the "suite" thresholds in
+benchmarks/budgets.json ("min_" metrics must not fall below, "max_" metrics must not exceed their limit) and, with
+--baseline, against the results of an earlier run: a metric more than --tolerance worse than in the baseline fails too.
+The exit status is 1 when any check fails.
+
+Settings such as CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WINDOW_PAGES or EMBEDDING_DIMENSIONS are taken from the environment,
+so their effect can be measured by running the suite twice.
+
+Usage:
+    python -m benchmarks.bench_suite --docs 20 --pages 50 --output results.json
+    CHUNK_SIZE=500 python -m benchmarks.bench_suite --baseline results.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_mcp_transport import percentile
+from benchmarks.bench_vector_store import peak_rss_mb
+from benchmarks.corpus import make_corpus
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+
+#Metrics compared with a baseline, and whether higher values are better
+COMPARED = {
+    "ingest_pages_per_second": True,
+    "parse_pages_per_second": True,
+    "split_chunks_per_second": True,
+    "embed_chunks_per_second": True,
+    "store_chunks_per_second": True,
+    "retrieve_p50_ms": False,
+    "retrieve_p95_ms": False,
+    "retrieve_p99_ms": False,
+    "cached_retrieve_p99_ms": False,
+    "delete_p50_ms": False,
+    "delete_p95_ms": False,
+    "delete_p99_ms": False,
+    "bulk_delete_seconds": False,
+    "peak_rss_mb": False,
+}
+
+
+def latencies(values: list, prefix: str) -> dict:
+    return {f"{prefix}_p{q}_ms": percentile(values, q) * 1000 for q in (50, 95, 99)}
+
+
+async def worker(corpus: str) -> dict:
+    from src.core.config.settings import settings
+    from src.mcp import server
+    from src.services.vector_store import vector_store_ops
+
+    vector_store_ops.get_vector_store()
+    vector_store_ops.get_keyword_index()
+    vector_store_ops.get_embeddings()
+    baseline = peak_rss_mb()
+
+    filenames = sorted(name for name in os.listdir(corpus) if name.endswith(".pdf"))
+    with open(os.path.join(corpus, "questions.json")) as f:
+        questions = [entry["question"] for entry in json.load(f)]
+
+    start = time.perf_counter()
+    for filename in filenames:
+        metadata = {"filename": filename, "content_hash": filename, "expiry date": "9999-12-31T00:00:00", "expiry_ts": 253402300799}
+        await vector_store_ops.embed_and_store(os.path.join(corpus, filename), metadata)
+    ingest_seconds = time.perf_counter() - start
+    stages = vector_store_ops.ingest_metrics
+
+    results = {
+        "documents": len(filenames),
+        "pages": stages["pages"],
+        "chunks": stages["chunks"],
+        "ingest_seconds": ingest_seconds,
+        "ingest_pages_per_second": stages["pages"] / ingest_seconds,
+        "ingest_documents_per_minute": len(filenames) / ingest_seconds * 60,
+        "parse_pages_per_second": stages["pages"] / stages["parse_seconds"] if stages["parse_seconds"] else None,
+        "split_chunks_per_second": stages["chunks"] / stages["split_seconds"] if stages["split_seconds"] else None,
+        "embed_chunks_per_second": stages["chunks"] / stages["embed_seconds"] if stages["embed_seconds"] else None,
+        "store_chunks_per_second": stages["chunks"] / stages["store_seconds"] if stages["store_seconds"] else None,
+    }
+
+    for prefix in ("retrieve", "cached_retrieve"):
+        timings = []
+        for question in questions:
+            start = time.perf_counter()
+            await server.retrieve(question)
+            timings.append(time.perf_counter() - start)
+        results |= latencies(timings, prefix)
+
+    half = len(filenames) // 2
+    timings = []
+    for filename in filenames[:half]:
+        start = time.perf_counter()
+        await vector_store_ops.delete_by_filename(filename)
+        timings.append(time.perf_counter() - start)
+    results |= latencies(timings, "delete")
+    start = time.perf_counter()
+    await vector_store_ops.delete_by_filenames(filenames[half:])
+    results["bulk_delete_seconds"] = time.perf_counter() - start
+    results["chunks_left"] = vector_store_ops.get_vector_store().count()
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    results["rss_growth_mb"] = results["peak_rss_mb"] - baseline
+    results["config"] = {
+        "vector_backend": settings.VECTOR_BACKEND,
+        "retrieval_mode": settings.RETRIEVAL_MODE,
+        "embedding_dimensions": settings.FAKE_EMBEDDING_DIMENSIONS,
+        "stored_dimensions": settings.EMBEDDING_DIMENSIONS or settings.FAKE_EMBEDDING_DIMENSIONS,
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "ingest_window_pages": settings.INGEST_WINDOW_PAGES,
+        "pdf_parse_workers": settings.PDF_PARSE_WORKERS,
+    }
+    return results
+
+
+def run_worker(corpus: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        vector_db = os.path.join(directory, "vector_db")
+        env = os.environ | {
+            "EMBEDDING_BACKEND": "fake",
+            "FAKE_EMBEDDING_DIMENSIONS": str(args.dims),
+            "EMBEDDING_CACHE_PATH": os.path.join(directory, "embeddings.sqlite3"),
+            "VECTOR_DB_DIR": vector_db,
+            "KEYWORD_INDEX_PATH": os.path.join(vector_db, "keyword_index.sqlite3"),
+            "NUMPY_STORE_DIR": os.path.join(vector_db, "numpy_store"),
+            "FULL_VECTOR_STORE_PATH": os.path.join(vector_db, "full_vectors.sqlite3"),
+            "VECTOR_BACKEND": args.backend,
+            "RETRIEVAL_MODE": args.retrieval_mode,
+        }
+        command = [sys.executable, "-m", "benchmarks.bench_suite", "--worker", corpus]
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check(results: dict, budgets: dict, baseline: dict | None, tolerance: float) -> list:
+    checks = []
+    for name, limit in budgets.items():
+        kind, metric = name.split("_", 1)
+        value = results.get(metric)
+        if value is None:
+            continue
+        ok = value >= limit if kind == "min" else value <= limit
+        checks.append({"metric": metric, "value": value, "limit": limit, "kind": kind, "ok": ok})
+
+    for metric, higher_is_better in COMPARED.items():
+        value, previous = results.get(metric), (baseline or {}).get(metric)
+        if value is None or not previous:
+            continue
+        limit = previous * (1 - tolerance) if higher_is_better else previous * (1 + tolerance)
+        ok = value >= limit if higher_is_better else value <= limit
+        checks.append({"metric": metric, "value": value, "limit": limit, "kind": "baseline", "ok": ok})
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dims", type=int, default=3072, help="Dimensions of the fake embeddings")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=os.getenv("VECTOR_BACKEND", "chroma"), help="VECTOR_BACKEND")
+    parser.add_argument("--retrieval-mode", choices=["vector", "hybrid"], default=os.getenv("RETRIEVAL_MODE", "vector"), help="RETRIEVAL_MODE")
+    parser.add_argument("--corpus", help="Directory of an existing corpus, a new one is generated when omitted")
+    parser.add_argument("--output", help="Where to write the results as JSON")
+    parser.add_argument("--budgets", default=BUDGETS_PATH)
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Share a metric may be worse than in the baseline")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(worker(args.worker))))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = args.corpus or os.path.join(directory, "corpus")
+        if not args.corpus:
+            make_corpus(corpus, args.docs, args.pages, seed=args.seed)
+        results = run_worker(corpus, args)
+
+    with open(args.budgets) as f:
+        budgets = json.load(f).get("suite", {})
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    checks = check(results, budgets, baseline, args.tolerance)
+    passed = all(entry["ok"] for entry in checks)
+
+    config = results.pop("config")
+    print(", ".join(f"{key}={value}" for key, value in config.items()))
+    for name, value in results.items():
+        print(f"{name:<32} {value:>12.3f}" if isinstance(value, float) else f"{name:<32} {value:>12}")
+    for entry in checks:
+        print(f"{entry['kind']:>8} {entry['metric']:<30} {entry['value']:>10.3f} limit {entry['limit']:>10.3f}  {'ok' if entry['ok'] else 'FAILED'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "results": results, "checks": checks, "passed": passed}, f, indent=2)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
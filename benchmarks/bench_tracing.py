@@ -0,0 +1,72 @@
+"""
+Overhead of the stage timings and spans, to check they can stay on in production.
+
+Measures the cost of one span (histogram observation and span kept for /traces) against an empty block, then the latency of
+cached MCP retrieve calls, the cheapest path that records spans, with METRICS_ENABLED on and off. Uses the fake embeddings
+and a small vector store in a temporary directory.
+
+Usage:
+    python -m benchmarks.bench_tracing --spans 200000 --calls 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def time_spans(count: int) -> float:
+    from src.core.observability.tracing import span
+
+    start = time.perf_counter()
+    for _ in range(count):
+        with span("bench.noop"):
+            pass
+    return (time.perf_counter() - start) / count
+
+
+def time_empty(count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        pass
+    return (time.perf_counter() - start) / count
+
+
+async def time_retrieve(calls: int) -> float:
+    from src.mcp import server
+
+    await server.retrieve("warmup")
+    start = time.perf_counter()
+    for _ in range(calls):
+        await server.retrieve("warmup")
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spans", type=int, default=200_000)
+    parser.add_argument("--calls", type=int, default=2000, help="Cached retrieve calls per setting")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ |= {
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_EMBEDDING_DIMENSIONS": "256",
+        "EMBEDDING_CACHE_PATH": os.path.join(directory, "embeddings.sqlite3"),
+        "VECTOR_DB_DIR": directory,
+        "KEYWORD_INDEX_PATH": os.path.join(directory, "keyword_index.sqlite3"),
+    }
+    from src.core.config.settings import settings
+
+    empty = time_empty(args.spans)
+    spans = time_spans(args.spans)
+    print(f"span: {(spans - empty) * 1e6:.2f} us over an empty block")
+
+    for enabled in (False, True):
+        settings.METRICS_ENABLED = enabled
+        seconds = asyncio.run(time_retrieve(args.calls))
+        print(f"cached retrieve, METRICS_ENABLED={str(enabled).lower():<5}: {seconds * 1e6:8.1f} us per call")
+
+
+if __name__ == "__main__":
+    main()
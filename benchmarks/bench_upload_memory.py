@@ -0,0 +1,108 @@
+"""
+Peak memory of the API process while it receives uploads of growing size.
+
+For every file size and mode a fresh server is started, one file is uploaded to it, and the server reports the growth of
+its peak RSS over the baseline measured before the upload:
+    - read   : the previous handling, the whole file is read into memory and then written to the spool directory
+    - stream : spool_upload, the file is copied to the spool directory in UPLOAD_CHUNK_BYTES blocks while it is hashed
+
+The uploaded files are random bytes streamed from disk by the client, parsing is not part of the measurement.
+
+Usage:
+    python -m benchmarks.bench_upload_memory --sizes-mb 10 50 200
+"""
+import argparse
+import hashlib
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, UploadFile, File
+
+from src.core.config.settings import settings
+from src.services.ingestion.spool import spool_upload
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def server_app() -> FastAPI:
+    app = FastAPI()
+    baseline = {}
+
+    @app.get("/ready")
+    async def ready():
+        baseline.setdefault("rss", peak_rss_mb())
+        return {}
+
+    @app.post("/read")
+    async def read(document: UploadFile = File(...)):
+        pdf_bytes = await document.read()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=settings.INGESTION_SPOOL_DIR) as temp_pdf:
+            temp_pdf.write(pdf_bytes)
+        hashlib.sha256(pdf_bytes).hexdigest()
+        os.remove(temp_pdf.name)
+        return {"rss_growth_mb": peak_rss_mb() - baseline["rss"]}
+
+    @app.post("/stream")
+    async def stream(document: UploadFile = File(...)):
+        spool_path, _, _ = await spool_upload(document, max_bytes=2**40)
+        os.remove(spool_path)
+        return {"rss_growth_mb": peak_rss_mb() - baseline["rss"]}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure(path: str, mode: str) -> float:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_upload_memory:server_app", "--factory", "--port", str(port), "--log-level", "warning"],
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                httpx.get(f"{url}/ready")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        with open(path, "rb") as f:
+            response = httpx.post(f"{url}/{mode}", files={"document": ("upload.pdf", f, "application/pdf")}, timeout=300)
+        response.raise_for_status()
+        return response.json()["rss_growth_mb"]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    os.makedirs(settings.INGESTION_SPOOL_DIR, exist_ok=True)
+    print(f"{'size MB':>8} {'read MB':>10} {'stream MB':>10}")
+    for size in args.sizes_mb:
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as upload:
+            for _ in range(size):
+                upload.write(os.urandom(1024**2))
+            upload.flush()
+            growth = {mode: measure(upload.name, mode) for mode in ("read", "stream")}
+        print(f"{size:>8} {growth['read']:>10.1f} {growth['stream']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Recall, query latency and memory of the vector store backends.
+
+Stores N synthetic chunks (clustered random vectors, normalized like the embeddings) in every backend and runs the same
+queries against each of them:
+    - chroma     : the Chroma collection (HNSW index)
+    - numpy-f16  : NumpyVectorStore with float16 vectors, exact scan
+    - numpy-i8   : NumpyVectorStore with int8 vectors, exact scan
+    - numpy-ivf  : NumpyVectorStore with int8 vectors and an IVF quantizer of --ivf-lists lists, --nprobe probed per query
+
+Every backend is built in one process and queried from a fresh one, so the reported peak RSS is that of a process that
+opened an existing store and served queries, growth is its peak RSS over the baseline taken after the imports.
+Pages of the memory-mapped arrays a query read count towards RSS, they are page cache the kernel can reclaim.
+Recall@k is measured against an exact float32 search. With --filter every query carries the unexpired filter used by
+retrieval, matching 90% of the chunks.
+
+Usage:
+    python -m benchmarks.bench_vector_store --chunks 200000 --dims 768 --queries 200
+    python -m benchmarks.bench_vector_store --chunks 1000000 --dims 3072 --backends numpy-i8 numpy-ivf
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_mcp_transport import percentile
+
+BACKENDS = ["chroma", "numpy-f16", "numpy-i8", "numpy-ivf"]
+BATCH_SIZE = 1000
+CLUSTERS = 256
+#Spread of the chunks around their cluster center, relative to the spread of the centers
+CLUSTER_SPREAD = 0.6
+
+
+def peak_rss_mb() -> float:
+    #ru_maxrss keeps the peak of the parent process across exec, VmHWM starts over
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 1024**2
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_data(directory: str, chunks: int, dims: int, queries: int, k: int):
+    """
+    Writes the chunk vectors, the query vectors and the exact top k of every query
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(CLUSTERS, dims)).astype(np.float32)
+    vectors = np.lib.format.open_memmap(os.path.join(directory, "vectors.npy"), mode="w+", dtype=np.float32, shape=(chunks, dims))
+    for start in range(0, chunks, 10_000):
+        end = min(start + 10_000, chunks)
+        labels = rng.integers(0, CLUSTERS, size=end - start)
+        vectors[start:end] = normalize(centers[labels] + CLUSTER_SPREAD * rng.normal(size=(end - start, dims)).astype(np.float32))
+    vectors.flush()
+
+    #Queries land near stored chunks without duplicating them
+    near = vectors[np.sort(rng.choice(chunks, size=queries, replace=False))]
+    query_vectors = normalize(near + CLUSTER_SPREAD / np.sqrt(dims) * rng.normal(size=(queries, dims)).astype(np.float32))
+    np.save(os.path.join(directory, "queries.npy"), query_vectors)
+
+    expiry = expiry_timestamps(chunks)
+    truth = {}
+    for filtered in (False, True):
+        scores = np.empty((queries, chunks), dtype=np.float32)
+        for start in range(0, chunks, 10_000):
+            scores[:, start:start + 10_000] = query_vectors @ vectors[start:start + 10_000].T
+        if filtered:
+            scores[:, expiry <= FILTER_CUTOFF] = -np.inf
+        truth[str(filtered)] = np.argsort(-scores, axis=1)[:, :k].tolist()
+    with open(os.path.join(directory, "truth.json"), "w") as f:
+        json.dump(truth, f)
+
+
+#Every tenth chunk has expired at the cutoff
+FILTER_CUTOFF = 1_000
+
+
+def expiry_timestamps(chunks: int) -> np.ndarray:
+    return np.where(np.arange(chunks) % 10 == 0, FILTER_CUTOFF, 2 * FILTER_CUTOFF)
+
+
+def open_backend(name: str, directory: str, args):
+    if name == "chroma":
+        from langchain_chroma import Chroma
+        from src.services.vector_store.vector_backend import ChromaBackend
+
+        return ChromaBackend(Chroma(collection_name="bench", persist_directory=directory))
+
+    from src.services.vector_store.numpy_store import NumpyVectorStore
+
+    if name == "numpy-f16":
+        return NumpyVectorStore(directory, dtype="float16")
+    if name == "numpy-i8":
+        return NumpyVectorStore(directory, dtype="int8")
+    return NumpyVectorStore(directory, dtype="int8", ivf_lists=args.ivf_lists, ivf_nprobe=args.nprobe)
+
+
+def build(name: str, data: str, directory: str, args) -> dict:
+    vectors = np.load(os.path.join(data, "vectors.npy"), mmap_mode="r")
+    expiry = expiry_timestamps(len(vectors))
+    store = open_backend(name, directory, args)
+    start = time.perf_counter()
+    for batch in range(0, len(vectors), BATCH_SIZE):
+        rows = range(batch, min(batch + BATCH_SIZE, len(vectors)))
+        store.upsert(
+            [str(row) for row in rows],
+            [f"chunk {row}" for row in rows],
+            vectors[rows.start:rows.stop].tolist(),
+            [{"filename": f"file-{row // 100}.pdf", "expiry_ts": int(expiry[row])} for row in rows],
+        )
+    if hasattr(store, "maintain"):
+        store.maintain()
+    return {"build_seconds": time.perf_counter() - start}
+
+
+def query(name: str, data: str, directory: str, args) -> dict:
+    #Imported before the baseline is taken, the growth over it is the memory the store itself needs
+    import langchain_core.documents  # noqa: F401
+    if name == "chroma":
+        import langchain_chroma  # noqa: F401
+    else:
+        import src.services.vector_store.numpy_store  # noqa: F401
+
+    query_vectors = np.load(os.path.join(data, "queries.npy"))
+    with open(os.path.join(data, "truth.json")) as f:
+        truth = json.load(f)[str(args.filter)]
+    where = {"expiry_ts": {"$gt": FILTER_CUTOFF}} if args.filter else None
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    store = open_backend(name, directory, args)
+    store.search(query_vectors[0].tolist(), args.k, where)
+    open_seconds = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for vector, expected in zip(query_vectors, truth):
+        start = time.perf_counter()
+        docs = store.search(vector.tolist(), args.k, where)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len({int(doc.id) for doc in docs} & set(expected))
+    return {
+        "open_seconds": open_seconds,
+        "recall": hits / (len(truth) * args.k),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - baseline,
+    }
+
+
+def run_worker(phase: str, name: str, data: str, directory: str, args) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_vector_store", "--worker", phase, name, data, directory,
+        "--k", str(args.k), "--ivf-lists", str(args.ivf_lists), "--nprobe", str(args.nprobe),
+    ] + (["--filter"] if args.filter else [])
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ivf-lists", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--filter", action="store_true", help="Query with the unexpired filter")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--worker", nargs=4, metavar=("PHASE", "BACKEND", "DATA", "DIRECTORY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        phase, name, data, directory = args.worker
+        print(json.dumps((build if phase == "build" else query)(name, data, directory, args)))
+        return
+
+    data = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        make_data(data, args.chunks, args.dims, args.queries, args.k)
+        print(f"{args.chunks} chunks of {args.dims} dims, {args.queries} queries, k={args.k}{', filtered' if args.filter else ''} "
+              f"(data generated in {time.perf_counter() - start:.1f}s)")
+        print(f"{'backend':>10} {'build s':>8} {'disk MB':>8} {'open s':>7} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7} {'RSS MB':>7} {'growth MB':>10}")
+        for name in args.backends:
+            directory = os.path.join(data, name)
+            built = run_worker("build", name, data, directory, args)
+            queried = run_worker("query", name, data, directory, args)
+            print(f"{name:>10} {built['build_seconds']:>8.1f} {directory_mb(directory):>8.0f} {queried['open_seconds']:>7.2f} "
+                  f"{queried['recall']:>7.3f} {queried['p50_ms']:>7.2f} {queried['p99_ms']:>7.2f} {queried['peak_rss_mb']:>7.0f} {queried['rss_growth_mb']:>10.0f}")
+    finally:
+        shutil.rmtree(data, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
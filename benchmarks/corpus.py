@@ -0,0 +1,106 @@
+"""
+Offline generator of synthetic PDF corpora for the benchmarks.
+
+Every document is about one subject and every page holds a few paragraphs of prose drawn from a fixed vocabulary, with
+part numbers and clause references mixed in like in the contracts and maintenance reports the service ingests. The same
+seed always produces the same corpus. Questions about the facts of random pages are written next to the PDFs, along with
+the file and page that answer them.
+
+Usage:
+    python -m benchmarks.corpus --docs 50 --pages 40 --out /tmp/corpus
+"""
+import argparse
+import json
+import os
+import random
+from typing import Dict, List
+
+import pymupdf
+
+SUBJECTS = [
+    "boiler maintenance", "fire safety", "lease agreement", "asbestos survey", "electrical installation",
+    "ventilation system", "supplier contract", "insurance policy", "building inspection", "warranty claim",
+]
+
+WORDS = (
+    "contract maintenance schedule inspection report survey building floor plan section annex tenant landlord payment "
+    "warranty replacement supplier delivery invoice safety certificate valve pump boiler ventilation electrical installation "
+    "alarm lease term notice period liability insurance repair drawing revision contractor asset register deviation "
+    "quarterly annual monthly approval signed responsible party premises access emergency procedure compliance standard"
+).split()
+
+FACTS = [
+    "Part number PN-{part} is installed in building {building} on floor {floor}.",
+    "Clause {clause} requires notice of {days} days before any change to the {subject} terms.",
+    "The {subject} inspection of building {building} is due every {days} days under clause {clause}.",
+]
+
+QUESTIONS = [
+    "Where is part number PN-{part} installed?",
+    "What notice does clause {clause} require?",
+    "How often is building {building} inspected for {subject}?",
+]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(8, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def _page(rng: random.Random, subject: str, number: int, paragraphs: int) -> Dict:
+    kind = rng.randrange(len(FACTS))
+    values = {
+        "part": rng.randint(10_000, 99_999),
+        "building": f"B{rng.randint(1, 60)}",
+        "floor": rng.randint(0, 12),
+        "clause": f"{number + 1}.{rng.randint(1, 9)}.{rng.randint(1, 9)}",
+        "days": rng.choice([14, 30, 60, 90, 180, 365]),
+        "subject": subject,
+    }
+    text = [" ".join(_sentence(rng) for _ in range(rng.randint(4, 7))) for _ in range(paragraphs)]
+    text.insert(rng.randint(0, paragraphs), FACTS[kind].format(**values))
+    return {"text": "\n\n".join(text), "question": QUESTIONS[kind].format(**values)}
+
+
+def make_corpus(directory: str, docs: int, pages: int, paragraphs: int = 4, questions_per_doc: int = 5, seed: int = 0) -> List[Dict]:
+    """
+    Writes docs PDFs of pages pages each to the directory, and the questions about them to questions.json.
+    Returns the questions as {"question", "filename", "page"}
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    questions = []
+    for number in range(docs):
+        subject = SUBJECTS[number % len(SUBJECTS)]
+        filename = f"{subject.replace(' ', '-')}-{number:04d}.pdf"
+        content = [_page(rng, subject, page, paragraphs) for page in range(pages)]
+
+        pdf = pymupdf.open()
+        for page in content:
+            pdf.new_page().insert_textbox(pymupdf.Rect(50, 50, 550, 800), page["text"], fontsize=9)
+        pdf.save(os.path.join(directory, filename))
+        pdf.close()
+
+        for page in rng.sample(range(pages), min(questions_per_doc, pages)):
+            questions.append({"question": content[page]["question"], "filename": filename, "page": page})
+
+    with open(os.path.join(directory, "questions.json"), "w") as f:
+        json.dump(questions, f, indent=1)
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--paragraphs", type=int, default=4, help="Paragraphs of prose per page")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    questions = make_corpus(args.out, args.docs, args.pages, args.paragraphs, seed=args.seed)
+    print(f"Wrote {args.docs} PDFs of {args.pages} pages and {len(questions)} questions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
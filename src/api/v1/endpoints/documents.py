@@ -1,34 +1,31 @@
-from fastapi import APIRouter, status, Depends, UploadFile, File, HTTPException, Form, Query
-from typing import List, Dict, Any, Annotated, Optional
+from fastapi import APIRouter, status, Depends, UploadFile, File, HTTPException, Form, Query, Body
+from typing import List, Dict, Any, Annotated, Optional, Literal
 from pymongo import AsyncMongoClient
 from datetime import datetime, date, timedelta
-import tempfile
+import asyncio
 import os
+import re
 
+from src.core.config.settings import settings
 from src.database import database
 from src.core.logging.logger import logger
+from src.core.observability import tracing
+from src.core.observability.tracing import span
 from src.services.object_store import storage
 from src.services.vector_store import vector_store_ops
+from src.services.ingestion import job_queue, bulk
+from src.services.ingestion.spool import spool_upload, UploadTooLarge
+from src.services.expiry import sweeper
+from src.services.expiry.policy import expiry_timestamp
 
 router = APIRouter(tags=['Documents'])
 
 db_dependency= Annotated[AsyncMongoClient, Depends(database.get_db)]
 
-@router.post('/upload', response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
-async def upload_documents(db: db_dependency, document: UploadFile = File(...,  description="The PDF file to be uploaded."), expiry: Optional[str] = Form(None)):
+def _parse_expiry(expiry: Optional[str]) -> datetime:
     """
-    Receives a PDF file and metadata related to it. Stores the file in AWS/R2 bucket and the metadata in MongoDB.
+    Converts the expiry date sent with an upload to a datetime, defaulting to one year from today
     """
-    logger.info(f"Endpoint '/upload': Processing file '{document.filename}'.")
-
-    #Check if the file is a PDF
-    if not document.filename.endswith(".pdf"):
-        logger.warning(f"Endpoint '/extract-asbestos-data/': Invalid file type received: '{document.filename}'.")
-        raise HTTPException(
-            status_code=400, detail="Invalid file type. Only PDF files are accepted."
-        )
-    
-    #Converting expiry date to timedate object
     try:
         if expiry:
             expiry_date = date.fromisoformat(expiry)
@@ -37,62 +34,228 @@ async def upload_documents(db: db_dependency, document: UploadFile = File(...,
             expiry_date = date.today() + timedelta(days=365)
 
         # Convert date to datetime with time set to 00:00:00
-        expiry_dt = datetime.combine(expiry_date, datetime.min.time())
+        return datetime.combine(expiry_date, datetime.min.time())
     except ValueError:
         logger.error("Invalid date format")
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD (e.g., 2027-07-30)")
 
-    #Converting the pdf bytes to temp pdf file
-    pdf_bytes = await document.read()
-    temp_pdf_path = None
+def _validate_bulk(filenames: List[str]):
+    """
+    Rejects bulk requests with too many files, files that are not PDFs or the same filename twice
+    """
+    if len(filenames) > settings.BULK_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files, at most {settings.BULK_MAX_FILES} are accepted per request.")
+    invalid = [filename for filename in filenames if not filename.endswith(".pdf")]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid file type. Only PDF files are accepted: {invalid}")
+    duplicates = sorted({filename for filename in filenames if filenames.count(filename) > 1})
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Filenames must be unique within a request: {duplicates}")
 
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-            temp_pdf.write(pdf_bytes)
-            temp_pdf_path = temp_pdf.name
-
-        #Uploading file to object store
-        await storage.upload_file(temp_pdf_path, 'mcp_rag/', filename=document.filename)
-
-        metadata= {
-            "filename" : document.filename,
-            "expiry date": expiry_dt.isoformat()
-            }
-        
-        #Embedding and storing in vector database
-        await vector_store_ops.embed_and_store(temp_pdf_path, metadata)
-        
-        #Uploading metadata to MongoDB
-        result = await db["documents_collection"].insert_one(metadata)
-        if (result.acknowledged):
-            logger.info("Metadata stored successfully")
-        else:
-            logger.info("Metadata could not be stored")
+@router.post('/upload', response_model=Dict[str, Any], status_code=status.HTTP_202_ACCEPTED)
+async def upload_documents(document: UploadFile = File(...,  description="The PDF file to be uploaded."), expiry: Optional[str] = Form(None)):
+    """
+    Receives a PDF file and metadata related to it and queues it for ingestion.
+    The file is stored in AWS/R2 bucket, embedded into the vector store and its metadata stored in MongoDB by the ingestion workers.
+    Returns the id of the ingestion job, which can be polled on '/jobs/{job_id}'.
+    """
+    logger.info(f"Endpoint '/upload': Processing file '{document.filename}'.")
 
+    #Check if the file is a PDF
+    if not document.filename.endswith(".pdf"):
+        logger.warning(f"Endpoint '/upload': Invalid file type received: '{document.filename}'.")
+        raise HTTPException(
+            status_code=400, detail="Invalid file type. Only PDF files are accepted."
+        )
+    
+    #Converting expiry date to timedate object
+    expiry_dt = _parse_expiry(expiry)
 
+    #Streaming the pdf to disk, the file is removed by the ingestion worker once the job is finished
+    try:
+        with span("api.spool"):
+            spool_path, content_hash, _ = await spool_upload(document)
+    except UploadTooLarge as e:
+        logger.warning(f"Endpoint '/upload': {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+
+    metadata= {
+        "filename" : document.filename,
+        "expiry date": expiry_dt.isoformat(),
+        "expiry_ts": expiry_timestamp(expiry_dt),
+        "content_hash": content_hash
+        }
 
+    try:
+        with span("api.queue"):
+            job_id = await job_queue.submit_job(spool_path, metadata, tracing.current_request_id())
+    except asyncio.QueueFull:
+        os.remove(spool_path)
+        logger.warning(f"Ingestion queue is full, rejecting '{document.filename}'")
+        raise HTTPException(status_code=503, detail="Too many documents are waiting for ingestion. Try again later.")
     except Exception as e:
-        logger.error(f"Error during file upload: {e}", exc_info=True)
+        os.remove(spool_path)
+        logger.error(f"Error while queueing file upload: {e}", exc_info=True)
         return {"errors": str(e)}
-    
-    finally:
-        if temp_pdf_path and os.path.exists(temp_pdf_path):
-            try:
-                os.remove(temp_pdf_path)
-                logger.debug(f"Temporary file deleted: {temp_pdf_path}")
-            except OSError as e:
-                logger.error(f"Error deleting temporary file {temp_pdf_path}: {e}")
-
-
-    
 
     return {
+        "job_id": job_id,
+        "status": "queued",
         "filename": document.filename,
         "expiry_datetime": expiry_dt.isoformat()
     }
 
+@router.post('/bulk-upload', response_model=Dict[str, Any])
+async def bulk_upload_documents(db: db_dependency, documents: List[UploadFile] = File(..., description="The PDF files to be uploaded."), expiry: Optional[str] = Form(None)):
+    """
+    Receives many PDF files sharing one expiry date and ingests them together.
+    Object store uploads, parsing, embedding and MongoDB inserts of the files overlap instead of running one file after another.
+    Returns the outcome of every file and the overall documents per minute.
+    """
+    logger.info(f"Endpoint '/bulk-upload': Processing {len(documents)} files.")
+    _validate_bulk([document.filename for document in documents])
+    expiry_dt = _parse_expiry(expiry)
+
+    #Streaming the files to disk, they are removed once ingested
+    items = []
+    try:
+        for document in documents:
+            with span("api.spool"):
+                spool_path, content_hash, _ = await spool_upload(document)
+            items.append(bulk.BulkItem(document.filename, spool_path=spool_path, content_hash=content_hash))
+    except UploadTooLarge as e:
+        for item in items:
+            os.remove(item.spool_path)
+        logger.warning(f"Endpoint '/bulk-upload': {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return await bulk.ingest_bulk(db, items, expiry_dt)
+
+@router.post('/bulk-upload/manifest', response_model=Dict[str, Any])
+async def bulk_upload_manifest(db: db_dependency, object_keys: Annotated[List[str], Body(embed=True, min_length=1)], expiry: Annotated[Optional[str], Body(embed=True)] = None):
+    """
+    Receives a manifest of PDFs already in the object store bucket and ingests them together, the same way as '/bulk-upload'.
+    Files stored outside of the 'mcp_rag/' folder are copied into it.
+    """
+    logger.info(f"Endpoint '/bulk-upload/manifest': Processing {len(object_keys)} objects.")
+    _validate_bulk([os.path.basename(key) for key in object_keys])
+    expiry_dt = _parse_expiry(expiry)
+
+    items = [bulk.BulkItem(os.path.basename(key), object_key=key) for key in object_keys]
+    return await bulk.ingest_bulk(db, items, expiry_dt)
+
+@router.get('/jobs/{job_id}', response_model=Dict[str, Any])
+async def get_ingestion_job(job_id: str):
+    """
+    Returns the status of an ingestion job along with the progress of each of its stages.
+    """
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job '{job_id}' not found")
+    return job
+
+@router.get('/embedding-cache/stats', response_model=Dict[str, Any])
+async def get_embedding_cache_stats():
+    """
+    Returns the hit and miss counts of the chunk embedding cache, along with an estimate of the embedding tokens it saved.
+    """
+    return vector_store_ops.get_embedding_cache().stats()
+
+@router.get('/expiry-sweeper/stats', response_model=Dict[str, Any])
+async def get_expiry_sweeper_stats():
+    """
+    Returns how many expired documents the expiry sweeper removed, how fast, and how late after their expiry.
+    """
+    return sweeper.stats()
+
+#Metadata fields '/list' can return
+LIST_FIELDS = {"filename", "expiry date", "expiry_ts", "expires_at", "content_hash"}
+
+def _parse_date(value: str, parameter: str) -> int:
+    """
+    Converts a YYYY-MM-DD query parameter to the epoch seconds of its start, in UTC
+    """
+    try:
+        return expiry_timestamp(datetime.combine(date.fromisoformat(value), datetime.min.time()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date format for '{parameter}'. Use YYYY-MM-DD (e.g., 2027-07-30)")
+
+@router.get('/list', response_model=Dict[str, Any])
+async def list_documents(
+    limit: Annotated[int, Query(ge=1, le=settings.LIST_MAX_LIMIT)] = settings.LIST_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    fields: Annotated[Optional[List[str]], Query(description="Fields to return, all of them if omitted")] = None,
+    filename_prefix: Optional[str] = None,
+    expires_after: Annotated[Optional[str], Query(description="Only documents expiring on or after this date (YYYY-MM-DD)")] = None,
+    expires_before: Annotated[Optional[str], Query(description="Only documents expiring before this date (YYYY-MM-DD)")] = None,
+    order: Literal["filename", "expiry"] = "filename",
+):
+    """
+    Lists the stored documents' metadata, a page at a time, ordered by filename or by expiry.
+    Pass the returned 'next_cursor' as 'cursor' to get the next page, it is null on the last page.
+    Filtering on expiry dates is fastest in expiry order.
+    """
+    unknown = sorted(set(fields or []) - LIST_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}, use some of {sorted(LIST_FIELDS)}")
+
+    filter: Dict[str, Any] = {}
+    if filename_prefix:
+        #An anchored, case sensitive prefix is answered from the filename index
+        filter["filename"] = {"$regex": "^" + re.escape(filename_prefix)}
+    if expires_after or expires_before:
+        filter["expiry_ts"] = {}
+        if expires_after:
+            filter["expiry_ts"]["$gte"] = _parse_date(expires_after, "expires_after")
+        if expires_before:
+            filter["expiry_ts"]["$lt"] = _parse_date(expires_before, "expires_before")
+
+    try:
+        with span("mongo.list"):
+            documents, next_cursor = await database.list_documents(filter, order, limit, cursor, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"documents": documents, "count": len(documents), "next_cursor": next_cursor}
+
+#Query operators accepted in bulk delete filters, anything else (e.g. $where) is rejected
+FILTER_OPERATORS = {"$eq", "$ne", "$in", "$nin", "$lt", "$lte", "$gt", "$gte", "$exists"}
+
+def _validate_filter(filter: Dict[str, Any]):
+    """
+    Only accepts filters on metadata fields, with plain values or the operators in FILTER_OPERATORS
+    """
+    for field, condition in filter.items():
+        if field.startswith("$"):
+            raise HTTPException(status_code=400, detail=f"Unsupported filter field '{field}'")
+        if isinstance(condition, dict):
+            unsupported = [operator for operator in condition if operator not in FILTER_OPERATORS]
+            if unsupported:
+                raise HTTPException(status_code=400, detail=f"Unsupported filter operators {unsupported}, use one of {sorted(FILTER_OPERATORS)}")
+
+@router.post('/bulk-delete', response_model=Dict[str, Any])
+async def bulk_delete_documents(db: db_dependency, filenames: Annotated[Optional[List[str]], Body(embed=True)] = None, filter: Annotated[Optional[Dict[str, Any]], Body(embed=True)] = None):
+    """
+    Receives a list of file names and/or a filter on the document metadata (e.g. {"expiry_ts": {"$lt": 1767225600}})
+    and deletes every matching file from the object store, the vector store and MongoDB.
+    Returns the outcome of every file in every store, failed files can be sent again.
+    """
+    if not filenames and not filter:
+        raise HTTPException(status_code=400, detail="Provide 'filenames', a metadata 'filter', or both.")
+
+    targets = list(dict.fromkeys(filenames or []))
+    if filter:
+        _validate_filter(filter)
+        with span("mongo.distinct"):
+            matched = await db["documents_collection"].distinct("filename", filter)
+        targets = list(dict.fromkeys(targets + matched))
+    logger.info(f"Endpoint '/bulk-delete': Deleting {len(targets)} files.")
+
+    if not targets:
+        return {"total": 0, "deleted": 0, "failed": 0, "elapsed_seconds": 0.0, "results": []}
+    return await bulk.delete_bulk(db, targets)
+
 @router.delete('/delete', status_code=status.HTTP_204_NO_CONTENT)
-async def upload_documents(db: db_dependency, filename: Annotated[str | None, Query(min_length=1)]):
+async def delete_document(db: db_dependency, filename: Annotated[str | None, Query(min_length=1)]):
     """
     Receives a PDF file name and deleted the entry for that file name.
     """
@@ -108,7 +271,8 @@ async def upload_documents(db: db_dependency, filename: Annotated[str | None, Qu
         filter = { "filename" : filename }
         try:
             logger.info("Deleting the file metadata from MongoDB")
-            result= await db["documents_collection"].delete_many(filter)
+            with span("mongo.delete"):
+                result= await db["documents_collection"].delete_many(filter)
             if (result.acknowledged):
                 logger.info("Successfukky deleted instance from MongoDB")
         except Exception as e:
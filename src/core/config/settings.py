@@ -3,6 +3,19 @@ from dotenv import load_dotenv
 from typing import List
 
 class Settings:
+    # Environment variables each process cannot start without. Values are read for every process but only
+    # validated by the processes that use them, so e.g. the MCP server does not need MongoDB or R2 credentials
+    REQUIRED_BY_PROCESS = {
+        "api": {
+            "GOOGLE_API_KEY": "GOOGLE_API_KEY",
+            "DATABASE_URI": "MONGO_DB_URI",
+            "R2_PUBLIC_ACCESS_KEY_ID": "R2_PUBLIC_ACCESS_KEY_ID",
+            "R2_PUBLIC_SECRET_ACCESS_KEY": "R2_PUBLIC_SECRET_ACCESS_KEY",
+        },
+        "mcp": {},
+        "client": {},
+    }
+
     def __init__(self):
         BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
         dotenv_path = os.path.join(BASE_DIR, '.env')
@@ -14,8 +27,6 @@ class Settings:
         self.API_V1_STR: str = "/v1"
 
         self.GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
-        if not self.GOOGLE_API_KEY:
-            raise ValueError("GOOGLE_API_KEY environment variable not set.")
         self.MISTRAL_API_KEY: str = os.getenv("MISTRAL_API_KEY", "")
         # if not self.MISTRAL_API_KEY:
         #     raise ValueError("MISTRAL_API_KEY environment variable not set.")
@@ -24,33 +35,171 @@ class Settings:
         self.LOG_FILE_PATH: str = os.path.join(self.LOG_DIR, "api_usage.log")
         #self.DATABASE_URL: str = f'sqlite:///{os.path.join(BASE_DIR, "api_usage.db")}'
         self.DATABASE_URI: str = os.getenv("MONGO_DB_URI")
-        if not self.DATABASE_URI:
-            raise ValueError("MONGO_DB_URI environment variable not set.")
         self.API_USAGE_LOG_LIMIT: int = 100 # Limit for retrieving API usage logs
 
+        #MongoDB client
+        self.MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", 100)) # Connections per server, should cover the ingestion workers, bulk inserts and concurrent requests
+        self.MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", 0)) # Connections kept open while idle, so bursts do not pay for the TLS handshakes
+        self.MONGO_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300_000)) # Idle connections are closed after this long, 0 keeps them
+        self.MONGO_MAX_CONNECTING: int = int(os.getenv("MONGO_MAX_CONNECTING", 2)) # Connections being established at once per server
+        self.MONGO_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10_000)) # Operations waiting longer for a free connection fail instead of queueing forever
+        self.MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10_000))
+        self.MONGO_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10_000))
+
+        #Document listing
+        self.LIST_DEFAULT_LIMIT: int = int(os.getenv("LIST_DEFAULT_LIMIT", 50)) # Documents per page of '/list'
+        self.LIST_MAX_LIMIT: int = int(os.getenv("LIST_MAX_LIMIT", 1000))
+
         self.FLOOR_PLAN_PATH: str = 'src/services/extraction/floor plans'
         self.FLOOR_PLAN_PDF_PATH: str = 'src/services/extraction/floor plans pdf'
         self.IMAGE_PATH: str = 'src/services/extraction/images'
 
         self.R2_PUBLIC_ACCESS_KEY_ID: str = os.getenv("R2_PUBLIC_ACCESS_KEY_ID")
-        if not self.R2_PUBLIC_ACCESS_KEY_ID:
-            raise ValueError("R2_PUBLIC_ACCESS_KEY_ID environment variable not set.")
         self.R2_PUBLIC_SECRET_ACCESS_KEY: str = os.getenv("R2_PUBLIC_SECRET_ACCESS_KEY")
-        if not self.R2_PUBLIC_SECRET_ACCESS_KEY:
-            raise ValueError("R2_PUBLIC_SECRET_ACCESS_KEY environment variable not set.")
 
-        self.R2_PUBLIC_BUCKET='rexolve-ai-test'
-        self.R2_PUBLIC_ENDPOINT='https://e27b72d07e0a1beed7a1c690519bf19c.r2.cloudflarestorage.com'
+        self.R2_PUBLIC_BUCKET: str = os.getenv("R2_PUBLIC_BUCKET", 'rexolve-ai-test')
+        self.R2_PUBLIC_ENDPOINT: str = os.getenv("R2_PUBLIC_ENDPOINT", 'https://e27b72d07e0a1beed7a1c690519bf19c.r2.cloudflarestorage.com') # Point at moto or MinIO to test locally
         self.R2_PUBLIC_VIEW_ENDPOINT='https://pub-a8e24de4735647df88f75c49481cc6e7.r2.dev'
 
         self.DAILY_API_CALL_LIMIT: int = 100
         self.API_RATE_LIMIT: str = '2/second'
         self.API_RATE_LIMIT_ACTIVE: bool = True
-        self.TRACKED_ENDPOINTS: List[str] = [ # Moved to settings for easy config
-            "/v1/extract/extract-asbestos-data/",
-            "/v1/extract/count-buildings/",
-            "/v1/extract/extract-floorplans/"
+        self.TRACKED_ENDPOINTS: List[str] = [ # Moved to settings for easy config. Route templates whose requests are timed on /metrics
+            path.strip() for path in os.getenv("TRACKED_ENDPOINTS", ",".join([
+                "/v1/documents/upload",
+                "/v1/documents/bulk-upload",
+                "/v1/documents/bulk-upload/manifest",
+                "/v1/documents/jobs/{job_id}",
+                "/v1/documents/list",
+                "/v1/documents/bulk-delete",
+                "/v1/documents/delete",
+                "/mcp",
+            ])).split(",") if path.strip()
         ]
 
+        #Metrics and tracing
+        self.METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true" # Stage timings on /metrics and spans on /traces
+        self.TRACE_BUFFER_SIZE: int = int(os.getenv("TRACE_BUFFER_SIZE", 5000)) # Most recent spans kept per process for /traces
+
+        #Object store client
+        self.S3_REGION: str = os.getenv("S3_REGION", "auto")
+        self.S3_MAX_POOL_CONNECTIONS: int = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 64)) # Should cover S3_MAX_CONCURRENCY parts for every concurrent transfer
+        self.S3_MAX_ATTEMPTS: int = int(os.getenv("S3_MAX_ATTEMPTS", 5))
+        self.S3_CONNECT_TIMEOUT_SECONDS: int = int(os.getenv("S3_CONNECT_TIMEOUT_SECONDS", 10))
+        self.S3_READ_TIMEOUT_SECONDS: int = int(os.getenv("S3_READ_TIMEOUT_SECONDS", 60))
+        self.S3_MULTIPART_THRESHOLD_BYTES: int = int(os.getenv("S3_MULTIPART_THRESHOLD_BYTES", 16 * 1024**2)) # Larger files are transferred in parts
+        self.S3_MULTIPART_CHUNK_BYTES: int = int(os.getenv("S3_MULTIPART_CHUNK_BYTES", 16 * 1024**2)) # Part size, also the size of ranged GETs on download
+        self.S3_MAX_CONCURRENCY: int = int(os.getenv("S3_MAX_CONCURRENCY", 8)) # Parts in flight per transfer
+
+        #Ingestion job queue
+        self.INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", 2)) # Number of uploads processed concurrently
+        self.INGESTION_QUEUE_SIZE: int = int(os.getenv("INGESTION_QUEUE_SIZE", 100)) # Pending jobs accepted before uploads are rejected
+        self.INGESTION_SPOOL_DIR: str = os.getenv("INGESTION_SPOOL_DIR", os.path.join(BASE_DIR, "ingestion_spool"))
+        self.INGESTION_STAGE_ATTEMPTS: int = int(os.getenv("INGESTION_STAGE_ATTEMPTS", 3)) # Attempts per stage before a job fails, embedding resumes from its last checkpoint
+        self.INGESTION_RETRY_DELAY_SECONDS: float = float(os.getenv("INGESTION_RETRY_DELAY_SECONDS", 5)) # Multiplied by the attempt number
+        self.MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024**2)) # Larger PDFs are rejected with 413
+        self.UPLOAD_CHUNK_BYTES: int = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024**2)) # Bytes held in memory at a time while spooling an upload
+
+        #Bulk ingestion
+        self.BULK_MAX_FILES: int = int(os.getenv("BULK_MAX_FILES", 500)) # Files accepted per bulk request
+        self.BULK_UPLOAD_CONCURRENCY: int = int(os.getenv("BULK_UPLOAD_CONCURRENCY", 8)) # Object store transfers in flight
+        self.BULK_INGEST_CONCURRENCY: int = int(os.getenv("BULK_INGEST_CONCURRENCY", 4)) # Files being parsed and embedded at once
+        self.BULK_INSERT_BATCH_SIZE: int = int(os.getenv("BULK_INSERT_BATCH_SIZE", 100)) # Metadata documents per bulk write
+
+        #PDF parsing
+        self.PDF_PARSE_WORKERS: int = int(os.getenv("PDF_PARSE_WORKERS", 0)) # Processes used to parse page ranges in parallel, 0 parses in a thread
+        self.PDF_PARSE_MIN_PAGES: int = int(os.getenv("PDF_PARSE_MIN_PAGES", 32)) # Smaller PDFs are not worth sending to the process pool
+        self.PDF_PARSE_PAGES_PER_TASK: int = int(os.getenv("PDF_PARSE_PAGES_PER_TASK", 25))
+        self.CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", 1000)) # Characters per chunk
+        self.CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", 200)) # Characters shared by consecutive chunks of a page
+        self.INGEST_WINDOW_PAGES: int = int(os.getenv("INGEST_WINDOW_PAGES", 32)) # Pages parsed, embedded and stored at a time, progress is checkpointed after each window
+
+        #Vector store
+        self.VECTOR_DB_DIR: str = os.getenv("VECTOR_DB_DIR", "./document_vector_db")
+        self.CHROMA_HOST: str = os.getenv("CHROMA_HOST", "") # When set, all processes share one Chroma server instead of opening VECTOR_DB_DIR
+        self.CHROMA_PORT: int = int(os.getenv("CHROMA_PORT", 8000))
+        self.VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma") # "chroma", or "numpy" for the memory-mapped store in NUMPY_STORE_DIR
+        self.NUMPY_STORE_DIR: str = os.getenv("NUMPY_STORE_DIR", os.path.join(self.VECTOR_DB_DIR, "numpy_store"))
+        self.NUMPY_STORE_DTYPE: str = os.getenv("NUMPY_STORE_DTYPE", "int8") # "int8", or "float16" for exact scores at twice the size and scan time
+        self.NUMPY_STORE_IVF_LISTS: int = int(os.getenv("NUMPY_STORE_IVF_LISTS", 0)) # Coarse quantizer lists, 0 scans every vector
+        self.NUMPY_STORE_IVF_NPROBE: int = int(os.getenv("NUMPY_STORE_IVF_NPROBE", 8)) # Lists scanned per query
+        self.NUMPY_STORE_COMPACT_RATIO: float = float(os.getenv("NUMPY_STORE_COMPACT_RATIO", 0.2)) # Share of tombstoned rows that triggers a compaction
+
+        #Embeddings
+        self.EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "openai") # "openai", or "fake" for deterministic offline embeddings
+        self.EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+        self.FAKE_EMBEDDING_DIMENSIONS: int = int(os.getenv("FAKE_EMBEDDING_DIMENSIONS", 3072))
+        self.EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 256)) # Chunks per embedding request
+        self.EMBEDDING_BATCH_MAX_TOKENS: int = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 100_000))
+        self.EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4)) # Embedding requests in flight across all ingestions
+        self.EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", 6))
+        self.EMBEDDING_BATCH_LINGER_MS: int = int(os.getenv("EMBEDDING_BATCH_LINGER_MS", 20))
+        self.EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, "embedding_cache", "embeddings.sqlite3"))
+        self.EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 2 * 1024**3)) # Least recently used chunks are evicted past this size
+        self.EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", 0)) # Leading dimensions kept in the vector store (e.g. 256, 512, 1024), 0 keeps full vectors. Changing it needs an empty vector store
+        self.FULL_VECTOR_STORE_PATH: str = os.getenv("FULL_VECTOR_STORE_PATH", os.path.join(self.VECTOR_DB_DIR, "full_vectors.sqlite3")) # Full vectors used for re-ranking when EMBEDDING_DIMENSIONS is set
+
+        #Retrieval
+        self.RETRIEVAL_K: int = int(os.getenv("RETRIEVAL_K", 5)) # Chunks returned per question
+        self.QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048)) # Question embeddings kept in memory, about 12 KB each at 3072 dimensions
+        self.RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", 1024)) # Cached retrieval results, each holding RETRIEVAL_K chunks
+        self.RETRIEVAL_CACHE_TTL_SECONDS: int = int(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", 600))
+        self.CORPUS_GENERATION_CHECK_SECONDS: float = float(os.getenv("CORPUS_GENERATION_CHECK_SECONDS", 1)) # How often the corpus generation file is read, results cached by other processes may be served this long after a change
+        self.RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "vector") # "vector", or "hybrid" to fuse vector and BM25 keyword rankings
+        self.HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", 20)) # Chunks taken from each ranking before fusion
+        self.RRF_K: int = int(os.getenv("RRF_K", 60)) # Reciprocal rank fusion constant, higher values flatten the rankings
+        self.RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", 40)) # Chunks found with truncated vectors and re-ranked with full vectors, when EMBEDDING_DIMENSIONS is set
+        self.KEYWORD_INDEX_PATH: str = os.getenv("KEYWORD_INDEX_PATH", os.path.join(self.VECTOR_DB_DIR, "keyword_index.sqlite3"))
+        self.RETRIEVAL_CONTEXT_TOKENS: int = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", 1500)) # Tokens of context returned per question by the retrieve tools
+        self.RETRIEVAL_MMR_LAMBDA: float = float(os.getenv("RETRIEVAL_MMR_LAMBDA", 0.7)) # Weight of relevance against diversity when ordering the retrieved passages
+        self.RETRIEVAL_DUPLICATE_SIMILARITY: float = float(os.getenv("RETRIEVAL_DUPLICATE_SIMILARITY", 0.8)) # Passages sharing this share of their word sequences with a more relevant one are dropped
+
+        #Document expiry
+        self.EXPIRY_FILTER_GRANULARITY_SECONDS: int = int(os.getenv("EXPIRY_FILTER_GRANULARITY_SECONDS", 300)) # Retrieval hides documents up to this long before they expire, so the filter stays cacheable
+        self.EXPIRY_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("EXPIRY_SWEEP_INTERVAL_SECONDS", 600))
+        self.EXPIRY_SWEEP_BATCH_SIZE: int = int(os.getenv("EXPIRY_SWEEP_BATCH_SIZE", 500)) # Expired documents (or chunks) removed per batch
+        self.EXPIRY_SWEEP_CONCURRENCY: int = int(os.getenv("EXPIRY_SWEEP_CONCURRENCY", 8)) # Object store deletions in flight
+        self.EXPIRY_TTL_GRACE_SECONDS: int = int(os.getenv("EXPIRY_TTL_GRACE_SECONDS", 7 * 24 * 3600)) # MongoDB drops expired metadata itself past this, should the sweeper not run
+
+        #MCP server
+        self.MCP_TRANSPORT: str = os.getenv("MCP_TRANSPORT", "stdio") # "stdio" or "streamable-http"
+        self.MCP_HOST: str = os.getenv("MCP_HOST", "127.0.0.1")
+        self.MCP_PORT: int = int(os.getenv("MCP_PORT", 8001))
+        self.MCP_WORKERS: int = int(os.getenv("MCP_WORKERS", 4)) # Worker processes serving the streamable HTTP transport
+        self.MCP_LOG_TO_FILE: bool = os.getenv("MCP_LOG_TO_FILE", "false").lower() == "true"
+        self.MCP_SERVER_URL: str = os.getenv("MCP_SERVER_URL", f"http://{self.MCP_HOST}:{self.MCP_PORT}/mcp")
+
+        #MCP client
+        self.MCP_POOL_SIZE: int = int(os.getenv("MCP_POOL_SIZE", 4)) # MCP server sessions (and agents) shared by the chat UI
+        self.MCP_POOL_HEALTH_CHECK_SECONDS: int = int(os.getenv("MCP_POOL_HEALTH_CHECK_SECONDS", 30)) # Sessions idle for longer are pinged before reuse
+        self.MCP_PING_TIMEOUT_SECONDS: int = int(os.getenv("MCP_PING_TIMEOUT_SECONDS", 5))
+        self.CHAT_STREAMING: bool = os.getenv("CHAT_STREAMING", "true").lower() == "true" # Stream answer tokens and tool progress to the chat UI
+
+        #Agent memory
+        self.MEMORY_STORE_PATH: str = os.getenv("MEMORY_STORE_PATH", os.path.join(BASE_DIR, "agent_memory", "memory.sqlite3"))
+        self.MEMORY_EMBEDDING_MODEL: str = os.getenv("MEMORY_EMBEDDING_MODEL", "text-embedding-3-small")
+        self.MEMORY_MAX_ITEMS_PER_NAMESPACE: int = int(os.getenv("MEMORY_MAX_ITEMS_PER_NAMESPACE", 1000)) # Least recently written or found memories are evicted past this
+        self.MEMORY_FLUSH_INTERVAL_MS: int = int(os.getenv("MEMORY_FLUSH_INTERVAL_MS", 500)) # Memory writes are committed and embedded in the background this long after the first one
+        self.MEMORY_EMBED_BATCH_SIZE: int = int(os.getenv("MEMORY_EMBED_BATCH_SIZE", 64)) # Memories per embedding request
+        self.MEMORY_CONSOLIDATE_INTERVAL_SECONDS: int = int(os.getenv("MEMORY_CONSOLIDATE_INTERVAL_SECONDS", 600))
+        self.MEMORY_CONSOLIDATE_SIMILARITY: float = float(os.getenv("MEMORY_CONSOLIDATE_SIMILARITY", 0.95)) # Memories this similar to a newer one are dropped on consolidation
+
+        #Conversation context
+        self.CONTEXT_HISTORY_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_HISTORY_TOKEN_BUDGET", 4000)) # Tokens of conversation summary and recent turns sent with each message
+        self.CONTEXT_KEEP_RATIO: float = float(os.getenv("CONTEXT_KEEP_RATIO", 0.5)) # Share of the budget left to recent turns after older ones are summarized
+        self.CONTEXT_SUMMARY_MODEL: str = os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4o-mini")
+        self.CONTEXT_SUMMARY_MAX_TOKENS: int = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", 500))
+        self.CONTEXT_TOKENIZER_MODEL: str = os.getenv("CONTEXT_TOKENIZER_MODEL", "gpt-4o") # tiktoken encoding used to count the tokens of prompts and retrieved context
+        self.CONTEXT_MAX_SESSIONS: int = int(os.getenv("CONTEXT_MAX_SESSIONS", 1000)) # Chat sessions whose summary is kept in memory
+
+
+    def validate(self, process: str):
+        """
+        Raises a ValueError if a setting required by the given process ("api", "mcp" or "client") is missing
+        """
+        for attribute, env_var in self.REQUIRED_BY_PROCESS[process].items():
+            if not getattr(self, attribute):
+                raise ValueError(f"{env_var} environment variable not set.")
+
 
 settings = Settings()
\ No newline at end of file
@@ -1,26 +1,42 @@
 import os
+import sys
 from loguru import logger
 from src.core.config.settings import settings
-
-# Ensure log directory exists
-os.makedirs(settings.LOG_DIR, exist_ok=True)
+from src.core.observability.tracing import current_request_id
 
 # Remove default handler (console output) if you only want file output initially
 logger.remove()
 
-# Add a handler for writing to a file, rotating daily and keeping old logs
-logger.add(
-    settings.LOG_FILE_PATH,
-    rotation="500 MB",  # Rotate log file when it reaches 500 MB
-    retention="30 days", # Keep logs for 30 days
-    level="INFO",      # Log messages at INFO level and above
-    format="{time} {level} {message}", # Basic format
-    enqueue=True       # Use a queue to make logging non-blocking (good for performance)
-)
+# Every line carries the id of the request it was logged for, "-" outside of requests
+logger.configure(patcher=lambda record: record["extra"].setdefault("request_id", current_request_id() or "-"))
 
-# Logging in console
+# Logging in console. stderr rather than stdout, the MCP server speaks its protocol over stdout
 logger.add(
-    lambda msg: print(msg, end=""),
+    sys.stderr,
     level="INFO",
-    format="<green>{time}</green> <level>{level}</level> <bold>{message}</bold>" # Colored console output
-)
\ No newline at end of file
+    format="<green>{time}</green> <level>{level}</level> <cyan>{extra[request_id]}</cyan> <bold>{message}</bold>" # Colored console output
+)
+
+_file_sink_id = None
+
+def add_file_sink():
+    """
+    Adds the rotating log file handler. Called at start up by the processes that log to file, the file sink
+    starts a background thread that short-lived processes (e.g. PDF parsing workers) do not need
+    """
+    global _file_sink_id
+    if _file_sink_id is not None:
+        return
+
+    # Ensure log directory exists
+    os.makedirs(settings.LOG_DIR, exist_ok=True)
+
+    # Add a handler for writing to a file, rotating daily and keeping old logs
+    _file_sink_id = logger.add(
+        settings.LOG_FILE_PATH,
+        rotation="500 MB",  # Rotate log file when it reaches 500 MB
+        retention="30 days", # Keep logs for 30 days
+        level="INFO",      # Log messages at INFO level and above
+        format="{time} {level} {extra[request_id]} {message}", # Basic format
+        enqueue=True       # Use a queue to make logging non-blocking (good for performance)
+    )
@@ -0,0 +1,85 @@
+from typing import Iterable
+import time
+
+from starlette.requests import Request
+from starlette.routing import compile_path
+from starlette.responses import PlainTextResponse, JSONResponse
+
+from src.core.observability import tracing
+from src.core.observability.metrics import registry
+
+http_request_seconds = registry.histogram(
+    "rag_http_request_seconds",
+    "Duration of the requests to the tracked endpoints",
+    ("method", "path", "status"),
+)
+
+#Spans returned by /traces when no limit is given
+DEFAULT_TRACES_LIMIT = 100
+
+
+class TracingMiddleware:
+    """
+    Binds a request id to every HTTP request, the one sent in the X-Request-ID header or a new one, and sends it back with the response.
+    Requests to the tracked endpoints (route templates such as "/v1/documents/jobs/{job_id}") are timed into rag_http_request_seconds.
+    Written as plain ASGI middleware, so it does not buffer responses or move the endpoint to another task like BaseHTTPMiddleware
+    """
+
+    def __init__(self, app, tracked_paths: Iterable[str] = ()):
+        self.app = app
+        #Matched against the request path here, the routing below may work on a copy of the scope
+        self.tracked_paths = [(path.rstrip("/") or "/", compile_path(path.rstrip("/") or "/")[0]) for path in tracked_paths]
+
+    def _tracked_path(self, path: str):
+        path = path.rstrip("/") or "/"
+        for template, regex in self.tracked_paths:
+            if regex.match(path):
+                return template
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = next((value for name, value in scope["headers"] if name == tracing.REQUEST_ID_HEADER.encode()), None)
+        request_id = tracing.accept_request_id(header.decode("latin-1") if header else None)
+        #Handlers that do not run in the request's context (e.g. MCP tools) read it from the request state
+        scope.setdefault("state", {})["request_id"] = request_id
+        token = tracing.bind_request_id(request_id)
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(tracing.REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            #The route template keeps path parameters out of the label values
+            path = self._tracked_path(scope["path"]) if self.tracked_paths else None
+            if path:
+                seconds = time.perf_counter() - start
+                http_request_seconds.observe(seconds, method=scope["method"], path=path, status=status)
+                tracing.record("http", seconds, "ok" if status < 500 else "error", method=scope["method"], path=path, status=status)
+            tracing.reset_request_id(token)
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """
+    Metrics of this process in the Prometheus text format
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+async def traces_endpoint(request: Request) -> JSONResponse:
+    """
+    Most recent spans of this process, newest first. Filtered with ?request_id=, at most ?limit= of them
+    """
+    limit = request.query_params.get("limit", "")
+    spans = tracing.recent_spans(request.query_params.get("request_id"), int(limit) if limit.isdigit() else DEFAULT_TRACES_LIMIT)
+    return JSONResponse({"spans": spans})
@@ -0,0 +1,105 @@
+from contextvars import ContextVar, Token
+from collections import deque
+from typing import Dict, List, Optional
+import threading
+import time
+import uuid
+import re
+
+from src.core.config.settings import settings
+from src.core.observability.metrics import registry
+
+#Header carrying the request id between the clients, the API and the MCP server, and key of the MCP "_meta" field carrying it
+REQUEST_ID_HEADER = "x-request-id"
+REQUEST_ID_META_KEY = "request_id"
+
+#Incoming request ids end up in logs and label values, anything else is replaced by a new id
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+stage_seconds = registry.histogram(
+    "rag_stage_seconds",
+    "Duration of the stages of ingestion, retrieval and deletion",
+    ("stage", "outcome"),
+)
+
+#Most recent spans of the process, served on /traces. Kept as (request id, stage, start, seconds, outcome, attributes)
+#tuples, they only become dicts when read
+_spans: deque = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+_spans_lock = threading.Lock()
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def accept_request_id(value: Optional[str]) -> str:
+    """
+    Returns the request id sent by the caller if it is well formed, a new one otherwise
+    """
+    if value and _VALID_REQUEST_ID.match(value):
+        return value
+    return new_request_id()
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def bind_request_id(request_id: str) -> Token:
+    """
+    Makes the request id current for the calling task and the tasks and threads it starts, until reset_request_id is called with the token
+    """
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token: Token):
+    _request_id.reset(token)
+
+
+def record(stage: str, seconds: float, outcome: str = "ok", **attributes):
+    """
+    Records a stage that took the given time: observed in the stage histogram and kept as a span of the current request
+    """
+    if not settings.METRICS_ENABLED:
+        return
+    stage_seconds.observe(seconds, stage=stage, outcome=outcome)
+    with _spans_lock:
+        _spans.append((_request_id.get(), stage, time.time() - seconds, seconds, outcome, attributes))
+
+
+class span:
+    """
+    Context manager timing the enclosed block as a stage of the current request. A block that raises is recorded with the "error" outcome
+    """
+
+    __slots__ = ("stage", "attributes", "start")
+
+    def __init__(self, stage: str, **attributes):
+        self.stage = stage
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        record(self.stage, time.perf_counter() - self.start, "ok" if exc_type is None else "error", **self.attributes)
+        return False
+
+
+def recent_spans(request_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """
+    Returns up to limit of the most recent spans, newest first, only those of the given request if one is given
+    """
+    with _spans_lock:
+        spans = list(_spans)
+    spans.reverse()
+    if request_id:
+        spans = [span for span in spans if span[0] == request_id]
+    return [
+        {"request_id": span_request_id, "stage": stage, "start": start, "duration_ms": round(seconds * 1000, 3), "outcome": outcome}
+        | ({"attributes": attributes} if attributes else {})
+        for span_request_id, stage, start, seconds, outcome, attributes in spans[:limit]
+    ]
@@ -1,5 +1,10 @@
 from src.core.config.settings import settings
-from pymongo import AsyncMongoClient
+from pymongo import AsyncMongoClient, ASCENDING
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+from typing import Dict, List, Any, Optional, Tuple
+import base64
+import json
 from src.core.logging.logger import logger
 
 client: AsyncMongoClient= None
@@ -7,16 +12,146 @@ db= None
 
 uri = settings.DATABASE_URI
 
+#Orders documents can be listed in, with the fields of their keyset. Each one is served by an index, so a page is one index range scan
+LIST_ORDERS = {
+    "filename": ["filename"],
+    "expiry": ["expiry_ts", "_id"],
+}
+
 async def connect_to_mongo():
     global client, db
     try:
-        client = AsyncMongoClient(uri)
+        client = AsyncMongoClient(
+            uri,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS or None,
+            maxConnecting=settings.MONGO_MAX_CONNECTING,
+            waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        )
         db = client["proj1"]
         logger.info("Connected to MongoDB.")
     except Exception as e:
         logger.error(f"MongoDB connection failed: {e}")
         raise
 
+async def _ensure_filename_index(documents):
+    """
+    Makes filenames unique, each file has one metadata document that re-uploads replace.
+    Collections that already hold the same filename twice get a plain index until the duplicates are removed, the unique one is tried again on every start
+    """
+    #MongoDB keeps one index per key pattern, the plain index of an earlier start has to go first
+    if "filename" in await documents.index_information():
+        await documents.drop_index("filename")
+    try:
+        await documents.create_index("filename", unique=True, name="filename_unique")
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        duplicates = await documents.aggregate([
+            {"$group": {"_id": "$filename", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$count": "filenames"},
+        ]).to_list()
+        count = duplicates[0]["filenames"] if duplicates else 0
+        logger.warning(f"{count} filenames are stored more than once, filenames are indexed but not unique until the duplicates are deleted")
+        await documents.create_index("filename", name="filename")
+
+async def ensure_indexes():
+    """
+    Creates the indexes the API relies on, if they do not exist yet
+    """
+    documents = db["documents_collection"]
+    #Expired documents are removed by the expiry sweeper, the TTL index only catches what the sweeper missed
+    await documents.create_index("expires_at", expireAfterSeconds=settings.EXPIRY_TTL_GRACE_SECONDS, name="expires_at_ttl")
+    #Serves the expiry sweeper, expiry range filters and the keyset of listings in expiry order
+    await documents.create_index([("expiry_ts", ASCENDING), ("_id", ASCENDING)], name="expiry_ts_id")
+    if "expiry_ts" in await documents.index_information():
+        await documents.drop_index("expiry_ts")
+    await documents.create_index("content_hash", name="content_hash")
+    await _ensure_filename_index(documents)
+    logger.info("MongoDB indexes are in place")
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Opaque cursor holding the keyset of the last document of a page
+    """
+    encoded = [{"$oid": str(value)} if isinstance(value, ObjectId) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded).encode()).decode()
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Raises:
+        ValueError: If the cursor was not returned by encode_cursor
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [ObjectId(value["$oid"]) if isinstance(value, dict) else value for value in values]
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _after(fields: List[str], values: List[Any]) -> Dict:
+    """
+    Filter matching the documents that come after the keyset values, for ascending order on the fields
+    """
+    clauses = []
+    for n, field in enumerate(fields):
+        clause = {previous: value for previous, value in zip(fields[:n], values[:n])}
+        clause[field] = {"$gt": values[n]}
+        clauses.append(clause)
+    if len(clauses) == 1:
+        return clauses[0]
+    #The bound on the first field keeps the index scan a range starting at the cursor
+    return {fields[0]: {"$gte": values[0]}, "$or": clauses}
+
+async def list_documents(
+    filter: Dict,
+    order: str = "filename",
+    limit: int = settings.LIST_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    projection: Optional[List[str]] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Returns a page of the documents matching the filter and the cursor of the next page, None on the last page.
+    Pages continue after the keyset of the previous page's last document instead of skipping over the previous pages,
+    so a page costs the same at any depth
+    Args:
+        filter (dict) : MongoDB filter on the metadata
+        order (str) : One of LIST_ORDERS
+        limit (int) : Documents per page
+        cursor (str) : Cursor returned with the previous page
+        projection (list) : Fields returned for every document, all of them if None
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    fields = LIST_ORDERS[order]
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(fields):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        filter = {"$and": [filter, _after(fields, values)]} if filter else _after(fields, values)
+
+    #The keyset fields are always read, to build the next cursor
+    fetched = None
+    if projection is not None:
+        fetched = {field: 1 for field in projection + fields}
+    documents = await db["documents_collection"].find(filter, fetched).sort([(field, ASCENDING) for field in fields]).limit(limit + 1).to_list()
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor([documents[-1].get(field) for field in fields])
+    for document in documents:
+        if projection is not None:
+            for field in fields:
+                if field not in projection and field != "_id" and field in document:
+                    del document[field]
+        if "_id" in document:
+            document["id"] = str(document.pop("_id"))
+    return documents, next_cursor
+
 async def close_mongo_connection():
     if client:
         await client.close()
@@ -26,5 +161,3 @@ def get_db() -> AsyncMongoClient:
     if db is None:
         raise RuntimeError("Database has not been initialized.")
     return db
-
-
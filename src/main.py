@@ -1,17 +1,32 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import gc
 
 from src.core.config.settings import settings
+from src.core.logging.logger import add_file_sink
+from src.core.observability.asgi import TracingMiddleware, metrics_endpoint, traces_endpoint
 from src.api.router import api_router
 from src.database import database
 from src.services.object_store import storage
+from src.services.ingestion import job_queue
+from src.services.vector_store import pdf_loader
+from src.services.expiry import sweeper
+
+settings.validate("api")
+add_file_sink()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await database.connect_to_mongo()
+    await database.ensure_indexes()
     await storage.connect_to_storage()
+    await job_queue.start_workers(database.get_db())
+    await sweeper.start_sweeper(database.get_db())
     yield
+    await sweeper.stop_sweeper()
+    await job_queue.stop_workers()
+    pdf_loader.shutdown_pool()
     if database.db != None:
         await database.close_mongo_connection()
     if storage.s3 != None:
@@ -27,5 +42,30 @@ app = FastAPI(
 )
 
 
+#Room left for the multipart boundaries and form fields around the uploaded file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Rejects uploads whose declared Content-Length is over the limit before their body is read.
+    Uploads without a Content-Length are checked while they are spooled
+    """
+    content_length = request.headers.get("content-length")
+    if request.method == "POST" and content_length and content_length.isdigit():
+        max_files = settings.BULK_MAX_FILES if request.url.path.endswith("/bulk-upload") else 1
+        limit = settings.MAX_UPLOAD_BYTES * max_files + MULTIPART_OVERHEAD_BYTES
+        if int(content_length) > limit:
+            return JSONResponse(status_code=413, content={"detail": f"Request body is larger than the maximum of {limit} bytes"})
+    return await call_next(request)
+
+
+#Added last so it wraps the other middleware, rejected uploads get a request id too
+app.add_middleware(TracingMiddleware, tracked_paths=settings.TRACKED_ENDPOINTS)
+
 # Including API router
-app.include_router(api_router, prefix=settings.API_V1_STR)
\ No newline at end of file
+app.include_router(api_router, prefix=settings.API_V1_STR)
+
+if settings.METRICS_ENABLED:
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    app.add_route("/traces", traces_endpoint, include_in_schema=False)
\ No newline at end of file
@@ -0,0 +1,149 @@
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import time
+
+import gradio as gr
+
+from src.core.observability import tracing
+
+#Progress shown while a tool runs, tools not listed show their name
+TOOL_LABELS = {
+    "retrieve": "Retrieving documents",
+    "retrieve_many": "Retrieving documents",
+    "search_memory": "Searching memory",
+    "manage_memory": "Updating memory",
+}
+
+#Graph node of create_react_agent whose model output is the answer
+AGENT_NODE = "agent"
+
+
+@dataclass
+class TurnStats:
+    """
+    Timings of a streamed chat turn, in seconds from the moment the message was received
+    """
+    start: float = field(default_factory=time.perf_counter)
+    first_update: Optional[float] = None
+    first_token: Optional[float] = None
+    tool_calls: int = 0
+    answer: str = ""
+    usage: Dict[str, Any] = field(default_factory=dict)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def describe(self) -> str:
+        def ms(seconds: Optional[float]) -> str:
+            return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+        cached = (self.usage.get("input_token_details") or {}).get("cache_read", 0)
+        return (
+            f"first token {ms(self.first_token)}, first update {ms(self.first_update)}, turn {ms(self.elapsed())}, "
+            f"{self.tool_calls} tool calls, last model call prompt of {self.usage.get('input_tokens', '-')} tokens ({cached} cached)"
+        )
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    #Content blocks, as some providers stream them
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict) and block.get("type") == "text")
+
+
+def _arguments(arguments) -> str:
+    if isinstance(arguments, dict):
+        arguments = ", ".join(str(value) for value in arguments.values())
+    arguments = str(arguments or "")
+    return arguments if len(arguments) <= 200 else arguments[:200] + "…"
+
+
+def _copy(messages: List[gr.ChatMessage]) -> List[gr.ChatMessage]:
+    return [gr.ChatMessage(role=message.role, content=message.content, metadata=dict(message.metadata)) for message in messages]
+
+
+async def stream_turn(agent, messages: List[Dict[str, str]], stats: TurnStats) -> AsyncIterator[List[gr.ChatMessage]]:
+    """
+    Runs the agent on the messages and yields the messages gr.ChatInterface shows for the turn every time they change:
+    a collapsible message per tool call, pending until the tool returns, and the answer as its tokens arrive
+    Args:
+        agent : Agent built by create_react_agent
+        messages (list) : Messages of the turn, as built by ConversationContext
+        stats (TurnStats) : Filled with the time to first token, the tool calls, the answer and the token usage
+    """
+    shown: List[gr.ChatMessage] = []
+    answer = gr.ChatMessage(role="assistant", content="")
+    #Progress message and start time of the running tool calls, by run id
+    tools: Dict[str, tuple] = {}
+    async with aclosing(agent.astream_events({"messages": messages}, version="v2")) as events:
+        async for event in events:
+            kind = event["event"]
+            if kind == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == AGENT_NODE:
+                text = _text(event["data"]["chunk"].content)
+                if not text:
+                    continue
+                if stats.first_token is None:
+                    stats.first_token = stats.elapsed()
+                    tracing.record("chat.first_token", stats.first_token)
+                if not shown or shown[-1] is not answer:
+                    shown.append(answer)
+                answer.content += text
+            elif kind == "on_chat_model_end" and event["metadata"].get("langgraph_node") == AGENT_NODE:
+                stats.usage = getattr(event["data"].get("output"), "usage_metadata", None) or {}
+                continue
+            elif kind == "on_tool_start":
+                stats.tool_calls += 1
+                progress = gr.ChatMessage(
+                    role="assistant",
+                    content=_arguments(event["data"].get("input")),
+                    metadata={"title": f"{TOOL_LABELS.get(event['name'], event['name'])}…", "status": "pending"},
+                )
+                tools[event["run_id"]] = (progress, time.perf_counter())
+                shown.append(progress)
+                #Text the model writes after the tool call goes below it
+                if answer.content:
+                    answer = gr.ChatMessage(role="assistant", content="")
+            elif kind in ("on_tool_end", "on_tool_error") and event["run_id"] in tools:
+                progress, started = tools.pop(event["run_id"])
+                progress.metadata["duration"] = round(time.perf_counter() - started, 2)
+                progress.metadata["status"] = "done"
+                if kind == "on_tool_error":
+                    progress.metadata["title"] = progress.metadata["title"].rstrip("…") + " failed"
+            else:
+                continue
+            if stats.first_update is None:
+                stats.first_update = stats.elapsed()
+            yield _copy(shown)
+    stats.answer = "\n\n".join(message.content for message in shown if not message.metadata.get("title"))
+
+
+async def stream_task(produce: Callable[[Callable[[Any], None]], Awaitable[None]]) -> AsyncIterator[Any]:
+    """
+    Runs produce(publish) in a task of its own and yields what it publishes, only the most recent value when the consumer
+    falls behind. Gradio may advance a generator from different tasks, a task of its own keeps the request id bound for the
+    whole turn. The task is cancelled when the iteration stops early, as when the user stops a generation, and its errors
+    are raised to the consumer
+    """
+    latest, published = None, False
+    changed = asyncio.Event()
+
+    def publish(value):
+        nonlocal latest, published
+        latest, published = value, True
+        changed.set()
+
+    task = asyncio.create_task(produce(publish))
+    task.add_done_callback(lambda _: changed.set())
+    try:
+        while True:
+            await changed.wait()
+            changed.clear()
+            if published:
+                value, published = latest, False
+                yield value
+            if task.done() and not published:
+                task.result()
+                return
+    finally:
+        task.cancel()
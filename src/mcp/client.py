@@ -3,14 +3,16 @@ from mcp.client.stdio import stdio_client
 
 from langchain_mcp_adapters.tools import load_mcp_tools
 from langgraph.prebuilt import create_react_agent
-from langgraph.store.memory import InMemoryStore
 from langmem import create_manage_memory_tool, create_search_memory_tool
 
 import asyncio
 import gradio as gr
 
 from src.core.config.settings import settings
-from src.core.logging.logger import logger
+from src.core.logging.logger import logger, add_file_sink
+from src.mcp.memory_store import open_memory_store
+from src.mcp.conversation_context import ConversationContext
+from src.mcp.chat_stream import TurnStats, stream_turn, stream_task
 
 server_params = StdioServerParameters(
     command="python",
@@ -18,18 +20,15 @@ server_params = StdioServerParameters(
 )
 
 async def main():
+    settings.validate("client")
+    add_file_sink()
     async with stdio_client(server_params) as (read, write):
         async with ClientSession(read, write) as session:
             # Initialize the connection
             await session.initialize()
 
             #Setting up the storage
-            store = InMemoryStore(
-            index={
-                "dims": 1536,
-                "embed": "openai:text-embedding-3-small",
-                }
-            ) 
+            store = open_memory_store()
 
             # Get tools
             tools = await load_mcp_tools(session)
@@ -41,7 +40,7 @@ async def main():
             global agent
             agent = create_react_agent("openai:gpt-4.1", tools, store=store)
 
-            demo= gr.ChatInterface(chat,
+            demo= gr.ChatInterface(stream_chat if settings.CHAT_STREAMING else chat,
                                    type= 'messages',
                                    title= 'RAG MCP Test chat',
                                    description= 'Upload files (not yet implemented) and ask questions regarding those files',
@@ -69,24 +68,41 @@ async def chat_loop(agent):
         })
         print("Agent response:", agent_response['messages'][-1].content)
 
-async def chat(message, history):
-    # System prompt
-    messages = [{"role": "system", "content": "You are an AI assistant that can remember all conversation in memory. Store every message in memory"}]
-
-    # for user_msg, bot_msg in history: # Populating messages list with history
-    #     messages.append({"role": "user", "content": user_msg}) 
-    #     messages.append({"role": "assistant", "content": bot_msg})
-    # messages.append({"role": "user", "content": message})
-
-     # history is a list of dicts like {'role': 'user'/'assistant', 'content': '...'}
-    messages.extend(history)
+# Recent turns and a rolling summary of the older ones, per chat session
+context = ConversationContext(
+    system_prompt="You are an AI assistant that can remember all conversation in memory. Store every message in memory",
+    history_budget=settings.CONTEXT_HISTORY_TOKEN_BUDGET,
+    keep_ratio=settings.CONTEXT_KEEP_RATIO,
+    summary_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS,
+    max_sessions=settings.CONTEXT_MAX_SESSIONS,
+)
 
-    # Add the latest user message
-    messages.append({"role": "user", "content": message})
+async def chat(message, history, request: gr.Request = None):
+    # System prompt, conversation summary, recent history and the latest user message
+    # history is a list of dicts like {'role': 'user'/'assistant', 'content': '...'}
+    session_id = request.session_hash if request is not None else "default"
+    messages = await context.build(session_id, history, message)
     agent_response = await agent.ainvoke({
             "messages": messages
     })
-    return agent_response['messages'][-1].content
+    response_content = agent_response['messages'][-1].content
+    context.after_turn(session_id, history, message, response_content)
+    return response_content
+
+async def stream_chat(message, history, request: gr.Request = None):
+    # Shows the tool calls as they run and the answer as it is generated
+    session_id = request.session_hash if request is not None else "default"
+    stats = TurnStats()
+
+    async def turn(publish):
+        messages = await context.build(session_id, history, message)
+        async for shown in stream_turn(agent, messages, stats):
+            publish(shown)
+        logger.info(f"Turn timings: {stats.describe()}")
+        context.after_turn(session_id, history, message, stats.answer)
+
+    async for shown in stream_task(turn):
+        yield shown
 
 if __name__== '__main__':
     asyncio.run(main())
\ No newline at end of file
@@ -1,97 +1,149 @@
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
 from langchain_mcp_adapters.tools import load_mcp_tools
 from langgraph.prebuilt import create_react_agent
-from langgraph.store.memory import InMemoryStore
+from langchain_openai import ChatOpenAI
 from langmem import create_manage_memory_tool, create_search_memory_tool
 import asyncio
 import gradio as gr
 from src.core.config.settings import settings
-from src.core.logging.logger import logger
+from src.core.logging.logger import logger, add_file_sink
+from src.mcp.session_pool import AgentPool
+from src.mcp.memory_store import open_memory_store
+from src.mcp.conversation_context import ConversationContext
+from src.mcp.chat_stream import TurnStats, stream_turn, stream_task
+from src.core.observability import tracing
 
 server_params = StdioServerParameters(
     command="python",
     args=["-m", "src.mcp.server"],
 )
 
-# Global store to maintain memory across requests
-store = InMemoryStore(
-    index={
-        "dims": 1536,
-        "embed": "openai:text-embedding-3-small",
-    }
+# Global store to maintain memory across requests, persisted on disk and written in the background
+store = open_memory_store()
+
+async def build_agent(session: ClientSession):
+    """Load the MCP tools of a session and build the agent on top of them"""
+    # Get tools
+    tools = await load_mcp_tools(session)
+    tools.append(create_manage_memory_tool(namespace=("memories",), store=store))
+    tools.append(create_search_memory_tool(namespace=("memories",), store=store))
+
+    # Create agent, token usage is only reported on streamed responses when asked for
+    return create_react_agent(ChatOpenAI(model="gpt-4o", stream_usage=True), tools, store=store)
+
+def connect():
+    """Open the transport to the MCP server, spawning a server process unless it is served over HTTP"""
+    if settings.MCP_TRANSPORT == "streamable-http":
+        return streamablehttp_client(settings.MCP_SERVER_URL)
+    return stdio_client(server_params)
+
+# Long-lived MCP sessions and agents shared across chat requests
+agent_pool = AgentPool(
+    connect=connect,
+    build_agent=build_agent,
+    max_size=settings.MCP_POOL_SIZE,
 )
 
-async def create_agent_with_tools():
-    """Create an agent with MCP tools for each request"""
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            # Initialize the connection
-            await session.initialize()
-            
-            # Get tools
-            tools = await load_mcp_tools(session)
-            tools.append(create_manage_memory_tool(namespace=("memories",), store=store))
-            tools.append(create_search_memory_tool(namespace=("memories",), store=store))
-            
-            # Create agent
-            agent = create_react_agent("openai:gpt-4o", tools, store=store)
-            
-            return agent, session
+# Recent turns and a rolling summary of the older ones, per chat session
+context = ConversationContext(
+    system_prompt="You are an AI assistant that can remember all conversation in memory. Store every message in memory",
+    history_budget=settings.CONTEXT_HISTORY_TOKEN_BUDGET,
+    keep_ratio=settings.CONTEXT_KEEP_RATIO,
+    summary_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS,
+    max_sessions=settings.CONTEXT_MAX_SESSIONS,
+)
 
-async def chat(message, history):
+async def chat(message, history, request: gr.Request = None):
     """Chat function for Gradio interface"""
+    # The MCP tool calls of this message are traced under the same request id
+    token = tracing.bind_request_id(tracing.new_request_id())
     try:
         logger.info(f"Received message: {message}")
         
-        # Create agent with tools for this request
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                # Initialize the connection
-                await session.initialize()
-                
-                # Get tools
-                tools = await load_mcp_tools(session)
-                tools.append(create_manage_memory_tool(namespace=("memories",), store=store))
-                tools.append(create_search_memory_tool(namespace=("memories",), store=store))
-                
-                # Create agent
-                agent = create_react_agent("openai:gpt-4o", tools, store=store)
-                
-                # System prompt
-                messages = [{"role": "system", "content": "You are an AI assistant that can remember all conversation in memory. Store every message in memory"}]
-                
-                # Add history
-                messages.extend(history)
-                
-                # Add the latest user message
-                messages.append({"role": "user", "content": message})
-                
-                logger.info("Invoking agent...")
-                
-                # Get agent response
-                agent_response = await agent.ainvoke({
-                    "messages": messages
-                })
-                
-                response_content = agent_response['messages'][-1].content
-                logger.info(f"Agent response: {response_content}")
-                
-                return response_content
+        # System prompt, conversation summary, recent history and the latest user message
+        session_id = request.session_hash if request is not None else "default"
+        with tracing.span("chat.context"):
+            messages = await context.build(session_id, history, message)
+
+        # Borrow an initialized agent from the pool for this request
+        async with agent_pool.acquire() as agent:
+            logger.info("Invoking agent...")
+            
+            # Get agent response
+            agent_response = await agent.ainvoke({
+                "messages": messages
+            })
+            
+        response_content = agent_response['messages'][-1].content
+        logger.info(f"Agent response: {response_content}")
+        usage = getattr(agent_response['messages'][-1], "usage_metadata", None) or {}
+        logger.info(f"Prompt tokens of the last model call: {usage.get('input_tokens')}, cached: {usage.get('input_token_details', {}).get('cache_read')}")
+        context.after_turn(session_id, history, message, response_content)
+        
+        return response_content
                 
     except Exception as e:
         logger.error(f"Error in chat: {e}")
         import traceback
         traceback.print_exc()
         return f"Error: {str(e)}"
+    finally:
+        tracing.reset_request_id(token)
+
+async def stream_chat(message, history, request: gr.Request = None):
+    """Streaming chat function for Gradio interface, shows the tool calls as they run and the answer as it is generated"""
+    session_id = request.session_hash if request is not None else "default"
+    stats = TurnStats()
+
+    async def turn(publish):
+        # The MCP tool calls of this message are traced under the same request id
+        token = tracing.bind_request_id(tracing.new_request_id())
+        try:
+            logger.info(f"Received message: {message}")
+
+            # System prompt, conversation summary, recent history and the latest user message
+            with tracing.span("chat.context"):
+                messages = await context.build(session_id, history, message)
+
+            # Borrow an initialized agent from the pool for this request
+            async with agent_pool.acquire() as agent:
+                logger.info("Streaming agent...")
+                async for shown in stream_turn(agent, messages, stats):
+                    publish(shown)
+
+            tracing.record("chat.turn", stats.elapsed())
+            logger.info(f"Agent response: {stats.answer}")
+            logger.info(f"Turn timings: {stats.describe()}")
+            context.after_turn(session_id, history, message, stats.answer)
+
+        except asyncio.CancelledError:
+            # The user stopped the generation, the agent and the tool call in flight are cancelled with this task
+            tracing.record("chat.turn", stats.elapsed(), outcome="cancelled")
+            logger.info(f"Generation stopped by the user after {stats.elapsed() * 1000:.0f} ms")
+            raise
+        finally:
+            tracing.reset_request_id(token)
+
+    try:
+        async for shown in stream_task(turn):
+            yield shown
+    except Exception as e:
+        logger.error(f"Error in chat: {e}")
+        import traceback
+        traceback.print_exc()
+        yield f"Error: {str(e)}"
 
 def main():
     """Main function to set up and run the application"""
+    settings.validate("client")
+    add_file_sink()
     logger.info("Starting RAG MCP Test chat...")
     
     # Create Gradio interface
     demo = gr.ChatInterface(
-        chat,
+        stream_chat if settings.CHAT_STREAMING else chat,
         type='messages',
         title='RAG MCP Test chat',
         description='Upload files (not yet implemented) and ask questions regarding those files',
@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import hashlib
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+from src.core.observability import tracing
+from src.services.vector_store.context_assembly import count_tokens
+
+#Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a user and an assistant answering questions about documents. "
+    "Update the summary with the new messages. Keep the facts, names, documents, dates, decisions and open questions, "
+    "drop greetings and repetition. Answer with the updated summary only, in at most {max_tokens} tokens.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+#Takes the current summary and the messages to fold into it, returns the updated summary
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+def message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def _text_messages(history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    The user and assistant text messages of a Gradio history, without tool progress messages and files.
+    A streamed answer is shown as several assistant messages around its tool calls, they are joined back into the single
+    message after_turn records for the turn
+    """
+    messages = []
+    for message in history:
+        if message.get("role") not in ("user", "assistant") or (message.get("metadata") or {}).get("title"):
+            continue
+        content = message.get("content")
+        if not isinstance(content, str):
+            continue
+        if message["role"] == "assistant" and messages and messages[-1]["role"] == "assistant":
+            messages[-1] = {"role": "assistant", "content": messages[-1]["content"] + "\n\n" + content}
+        else:
+            messages.append({"role": message["role"], "content": content})
+    return messages
+
+
+def _fingerprint(message: Dict[str, str]) -> str:
+    return hashlib.sha1(f"{message['role']}:{message['content']}".encode()).hexdigest()
+
+
+async def summarize_with_llm(summary: str, messages: List[Dict[str, str]]) -> str:
+    """
+    Folds the messages into the summary with CONTEXT_SUMMARY_MODEL
+    """
+    model = _summary_model()
+    prompt = SUMMARY_PROMPT.format(
+        max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS,
+        summary=summary or "(empty)",
+        messages="\n".join(f"{message['role']}: {message['content']}" for message in messages),
+    )
+    response = await model.ainvoke(prompt)
+    return response.content.strip()
+
+
+@lru_cache(maxsize=1)
+def _summary_model():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=settings.CONTEXT_SUMMARY_MODEL, max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS, temperature=0)
+
+
+@dataclass
+class _Session:
+    summary: str = ""
+    #History messages folded into the summary, and the fingerprint of the last one to notice an edited or cleared history
+    summarized: int = 0
+    fingerprint: str = ""
+    folding: Optional[asyncio.Task] = None
+
+
+class ConversationContext:
+    """
+    Builds the messages sent to the agent for a chat turn within a token budget.
+
+    The system prompt comes first, then the rolling summary of the older turns, then the recent turns verbatim and the new
+    message. Once the summary and the recent turns go over history_budget tokens, the oldest turns are folded into the
+    summary, of up to summary_tokens tokens, until both fit in keep_ratio of the budget. Folding a whole block at once, and
+    right after a response rather than before the next turn when possible, keeps the prompt append-only between folds, so
+    the provider's prompt cache covers everything but the new turn.
+
+    State is kept per session (the Gradio session hash), for the max_sessions most recently active sessions.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        summarize: Summarizer = summarize_with_llm,
+        history_budget: int = 4000,
+        keep_ratio: float = 0.5,
+        summary_tokens: int = 500,
+        max_sessions: int = 1000,
+    ):
+        self.system_prompt = system_prompt
+        self.summarize = summarize
+        self.history_budget = history_budget
+        self.keep_ratio = keep_ratio
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    def _session(self, session_id: str) -> _Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                if evicted.folding is not None:
+                    evicted.folding.cancel()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _history_tokens(self, session: _Session, recent: List[Dict[str, str]]) -> int:
+        summary = count_tokens(SUMMARY_PREFIX + session.summary) + MESSAGE_OVERHEAD_TOKENS if session.summary else 0
+        return summary + message_tokens(recent)
+
+    async def _fold(self, session: _Session, history: List[Dict[str, str]], extra_tokens: int = 0):
+        """
+        Folds the oldest unsummarized turns of the history into the summary, so the summary, the remaining turns and extra_tokens
+        fit in keep_ratio of the budget
+        """
+        start = session.summarized
+        recent = history[start:]
+        #The summary can grow up to summary_tokens
+        target = self.history_budget * self.keep_ratio - self.summary_tokens - extra_tokens
+        remaining = message_tokens(recent)
+        cut = 0
+        #Cut before a user message, so the verbatim part starts with a whole turn
+        while cut < len(recent) and (remaining > target or recent[cut]["role"] != "user"):
+            remaining -= message_tokens(recent[cut:cut + 1])
+            cut += 1
+        if cut == 0:
+            return
+        with tracing.span("chat.summarize", messages=cut):
+            summary = await self.summarize(session.summary, recent[:cut])
+        #The history was edited while summarizing
+        if session.summarized != start:
+            return
+        session.summary = summary
+        session.summarized = start + cut
+        session.fingerprint = _fingerprint(history[session.summarized - 1])
+        logger.info(f"Folded {cut} messages into the conversation summary, {session.summarized} summarized so far")
+
+    async def build(self, session_id: str, history: List[Dict[str, Any]], message: str) -> List[Dict[str, str]]:
+        """
+        Returns the messages to send for the new message of a session, given the full Gradio history before it
+        """
+        session = self._session(session_id)
+        history = _text_messages(history)
+        if session.folding is not None:
+            try:
+                await session.folding
+            except Exception as e:
+                logger.error(f"Could not summarize the conversation: {e}")
+            session.folding = None
+        if session.summarized > len(history) or (session.summarized and session.fingerprint != _fingerprint(history[session.summarized - 1])):
+            #Cleared, retried or edited history, the summary no longer describes it
+            self._sessions[session_id] = session = _Session()
+
+        new_message = {"role": "user", "content": message}
+        extra_tokens = message_tokens([new_message])
+        if self._history_tokens(session, history[session.summarized:]) + extra_tokens > self.history_budget:
+            try:
+                await self._fold(session, history, extra_tokens)
+            except Exception as e:
+                #The turn goes out over the budget rather than failing, the next one tries again
+                logger.error(f"Could not summarize the conversation: {e}")
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if session.summary:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + session.summary})
+        messages.extend(history[session.summarized:])
+        messages.append(new_message)
+        return messages
+
+    def after_turn(self, session_id: str, history: List[Dict[str, Any]], message: str, response: str):
+        """
+        Starts folding the older turns in the background once the history including the turn just answered is over the budget,
+        so the next turn does not wait for the summary
+        """
+        session = self._session(session_id)
+        history = _text_messages(history) + [{"role": "user", "content": message}, {"role": "assistant", "content": response}]
+        if session.folding is None and self._history_tokens(session, history[session.summarized:]) > self.history_budget:
+            session.folding = asyncio.get_running_loop().create_task(self._fold(session, history))
@@ -0,0 +1,455 @@
+from langgraph.store.base import BaseStore, Item, SearchItem, GetOp, PutOp, SearchOp, ListNamespacesOp, Op, Result
+from langchain_core.embeddings import Embeddings
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+import asyncio
+import sqlite3
+import atexit
+import json
+import time
+import os
+
+import numpy as np
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+
+#Separates the parts of a namespace in the namespace column
+NAMESPACE_SEPARATOR = "\x1f"
+
+Namespace = Tuple[str, ...]
+
+#Comparison operators accepted in search filters, besides plain equality
+_FILTER_OPERATORS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+}
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def _encode_namespace(namespace: Namespace) -> str:
+    return NAMESPACE_SEPARATOR.join(namespace)
+
+
+def _decode_namespace(namespace: str) -> Namespace:
+    return tuple(namespace.split(NAMESPACE_SEPARATOR))
+
+
+def _text(value: Dict[str, Any], index: Optional[List[str]]) -> Optional[str]:
+    """
+    Text embedded for a memory: the given top level fields, or its "content" (what langmem stores), or the whole value
+    """
+    if index is False:
+        return None
+    if index:
+        parts = [value.get(field) for field in index]
+    elif "content" in value:
+        parts = [value["content"]]
+    else:
+        parts = [value]
+    return "\n".join(part if isinstance(part, str) else json.dumps(part, ensure_ascii=False) for part in parts if part is not None)
+
+
+def _matches(value: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    for field, condition in (filter or {}).items():
+        if isinstance(condition, dict) and condition and all(operator in _FILTER_OPERATORS for operator in condition):
+            if not all(_FILTER_OPERATORS[operator](value.get(field), target) for operator, target in condition.items()):
+                return False
+        elif value.get(field) != condition:
+            return False
+    return True
+
+
+def _namespace_matches(namespace: Namespace, op: ListNamespacesOp) -> bool:
+    for condition in op.match_conditions or ():
+        path = tuple(condition.path)
+        if len(path) > len(namespace):
+            return False
+        part = namespace[:len(path)] if condition.match_type == "prefix" else namespace[len(namespace) - len(path):]
+        if any(expected != "*" and expected != actual for expected, actual in zip(path, part)):
+            return False
+    return True
+
+
+class SQLiteMemoryStore(BaseStore):
+    """
+    Agent memory kept in a local SQLite file, so it survives restarts, with at most max_items memories per namespace.
+
+    Writes are buffered and returned at once: a background task commits them and embeds their text in batches after
+    flush_interval seconds, off the path of the chat response. Searches see buffered writes, and memories not embedded yet
+    are embedded in the same request as the query. Past max_items, the memories least recently written or found are evicted,
+    and every consolidate_interval seconds memories nearly identical (cosine similarity over consolidate_similarity) to a
+    newer one of their namespace are dropped. The vectors of a namespace are cached in memory as one normalized matrix,
+    so a search is one matrix product over at most max_items rows, however long the history.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embeddings: Optional[Embeddings] = None,
+        max_items: int = 1000,
+        flush_interval: float = 0.5,
+        embed_batch_size: int = 64,
+        consolidate_interval: float = 600,
+        consolidate_similarity: float = 0.95,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.embeddings = embeddings
+        self.max_items = max_items
+        self.flush_interval = flush_interval
+        self.embed_batch_size = embed_batch_size
+        self.consolidate_interval = consolidate_interval
+        self.consolidate_similarity = consolidate_similarity
+
+        self._lock = threading.RLock()
+        #Guards the write buffer only, so buffering a write on the event loop never waits on a commit in a worker thread
+        self._buffer_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memories ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, text TEXT, embedding BLOB, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS memories_accessed ON memories (namespace, accessed_at)")
+        self._conn.commit()
+
+        #Writes not committed yet, (namespace, key) -> (value or None for a delete, text, time), and reads not recorded yet
+        self._pending: Dict[Tuple[Namespace, str], Tuple[Optional[Dict], Optional[str], float]] = {}
+        self._accessed: Dict[Tuple[Namespace, str], float] = {}
+        #Normalized vectors of a namespace, namespace -> (keys, matrix), dropped when the namespace changes
+        self._vectors: Dict[Namespace, Tuple[List[str], np.ndarray]] = {}
+        self._flusher: asyncio.Task = None
+        self._wakeup: asyncio.Event = None
+        self._last_consolidation = _now()
+        self.stats = {"writes": 0, "flushes": 0, "embedded": 0, "evicted": 0, "consolidated": 0}
+        atexit.register(self._commit_pending)
+
+    #Storage, called with the lock held or from a worker thread
+
+    def _commit_pending(self) -> List[Namespace]:
+        """
+        Commits the buffered writes and reads. Returns the namespaces that changed
+        """
+        with self._lock:
+            with self._buffer_lock:
+                pending, self._pending = self._pending, {}
+            accessed, self._accessed = self._accessed, {}
+            for (namespace, key), (value, text, timestamp) in pending.items():
+                if value is None:
+                    self._conn.execute("DELETE FROM memories WHERE namespace = ? AND key = ?", (_encode_namespace(namespace), key))
+                    continue
+                self._conn.execute(
+                    "INSERT INTO memories (namespace, key, value, text, embedding, created_at, updated_at, accessed_at) VALUES (?, ?, ?, ?, NULL, ?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, text = excluded.text, embedding = NULL, "
+                    "updated_at = excluded.updated_at, accessed_at = excluded.accessed_at",
+                    (_encode_namespace(namespace), key, json.dumps(value), text, timestamp, timestamp, timestamp),
+                )
+            self._conn.executemany(
+                "UPDATE memories SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                [(timestamp, _encode_namespace(namespace), key) for (namespace, key), timestamp in accessed.items()],
+            )
+            self._conn.commit()
+            changed = list({namespace for namespace, _ in pending})
+            for namespace in changed:
+                self._vectors.pop(namespace, None)
+            return changed
+
+    def _evict(self, namespaces: Iterable[Namespace]):
+        """
+        Deletes the memories least recently written or found of the namespaces holding more than max_items
+        """
+        with self._lock:
+            for namespace in namespaces:
+                encoded = _encode_namespace(namespace)
+                excess = self._conn.execute("SELECT COUNT(*) FROM memories WHERE namespace = ?", (encoded,)).fetchone()[0] - self.max_items
+                if excess <= 0:
+                    continue
+                self._conn.execute(
+                    "DELETE FROM memories WHERE namespace = ? AND key IN (SELECT key FROM memories WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                    (encoded, encoded, excess),
+                )
+                self._conn.commit()
+                self._vectors.pop(namespace, None)
+                self.stats["evicted"] += excess
+                logger.info(f"Evicted {excess} memories from {'/'.join(namespace)}")
+
+    def _unembedded(self, namespaces: Optional[List[Namespace]] = None, limit: Optional[int] = None) -> List[Tuple[str, str, str]]:
+        """
+        Returns (namespace, key, text) of memories with text but no embedding yet, in the given namespaces or prefixes
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT namespace, key, text FROM memories WHERE embedding IS NULL AND text IS NOT NULL").fetchall()
+        if namespaces is not None:
+            rows = [row for row in rows if any(self._in_prefix(_decode_namespace(row[0]), prefix) for prefix in namespaces)]
+        return rows[:limit] if limit else rows
+
+    def _store_embeddings(self, rows: List[Tuple[str, str, str]], vectors: List[List[float]]):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix /= norms
+        with self._lock:
+            #A memory rewritten in the meantime gets embedded again with its new text
+            self._conn.executemany(
+                "UPDATE memories SET embedding = ? WHERE namespace = ? AND key = ? AND text = ?",
+                [(vector.tobytes(), namespace, key, text) for (namespace, key, text), vector in zip(rows, matrix)],
+            )
+            self._conn.commit()
+            for namespace, _, _ in rows:
+                self._vectors.pop(_decode_namespace(namespace), None)
+            self.stats["embedded"] += len(rows)
+
+    @staticmethod
+    def _in_prefix(namespace: Namespace, prefix: Namespace) -> bool:
+        return namespace[:len(prefix)] == tuple(prefix)
+
+    def _namespaces(self) -> List[Namespace]:
+        with self._lock:
+            return [_decode_namespace(row[0]) for row in self._conn.execute("SELECT DISTINCT namespace FROM memories")]
+
+    def _namespace_vectors(self, namespace: Namespace) -> Tuple[List[str], np.ndarray]:
+        with self._lock:
+            cached = self._vectors.get(namespace)
+            if cached is None:
+                rows = self._conn.execute(
+                    "SELECT key, embedding FROM memories WHERE namespace = ? AND embedding IS NOT NULL", (_encode_namespace(namespace),)
+                ).fetchall()
+                matrix = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows else np.zeros((0, 0), dtype=np.float32)
+                cached = self._vectors[namespace] = ([key for key, _ in rows], matrix)
+            return cached
+
+    def _consolidate(self):
+        """
+        Drops memories that say nearly the same as a more recently written memory of their namespace
+        """
+        self._last_consolidation = _now()
+        for namespace in self._namespaces():
+            keys, matrix = self._namespace_vectors(namespace)
+            if len(keys) < 2:
+                continue
+            with self._lock:
+                updated = dict(self._conn.execute(
+                    "SELECT key, updated_at FROM memories WHERE namespace = ?", (_encode_namespace(namespace),)
+                ).fetchall())
+            order = sorted(range(len(keys)), key=lambda n: updated.get(keys[n], 0), reverse=True)
+            similarities = matrix @ matrix.T
+            kept, dropped = [], []
+            for n in order:
+                if kept and similarities[n, kept].max() >= self.consolidate_similarity:
+                    dropped.append(keys[n])
+                else:
+                    kept.append(n)
+            if dropped:
+                with self._lock:
+                    self._conn.executemany(
+                        "DELETE FROM memories WHERE namespace = ? AND key = ?", [(_encode_namespace(namespace), key) for key in dropped]
+                    )
+                    self._conn.commit()
+                    self._vectors.pop(namespace, None)
+                    self.stats["consolidated"] += len(dropped)
+                logger.info(f"Consolidated {len(dropped)} duplicate memories of {'/'.join(namespace)}")
+
+    #Operations
+
+    def _put(self, op: PutOp):
+        key = (tuple(op.namespace), op.key)
+        with self._buffer_lock:
+            if op.value is None:
+                self._pending[key] = (None, None, _now())
+            else:
+                value = dict(op.value)
+                self._pending[key] = (value, _text(value, op.index), _now())
+            self.stats["writes"] += 1
+
+    def _get(self, op: GetOp) -> Optional[Item]:
+        namespace = tuple(op.namespace)
+        with self._lock:
+            if (namespace, op.key) in self._pending:
+                value, _, timestamp = self._pending[(namespace, op.key)]
+                return None if value is None else Item(value=value, key=op.key, namespace=namespace, created_at=_datetime(timestamp), updated_at=_datetime(timestamp))
+            row = self._conn.execute(
+                "SELECT value, created_at, updated_at FROM memories WHERE namespace = ? AND key = ?", (_encode_namespace(namespace), op.key)
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[(namespace, op.key)] = _now()
+        return Item(value=json.loads(row[0]), key=op.key, namespace=namespace, created_at=_datetime(row[1]), updated_at=_datetime(row[2]))
+
+    def _search(self, op: SearchOp, query_vector: Optional[np.ndarray]) -> List[SearchItem]:
+        prefix = tuple(op.namespace_prefix)
+        namespaces = [namespace for namespace in self._namespaces() if self._in_prefix(namespace, prefix)]
+
+        scores: Dict[Tuple[Namespace, str], float] = {}
+        if query_vector is not None:
+            for namespace in namespaces:
+                keys, matrix = self._namespace_vectors(namespace)
+                if keys and matrix.shape[1] == len(query_vector):
+                    for key, score in zip(keys, (matrix @ query_vector).tolist()):
+                        scores[(namespace, key)] = score
+
+        with self._lock:
+            rows = []
+            for namespace in namespaces:
+                rows.extend(
+                    (namespace, key, value, created_at, updated_at)
+                    for key, value, created_at, updated_at in self._conn.execute(
+                        "SELECT key, value, created_at, updated_at FROM memories WHERE namespace = ?", (_encode_namespace(namespace),)
+                    )
+                )
+        items = [
+            SearchItem(namespace, key, value, _datetime(created_at), _datetime(updated_at), scores.get((namespace, key)))
+            for namespace, key, value, created_at, updated_at in ((namespace, key, json.loads(value), created_at, updated_at) for namespace, key, value, created_at, updated_at in rows)
+            if _matches(value, op.filter)
+        ]
+        if query_vector is not None:
+            items.sort(key=lambda item: item.score if item.score is not None else float("-inf"), reverse=True)
+        else:
+            items.sort(key=lambda item: item.updated_at, reverse=True)
+        items = items[op.offset:op.offset + op.limit]
+        with self._lock:
+            now = _now()
+            for item in items:
+                self._accessed[(item.namespace, item.key)] = now
+        return items
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> List[Namespace]:
+        namespaces = {namespace[:op.max_depth] if op.max_depth else namespace for namespace in self._namespaces() if _namespace_matches(namespace, op)}
+        return sorted(namespaces)[op.offset:op.offset + op.limit]
+
+    def _read(self, ops: List[Op], query_vectors: Dict[int, np.ndarray]) -> List[Result]:
+        results = []
+        for n, op in enumerate(ops):
+            if isinstance(op, GetOp):
+                results.append(self._get(op))
+            elif isinstance(op, SearchOp):
+                results.append(self._search(op, query_vectors.get(n)))
+            elif isinstance(op, ListNamespacesOp):
+                results.append(self._list_namespaces(op))
+            else:
+                results.append(None)
+        return results
+
+    def _prepare_search(self, ops: List[Op]) -> Tuple[List[Tuple[str, str, str]], List[int], List[str]]:
+        """
+        Commits the buffered writes a search must see and returns what has to be embedded for it: the memories under the searched
+        prefixes without an embedding, and the queries
+        """
+        searches = [n for n, op in enumerate(ops) if isinstance(op, SearchOp) and op.query and self.embeddings is not None]
+        if not any(isinstance(op, (SearchOp, ListNamespacesOp)) for op in ops):
+            return [], [], []
+        self._evict(self._commit_pending())
+        rows = self._unembedded([tuple(ops[n].namespace_prefix) for n in searches]) if searches else []
+        return rows, searches, [ops[n].query for n in searches]
+
+    def _finish_search(self, rows, searches, vectors) -> Dict[int, np.ndarray]:
+        if rows:
+            self._store_embeddings(rows, vectors[:len(rows)])
+        query_vectors = {}
+        for n, vector in zip(searches, vectors[len(rows):]):
+            vector = np.asarray(vector, dtype=np.float32)
+            query_vectors[n] = vector / (np.linalg.norm(vector) or 1.0)
+        return query_vectors
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        ops = list(ops)
+        for op in ops:
+            if isinstance(op, PutOp):
+                self._put(op)
+        rows, searches, queries = self._prepare_search(ops)
+        vectors = self.embeddings.embed_documents([row[2] for row in rows] + queries) if rows or queries else []
+        return self._read(ops, self._finish_search(rows, searches, vectors))
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        ops = list(ops)
+        puts = False
+        for op in ops:
+            if isinstance(op, PutOp):
+                self._put(op)
+                puts = True
+        if puts:
+            self._schedule_flush()
+        if all(isinstance(op, PutOp) for op in ops):
+            return [None] * len(ops)
+        rows, searches, queries = await asyncio.to_thread(self._prepare_search, ops)
+        #Memories not embedded yet are embedded in the same request as the query
+        vectors = await self.embeddings.aembed_documents([row[2] for row in rows] + queries) if rows or queries else []
+        query_vectors = await asyncio.to_thread(self._finish_search, rows, searches, vectors)
+        return await asyncio.to_thread(self._read, ops, query_vectors)
+
+    #Background flushing
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+        self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            #Lingering lets the writes of a whole agent turn go out together
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Could not flush agent memories: {e}")
+
+    async def flush(self):
+        """
+        Commits the buffered writes, embeds the memories that have no embedding yet, evicts past max_items and,
+        when it is due, consolidates duplicates
+        """
+        #SQLite writes run in a worker thread, the chat streams on the event loop are not held up by a flush
+        await asyncio.to_thread(lambda: self._evict(self._commit_pending()))
+        if self.embeddings is not None:
+            while rows := await asyncio.to_thread(self._unembedded, None, self.embed_batch_size):
+                vectors = await self.embeddings.aembed_documents([row[2] for row in rows])
+                await asyncio.to_thread(self._store_embeddings, rows, vectors)
+        if _now() - self._last_consolidation >= self.consolidate_interval:
+            await asyncio.to_thread(self._consolidate)
+        self.stats["flushes"] += 1
+
+    def close(self):
+        atexit.unregister(self._commit_pending)
+        if self._flusher is not None:
+            self._flusher.cancel()
+        self._commit_pending()
+        with self._lock:
+            self._conn.close()
+
+
+def open_memory_store() -> SQLiteMemoryStore:
+    """
+    The agent memory store configured in the settings, embedding with MEMORY_EMBEDDING_MODEL (or the fake embeddings)
+    """
+    if settings.EMBEDDING_BACKEND == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        embeddings = DeterministicFakeEmbedding(size=settings.FAKE_EMBEDDING_DIMENSIONS)
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(model=settings.MEMORY_EMBEDDING_MODEL)
+    return SQLiteMemoryStore(
+        settings.MEMORY_STORE_PATH,
+        embeddings,
+        max_items=settings.MEMORY_MAX_ITEMS_PER_NAMESPACE,
+        flush_interval=settings.MEMORY_FLUSH_INTERVAL_MS / 1000,
+        embed_batch_size=settings.MEMORY_EMBED_BATCH_SIZE,
+        consolidate_interval=settings.MEMORY_CONSOLIDATE_INTERVAL_SECONDS,
+        consolidate_similarity=settings.MEMORY_CONSOLIDATE_SIMILARITY,
+    )
@@ -1,19 +1,89 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
+from contextlib import contextmanager
+from typing import List, Optional
+import json
 
-from src.services.vector_store.vector_store_ops import vector_store
-from src.core.logging.logger import logger
+from src.core.config.settings import settings
+from src.services.vector_store import retrieval, context_assembly
+from src.core.logging.logger import logger, add_file_sink
+from src.core.observability import tracing
+from src.core.observability.asgi import TracingMiddleware, metrics_endpoint, traces_endpoint
 
-mcp = FastMCP("RAG")
+# Stateless HTTP lets any worker process answer any request, so the server can run behind several uvicorn workers
+mcp = FastMCP(
+    "RAG",
+    host=settings.MCP_HOST,
+    port=settings.MCP_PORT,
+    stateless_http=True,
+    json_response=True,
+)
+
+def _request_id(ctx: Optional[Context]) -> Optional[str]:
+    """
+    The request id of a tool call: the one the client sent in the call's "_meta", else the one of the HTTP request carrying the call
+    """
+    if ctx is None:
+        return None
+    try:
+        request_context = ctx.request_context
+    except ValueError:
+        return None
+    meta = request_context.meta
+    if meta is not None and (meta.model_extra or {}).get(tracing.REQUEST_ID_META_KEY):
+        return str(meta.model_extra[tracing.REQUEST_ID_META_KEY])
+    request = request_context.request
+    if request is not None:
+        return getattr(request.state, "request_id", None) or request.headers.get(tracing.REQUEST_ID_HEADER)
+    return None
+
+@contextmanager
+def _traced_tool(name: str, ctx: Optional[Context]):
+    """
+    Binds the request id of the tool call and times it. Tools run in the session's task, not in the context of the HTTP request
+    """
+    token = tracing.bind_request_id(tracing.accept_request_id(_request_id(ctx)))
+    try:
+        with tracing.span(f"mcp.{name}"):
+            yield
+    finally:
+        tracing.reset_request_id(token)
 
 @mcp.tool()
-async def retrieve(question: str):
+async def retrieve(question: str, ctx: Context = None):
     """
-    Accepts a question and retrieves the context for it using RAG from documents uploaded to the vector store
+    Accepts a question and retrieves the context for it using RAG from documents uploaded to the vector store.
+    Every passage of the context is headed by its citation, "[n] filename p.X"
     """
-    logger.info("Retrieving documents...")
-    retrieved_docs = vector_store.similarity_search(question, k=5)
-    logger.info("Retrieved documents, sending context to agent...")
-    return f'Context: {retrieved_docs}'
+    with _traced_tool("retrieve", ctx):
+        logger.info("Retrieving documents...")
+        retrieved_docs = await retrieval.retrieve(question)
+        logger.info("Retrieved documents, sending context to agent...")
+        with tracing.span("retrieval.assemble"):
+            return f'Context:\n{context_assembly.assemble(retrieved_docs)}'
+
+@mcp.tool()
+async def retrieve_many(questions: List[str], ctx: Context = None):
+    """
+    Accepts a list of questions and retrieves the context for each of them using RAG from documents uploaded to the vector store.
+    Prefer this over several retrieve calls when a question is broken down into sub-questions
+    """
+    with _traced_tool("retrieve_many", ctx):
+        logger.info(f"Retrieving documents for {len(questions)} questions...")
+        retrieved = await retrieval.retrieve_many(questions)
+        logger.info("Retrieved documents, sending context to agent...")
+        #Passages found for several questions are given once and cited by number afterwards
+        cited = {}
+        with tracing.span("retrieval.assemble", questions=len(questions)):
+            return "\n\n".join(
+                f'Question: {question}\nContext:\n{context_assembly.assemble(docs, cited=cited)}' for question, docs in zip(questions, retrieved)
+            )
+
+@mcp.resource("stats://retrieval-cache")
+def retrieval_cache_stats() -> str:
+    """
+    Hit rates, sizes and latency saved by the retrieval caches
+    """
+    return json.dumps(retrieval.cache.stats())
 
 @mcp.tool()
 async def dummy_tool():
@@ -23,6 +93,34 @@ async def dummy_tool():
     return ("Okay dummy, the tool is working")
 
 
+if settings.METRICS_ENABLED:
+    mcp.custom_route("/metrics", methods=["GET"])(metrics_endpoint)
+    mcp.custom_route("/traces", methods=["GET"])(traces_endpoint)
+
+
+def http_app():
+    """
+    ASGI application factory for the streamable HTTP transport, imported by every uvicorn worker.
+    Each worker keeps its own metrics and spans, like every other per-process state
+    """
+    app = mcp.streamable_http_app()
+    app.add_middleware(TracingMiddleware, tracked_paths=settings.TRACKED_ENDPOINTS)
+    return app
+
+
 if __name__ == "__main__":
-    logger.info("Starting MCP Server")
-    mcp.run(transport="stdio")
\ No newline at end of file
+    settings.validate("mcp")
+    if settings.MCP_LOG_TO_FILE:
+        add_file_sink()
+    logger.info(f"Starting MCP Server ({settings.MCP_TRANSPORT})")
+    if settings.MCP_TRANSPORT == "streamable-http":
+        import uvicorn
+        uvicorn.run(
+            "src.mcp.server:http_app",
+            factory=True,
+            host=settings.MCP_HOST,
+            port=settings.MCP_PORT,
+            workers=settings.MCP_WORKERS,
+        )
+    else:
+        mcp.run(transport="stdio")
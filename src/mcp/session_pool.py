@@ -0,0 +1,182 @@
+from mcp import ClientSession
+
+from contextlib import asynccontextmanager
+from collections import deque
+from typing import Callable, Awaitable, Any, Dict, Optional
+import asyncio
+import time
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+from src.core.observability import tracing
+
+
+class TracedClientSession(ClientSession):
+    """
+    Client session that sends the current request id along with every tool call, in its "_meta".
+    Pooled sessions outlive the requests using them, so the id cannot travel in the headers of the connection
+    """
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, *args, meta: Optional[Dict[str, Any]] = None, **kwargs):
+        request_id = tracing.current_request_id()
+        if request_id:
+            meta = {tracing.REQUEST_ID_META_KEY: request_id} | (meta or {})
+        return await super().call_tool(name, arguments, *args, meta=meta, **kwargs)
+
+
+class PooledAgent:
+    """
+    An initialized MCP session and the agent built on its tools.
+    The transport and session contexts are entered and exited by a dedicated task, so the connection outlives the request that opened it.
+    """
+
+    def __init__(self, connect: Callable, build_agent: Callable[[ClientSession], Awaitable[Any]]):
+        self.connect = connect
+        self.build_agent = build_agent
+        self.session: ClientSession = None
+        self.agent = None
+        self.last_used = time.monotonic()
+        self._ready = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._error: Exception = None
+        self._task: asyncio.Task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error:
+            raise self._error
+
+    async def _run(self):
+        try:
+            async with self.connect() as streams:
+                async with TracedClientSession(streams[0], streams[1]) as session:
+                    await session.initialize()
+                    self.session = session
+                    self.agent = await self.build_agent(session)
+                    self._ready.set()
+                    await self._closed.wait()
+        except Exception as e:
+            self._error = e
+            logger.error(f"MCP session stopped: {e}")
+        finally:
+            self._ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def is_healthy(self) -> bool:
+        """
+        Checks that the server process is still there. Sessions used recently are trusted without a round trip
+        """
+        if not self.alive:
+            return False
+        if time.monotonic() - self.last_used < settings.MCP_POOL_HEALTH_CHECK_SECONDS:
+            return True
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=settings.MCP_PING_TIMEOUT_SECONDS)
+            return True
+        except Exception as e:
+            logger.warning(f"MCP session failed its health check: {e}")
+            return False
+
+    async def close(self):
+        self._closed.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=settings.MCP_PING_TIMEOUT_SECONDS)
+            except Exception:
+                self._task.cancel()
+
+
+class AgentPool:
+    """
+    Pool of long-lived MCP sessions with prebuilt agents, shared across chat requests.
+    Each request gets exclusive use of one agent. Sessions are created on demand up to max_size,
+    health checked when they are handed out and replaced when their server process has died.
+    """
+
+    def __init__(self, connect: Callable, build_agent: Callable[[ClientSession], Awaitable[Any]], max_size: int):
+        self.connect = connect
+        self.build_agent = build_agent
+        self.max_size = max_size
+        self._size = 0
+        self._idle: deque = deque()
+        #Notified when a session is released or a slot frees up, created on first use inside the event loop
+        self._available: asyncio.Condition = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    async def _create(self) -> PooledAgent:
+        pooled = PooledAgent(self.connect, self.build_agent)
+        await pooled.start()
+        logger.info(f"Opened MCP session {self._size}/{self.max_size}")
+        return pooled
+
+    async def _free_slot(self):
+        #A request waiting for a session can now open a new one
+        async with self._condition():
+            self._size -= 1
+            self._available.notify()
+
+    async def _discard(self, pooled: PooledAgent):
+        await self._free_slot()
+        await pooled.close()
+
+    async def _checkout(self) -> PooledAgent:
+        while True:
+            async with self._condition():
+                while not self._idle and self._size >= self.max_size:
+                    await self._available.wait()
+                pooled = self._idle.popleft() if self._idle else None
+                if pooled is None:
+                    self._size += 1
+
+            if pooled is None:
+                try:
+                    return await self._create()
+                except BaseException:
+                    await self._free_slot()
+                    raise
+
+            try:
+                healthy = await pooled.is_healthy()
+            except BaseException:
+                #Cancelled during the ping (the user stopped the generation), the session goes back to be pinged again
+                await self._release(pooled, failed=True)
+                raise
+            if healthy:
+                return pooled
+            logger.warning("Replacing a dead MCP session")
+            await self._discard(pooled)
+
+    async def _release(self, pooled: PooledAgent, failed: bool = False):
+        #A failed request may mean the server died, the session is then pinged before it is handed out again
+        pooled.last_used = 0 if failed else time.monotonic()
+        if pooled.alive:
+            async with self._condition():
+                self._idle.append(pooled)
+                self._available.notify()
+        else:
+            await self._discard(pooled)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Hands out an agent for the duration of the context
+        """
+        pooled = await self._checkout()
+        try:
+            yield pooled.agent
+        except BaseException:
+            await self._release(pooled, failed=True)
+            raise
+        await self._release(pooled)
+
+    async def close(self):
+        while self._idle:
+            await self._discard(self._idle.popleft())
@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import math
+import time
+
+from src.core.config.settings import settings
+
+#Expiry timestamp given to documents uploaded without an expiry date (9999-12-31T23:59:59Z)
+NEVER_EXPIRES = 253402300799
+
+
+def expiry_timestamp(expiry: Optional[datetime | str]) -> int:
+    """
+    Converts an expiry date, as a datetime or the ISO string stored under "expiry date", to epoch seconds.
+    Naive dates are taken as UTC
+    """
+    if not expiry:
+        return NEVER_EXPIRES
+    if isinstance(expiry, str):
+        expiry = datetime.fromisoformat(expiry)
+    if expiry.tzinfo is None:
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return int(expiry.timestamp())
+
+
+def expiry_datetime(expiry_ts: int) -> datetime:
+    return datetime.fromtimestamp(expiry_ts, timezone.utc)
+
+
+def unexpired_filter() -> Dict:
+    """
+    Vector store filter keeping only chunks that have not expired.
+    The current time is rounded up to EXPIRY_FILTER_GRANULARITY_SECONDS so the filter, and the retrieval cache keys built from it,
+    stay the same for that long. Documents are therefore hidden up to that long before they expire, never after
+    """
+    granularity = max(1, settings.EXPIRY_FILTER_GRANULARITY_SECONDS)
+    cutoff = math.ceil(time.time() / granularity) * granularity
+    return {"expiry_ts": {"$gt": cutoff}}
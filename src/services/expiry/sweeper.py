@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, List
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+from src.services.object_store import storage
+from src.services.vector_store import vector_store_ops
+
+task: asyncio.Task = None
+db = None
+
+#Sweep metrics, reported by stats()
+metrics: Dict[str, Any] = {
+    "sweeps": 0,
+    "documents_removed": 0,
+    "chunks_removed": 0,
+    "objects_removed": 0,
+    "failures": 0,
+    "last_sweep_started_at": None,
+    "last_sweep_seconds": None,
+    "last_sweep_documents_per_second": None,
+    "lag_seconds": None,
+}
+
+
+def _backfill_marker() -> str:
+    return os.path.join(settings.VECTOR_DB_DIR, "expiry_backfill_done")
+
+
+async def start_sweeper(database):
+    """
+    Starts the background task that removes expired documents every EXPIRY_SWEEP_INTERVAL_SECONDS
+    Args:
+        database : The MongoDB database holding documents_collection
+    """
+    global task, db
+    db = database
+    task = asyncio.create_task(_run())
+    logger.info(f"Started the expiry sweeper, sweeping every {settings.EXPIRY_SWEEP_INTERVAL_SECONDS}s")
+
+
+async def stop_sweeper():
+    global task
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        task = None
+        logger.info("Stopped the expiry sweeper")
+
+
+def stats() -> Dict[str, Any]:
+    return dict(metrics)
+
+
+async def backfill():
+    """
+    Gives documents stored before expiry timestamps existed their "expiry_ts", in the vector store and in MongoDB. Runs once per vector store
+    """
+    if os.path.exists(_backfill_marker()):
+        return
+
+    chunks = await asyncio.to_thread(vector_store_ops.backfill_expiry)
+    #Computed server side from the ISO "expiry date" string
+    result = await db["documents_collection"].update_many(
+        {"expiry_ts": {"$exists": False}, "expiry date": {"$type": "string"}},
+        [
+            {"$set": {"expires_at": {"$dateFromString": {"dateString": "$expiry date", "timezone": "UTC"}}}},
+            {"$set": {"expiry_ts": {"$toLong": {"$divide": [{"$toLong": "$expires_at"}, 1000]}}}},
+        ],
+    )
+    logger.info(f"Backfilled expiry timestamps of {chunks} chunks and {result.modified_count} documents")
+
+    os.makedirs(settings.VECTOR_DB_DIR, exist_ok=True)
+    with open(_backfill_marker(), "w") as f:
+        f.write(str(time.time_ns()))
+
+
+async def _delete_objects(filenames: List[str]) -> int:
+    """
+    Deletes the stored PDFs of the given files, at most EXPIRY_SWEEP_CONCURRENCY at a time
+    """
+    semaphore = asyncio.Semaphore(settings.EXPIRY_SWEEP_CONCURRENCY)
+
+    async def delete(filename: str):
+        async with semaphore:
+            await storage.delete_file('mcp_rag/' + filename)
+
+    await asyncio.gather(*[delete(filename) for filename in filenames])
+    return len(filenames)
+
+
+async def _sweep_documents(cutoff: int) -> int:
+    """
+    Removes the metadata of expired documents in batches, along with their stored PDFs when no unexpired upload of the same file remains
+    """
+    documents = db["documents_collection"]
+    removed = 0
+    while True:
+        batch = await documents.find(
+            {"expiry_ts": {"$lte": cutoff}}, {"filename": 1, "expiry_ts": 1}
+        ).sort("expiry_ts", 1).limit(settings.EXPIRY_SWEEP_BATCH_SIZE).to_list()
+        if not batch:
+            return removed
+        if metrics["lag_seconds"] is None:
+            metrics["lag_seconds"] = max(0, int(time.time()) - batch[0]["expiry_ts"])
+
+        #A file uploaded again with a later expiry date keeps its PDF, it is stored under the same key
+        filenames = list({document["filename"] for document in batch})
+        live = set(await documents.distinct("filename", {"filename": {"$in": filenames}, "expiry_ts": {"$gt": cutoff}}))
+        metrics["objects_removed"] += await _delete_objects([filename for filename in filenames if filename not in live])
+
+        result = await documents.delete_many({"_id": {"$in": [document["_id"] for document in batch]}})
+        removed += result.deleted_count
+
+
+async def _sweep_chunks(cutoff: int) -> int:
+    """
+    Removes expired chunks from the vector store in batches, including those whose metadata MongoDB already dropped through its TTL index
+    """
+    removed = 0
+    while True:
+        filenames = await asyncio.to_thread(vector_store_ops.delete_expired_chunks, cutoff, settings.EXPIRY_SWEEP_BATCH_SIZE)
+        if not filenames:
+            return removed
+        removed += len(filenames)
+
+
+async def sweep():
+    """
+    Removes every document that has expired from MongoDB, the vector store, the keyword index and the object store
+    """
+    started = time.time()
+    cutoff = int(started)
+    metrics["last_sweep_started_at"] = started
+    metrics["lag_seconds"] = None
+
+    chunks, documents = await asyncio.gather(_sweep_chunks(cutoff), _sweep_documents(cutoff))
+
+    elapsed = time.time() - started
+    metrics["sweeps"] += 1
+    metrics["documents_removed"] += documents
+    metrics["chunks_removed"] += chunks
+    metrics["last_sweep_seconds"] = round(elapsed, 3)
+    metrics["last_sweep_documents_per_second"] = round(documents / elapsed, 2) if elapsed else None
+    if metrics["lag_seconds"] is None:
+        metrics["lag_seconds"] = 0
+    if documents or chunks:
+        logger.info(f"Expiry sweep removed {documents} documents and {chunks} chunks in {elapsed:.1f}s")
+
+
+async def _run():
+    try:
+        await backfill()
+    except Exception as e:
+        logger.error(f"Expiry backfill failed: {e}", exc_info=True)
+
+    while True:
+        try:
+            await sweep()
+            #Deleted chunks are only tombstoned by some vector store backends, they are compacted after the sweep
+            await vector_store_ops.maintain()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics["failures"] += 1
+            logger.error(f"Expiry sweep failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.EXPIRY_SWEEP_INTERVAL_SECONDS)
@@ -0,0 +1,269 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+from src.core.observability.tracing import span
+from src.services.object_store import storage
+from src.services.vector_store import vector_store_ops
+from src.services.expiry.policy import expiry_timestamp, expiry_datetime
+
+OBJECT_PREFIX = 'mcp_rag/'
+
+#Bytes read at a time when hashing a spooled file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class BulkItem:
+    """
+    One file of a bulk ingestion, along with its outcome
+    """
+
+    def __init__(self, filename: str, spool_path: Optional[str] = None, object_key: Optional[str] = None, content_hash: Optional[str] = None):
+        self.filename = filename
+        #Files sent with the request are spooled (and hashed) by the endpoint, files from a manifest are downloaded from object_key
+        self.spool_path = spool_path
+        self.object_key = object_key
+        self.content_hash = content_hash
+        self.metadata: Dict = None
+        self.stage = "queued"
+        self.error: str = None
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "filename": self.filename,
+            "status": "failed" if self.error else "done",
+            "stage": self.stage,
+            "error": self.error,
+        }
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _MetadataWriter:
+    """
+    Collects the metadata of ingested files and writes it to MongoDB with one bulk write per BULK_INSERT_BATCH_SIZE documents.
+    Filenames are unique, files uploaded again replace their metadata
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.pending: List[BulkItem] = []
+        self.lock = asyncio.Lock()
+
+    async def add(self, item: BulkItem):
+        self.pending.append(item)
+        if len(self.pending) >= settings.BULK_INSERT_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+            writes = [
+                ReplaceOne({"filename": item.filename}, item.metadata | {"expires_at": expiry_datetime(item.metadata["expiry_ts"])}, upsert=True)
+                for item in batch
+            ]
+            try:
+                with span("mongo.bulk_write", documents=len(writes)):
+                    await self.db["documents_collection"].bulk_write(writes, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    batch[error["index"]].error = error.get("errmsg", "Metadata could not be stored")
+            except Exception as e:
+                for item in batch:
+                    item.error = f"Metadata could not be stored: {e}"
+            for item in batch:
+                if not item.error:
+                    item.stage = "done"
+            logger.info(f"Stored the metadata of {len(batch)} documents")
+
+
+async def _ingest(item: BulkItem, expiry_dt: datetime, upload_slots: asyncio.Semaphore, ingest_slots: asyncio.Semaphore, writer: _MetadataWriter):
+    """
+    Runs one file through the pipeline. The object store transfer and the parse/embed stage run concurrently,
+    and each stage is bounded separately so files overlap across stages
+    """
+    try:
+        if item.spool_path is None:
+            item.stage = "download"
+            async with upload_slots:
+                os.makedirs(settings.INGESTION_SPOOL_DIR, exist_ok=True)
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=settings.INGESTION_SPOOL_DIR) as temp_pdf:
+                    item.spool_path = temp_pdf.name
+                await storage.download_file(item.object_key, item.spool_path)
+
+        item.metadata = {
+            "filename": item.filename,
+            "expiry date": expiry_dt.isoformat(),
+            "expiry_ts": expiry_timestamp(expiry_dt),
+            "content_hash": item.content_hash or await asyncio.to_thread(_hash_file, item.spool_path),
+        }
+
+        object_key = OBJECT_PREFIX + item.filename
+
+        async def store_object() -> bool:
+            async with upload_slots:
+                if item.object_key is None:
+                    await storage.upload_file(item.spool_path, OBJECT_PREFIX, filename=item.filename, raise_errors=True)
+                elif item.object_key != object_key:
+                    await storage.copy_file(item.object_key, object_key)
+                else:
+                    return False
+            return True
+
+        async def store_vectors() -> bool:
+            streamed = False
+
+            async def progress(pages_done: int, pages_total: Optional[int], chunks: int):
+                nonlocal streamed
+                streamed = True
+
+            async with ingest_slots:
+                #The same file and content stored by an earlier upload must survive a failure of this one
+                where = {"$and": [{"filename": item.filename}, {"content_hash": item.metadata["content_hash"]}]}
+                stored_before = bool((await asyncio.to_thread(vector_store_ops.get_vector_store().get, where=where, limit=1))["ids"])
+                try:
+                    await vector_store_ops.embed_and_store(item.spool_path, dict(item.metadata), on_progress=progress)
+                except BaseException:
+                    #Windows stored before the failure or the cancellation would leave the file partly searchable
+                    if streamed:
+                        await vector_store_ops.delete_partial_document(item.filename, item.metadata["content_hash"])
+                    raise
+            return not stored_before
+
+        item.stage = "object_store+vector_store"
+        tasks = [asyncio.create_task(store_object()), asyncio.create_task(store_vectors())]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            #The other stage must stop reading the spool file before it is removed, and what it stored is undone
+            for task in tasks:
+                task.cancel()
+            stored_object, stored_vectors = await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                if stored_object is True:
+                    await storage.delete_file(object_key)
+                if stored_vectors is True:
+                    await vector_store_ops.delete_partial_document(item.filename, item.metadata["content_hash"])
+            except Exception as e:
+                logger.error(f"Could not undo the stored stages of '{item.filename}': {e}")
+            raise
+
+        item.stage = "metadata"
+        await writer.add(item)
+
+    except Exception as e:
+        logger.error(f"Bulk ingestion of '{item.filename}' failed at stage {item.stage}: {e}")
+        item.error = str(e)
+
+    finally:
+        if item.spool_path and os.path.exists(item.spool_path):
+            os.remove(item.spool_path)
+
+
+async def ingest_bulk(db, items: List[BulkItem], expiry_dt: datetime) -> Dict[str, Any]:
+    """
+    Ingests many PDFs at once: stores them in the object store, embeds them into the vector store and stores their metadata in MongoDB.
+    Files go through the stages concurrently, BULK_UPLOAD_CONCURRENCY object store transfers and BULK_INGEST_CONCURRENCY parse/embed
+    stages at a time. Embedding requests of concurrent files are batched together by the embedding scheduler.
+    Args:
+        db : The MongoDB database
+        items (list) : The files to ingest
+        expiry_dt (datetime) : Expiry date of all the files
+    Returns:
+        The outcome of every file, in the order of the items, and the overall throughput
+    """
+    start = time.perf_counter()
+    upload_slots = asyncio.Semaphore(settings.BULK_UPLOAD_CONCURRENCY)
+    ingest_slots = asyncio.Semaphore(settings.BULK_INGEST_CONCURRENCY)
+    writer = _MetadataWriter(db)
+
+    await asyncio.gather(*[_ingest(item, expiry_dt, upload_slots, ingest_slots, writer) for item in items])
+    await writer.flush()
+
+    elapsed = time.perf_counter() - start
+    results = [item.result() for item in items]
+    succeeded = sum(result["status"] == "done" for result in results)
+    docs_per_minute = succeeded / elapsed * 60 if elapsed else 0.0
+    logger.info(f"Bulk ingestion of {len(items)} files finished in {elapsed:.1f}s, {succeeded} succeeded ({docs_per_minute:.1f} docs/min)")
+
+    return {
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_minute": round(docs_per_minute, 2),
+        "results": results,
+    }
+
+
+async def delete_bulk(db, filenames: List[str]) -> Dict[str, Any]:
+    """
+    Deletes many files from the object store, the vector store and MongoDB. The three stores are processed concurrently,
+    with batched DeleteObjects calls, one filtered vector store delete and one delete_many.
+    Args:
+        db : The MongoDB database
+        filenames (list) : The files to delete
+    Returns:
+        The outcome of every file in every store, so that partial failures can be retried
+    """
+    start = time.perf_counter()
+
+    async def delete_metadata():
+        with span("mongo.delete"):
+            result = await db["documents_collection"].delete_many({"filename": {"$in": filenames}})
+        logger.info(f"Deleted {result.deleted_count} metadata documents from MongoDB")
+
+    object_outcomes, vector_outcome, metadata_outcome = await asyncio.gather(
+        storage.delete_files([OBJECT_PREFIX + filename for filename in filenames]),
+        vector_store_ops.delete_by_filenames(filenames),
+        delete_metadata(),
+        return_exceptions=True,
+    )
+    if isinstance(object_outcomes, Exception):
+        object_outcomes = {OBJECT_PREFIX + filename: str(object_outcomes) for filename in filenames}
+    vector_error = str(vector_outcome) if isinstance(vector_outcome, Exception) else None
+    metadata_error = str(metadata_outcome) if isinstance(metadata_outcome, Exception) else None
+    for store, error in (("vector store", vector_error), ("MongoDB", metadata_error)):
+        if error:
+            logger.error(f"Bulk delete failed in the {store}: {error}")
+
+    results = []
+    for filename in filenames:
+        errors = {
+            "object_store": object_outcomes[OBJECT_PREFIX + filename],
+            "vector_store": vector_error,
+            "metadata": metadata_error,
+        }
+        results.append({
+            "filename": filename,
+            "status": "failed" if any(errors.values()) else "deleted",
+            "errors": {store: error for store, error in errors.items() if error},
+        })
+
+    failed = sum(result["status"] == "failed" for result in results)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Bulk delete of {len(filenames)} files finished in {elapsed:.1f}s, {failed} failed")
+    return {
+        "total": len(filenames),
+        "deleted": len(filenames) - failed,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 3),
+        "results": results,
+    }
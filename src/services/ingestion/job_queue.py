@@ -0,0 +1,256 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+from src.core.observability import tracing
+from src.core.observability.tracing import span
+from src.services.object_store import storage
+from src.services.vector_store import vector_store_ops
+from src.services.expiry.policy import expiry_timestamp, expiry_datetime
+
+JOBS_COLLECTION = "ingestion_jobs"
+
+#Pipeline stages, in the order they are executed
+STAGES = ["object_store", "vector_store", "metadata"]
+
+queue: asyncio.Queue = None
+#Queue slots held by jobs being recorded in MongoDB, not yet put on the queue
+reserved: int = 0
+workers: list = []
+db = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def start_workers(database):
+    """
+    Creates the job queue, starts the ingestion workers and re-queues the jobs that were left unfinished by a previous run
+    Args:
+        database : The MongoDB database where the job state is stored
+    """
+    global queue, workers, db
+    db = database
+    queue = asyncio.Queue(maxsize=settings.INGESTION_QUEUE_SIZE)
+    workers = [asyncio.create_task(_worker(n)) for n in range(settings.INGESTION_WORKERS)]
+    workers.append(asyncio.create_task(_recover_jobs(_now())))
+    logger.info(f"Started {settings.INGESTION_WORKERS} ingestion workers")
+
+
+async def stop_workers():
+    """
+    Stops the ingestion workers. Jobs that are still running stay in MongoDB and are resumed on the next start
+    """
+    global workers
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    workers = []
+    logger.info("Stopped ingestion workers")
+
+
+async def submit_job(spool_path: str, metadata: Dict, request_id: Optional[str] = None) -> str:
+    """
+    Records a new ingestion job in MongoDB and puts it on the queue
+    Args:
+        spool_path (str) : Path of the spooled PDF that the job will ingest
+        metadata (dict) : Metadata related to the PDF document
+        request_id (str) : Id of the upload request, the spans of the job are recorded under it
+    Returns:
+        The id of the created job
+    Raises:
+        asyncio.QueueFull : If the queue has no room left for the job
+    """
+    global reserved
+    #The slot is taken before the insert is awaited, concurrent uploads cannot all pass the check
+    if queue.maxsize and queue.qsize() + reserved >= queue.maxsize:
+        raise asyncio.QueueFull()
+    reserved += 1
+
+    job_id = uuid.uuid4().hex
+    now = _now()
+    job = {
+        "_id": job_id,
+        "status": "queued",
+        "filename": metadata["filename"],
+        "metadata": metadata,
+        "spool_path": spool_path,
+        "request_id": request_id,
+        "stages": {stage: {"status": "pending"} for stage in STAGES},
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        try:
+            await db[JOBS_COLLECTION].insert_one(job)
+        finally:
+            reserved -= 1
+        queue.put_nowait(job_id)
+    except BaseException:
+        #A recorded job that is not on the queue would be resumed later against a spool file the caller deletes
+        try:
+            await db[JOBS_COLLECTION].delete_one({"_id": job_id})
+        except Exception as e:
+            logger.error(f"Could not delete ingestion job {job_id} after failing to queue it: {e}")
+        raise
+    logger.info(f"Queued ingestion job {job_id} for '{metadata['filename']}'")
+    return job_id
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the state of the job with the given id, or None if it does not exist
+    """
+    job = await db[JOBS_COLLECTION].find_one({"_id": job_id}, {"spool_path": 0})
+    if job:
+        job["job_id"] = job.pop("_id")
+    return job
+
+
+async def _update_job(job_id: str, fields: Dict):
+    fields["updated_at"] = _now()
+    await db[JOBS_COLLECTION].update_one({"_id": job_id}, {"$set": fields})
+
+
+async def _run_stage(job: Dict, stage: str):
+    spool_path = job["spool_path"]
+    metadata = job["metadata"]
+    #Jobs queued before expiry timestamps existed only carry the ISO "expiry date"
+    metadata.setdefault("expiry_ts", expiry_timestamp(metadata.get("expiry date")))
+
+    if stage == "object_store":
+        #A failed upload has to fail the stage, so it is retried and the spool file is kept
+        await storage.upload_file(spool_path, 'mcp_rag/', filename=metadata["filename"], raise_errors=True)
+    elif stage == "vector_store":
+        progress = job["stages"]["vector_store"]
+
+        async def checkpoint(pages_done: int, pages_total: Optional[int], chunks: int):
+            #Pages before pages_done are stored, a retry or a restart resumes from there
+            progress["pages_done"] = pages_done
+            progress["chunks"] = progress.get("chunks", 0) + chunks
+            fields = {"stages.vector_store.pages_done": pages_done, "stages.vector_store.chunks": progress["chunks"]}
+            if pages_total is not None:
+                fields["stages.vector_store.pages_total"] = pages_total
+            await _update_job(job["_id"], fields)
+
+        await vector_store_ops.embed_and_store(spool_path, dict(metadata), progress.get("pages_done", 0), checkpoint)
+    elif stage == "metadata":
+        #MongoDB also gets the expiry as a date, for its TTL index. Filenames are unique, uploading a file again replaces its metadata
+        with span("mongo.upsert"):
+            result = await db["documents_collection"].replace_one(
+                {"filename": metadata["filename"]},
+                metadata | {"expires_at": expiry_datetime(metadata["expiry_ts"])},
+                upsert=True,
+            )
+        if (result.acknowledged):
+            logger.info("Metadata stored successfully")
+        else:
+            logger.info("Metadata could not be stored")
+
+
+async def _run_stage_with_retries(job: Dict, stage: str):
+    """
+    Runs a stage up to INGESTION_STAGE_ATTEMPTS times. The vector store stage picks up from its last checkpoint on every attempt
+    """
+    for attempt in range(1, settings.INGESTION_STAGE_ATTEMPTS + 1):
+        try:
+            with span(f"ingestion.{stage}", job_id=job["_id"], attempt=attempt):
+                await _run_stage(job, stage)
+            return
+        except Exception as e:
+            if attempt == settings.INGESTION_STAGE_ATTEMPTS:
+                raise
+            delay = settings.INGESTION_RETRY_DELAY_SECONDS * attempt
+            logger.warning(f"Stage {stage} of ingestion job {job['_id']} failed (attempt {attempt}): {e}, retrying in {delay:g}s")
+            await _update_job(job["_id"], {f"stages.{stage}.attempts": attempt, f"stages.{stage}.last_error": str(e)})
+            await asyncio.sleep(delay)
+
+
+async def _run_job(job_id: str):
+    job = await db[JOBS_COLLECTION].find_one({"_id": job_id})
+    if job is None:
+        logger.warning(f"Ingestion job {job_id} no longer exists, skipping")
+        return
+
+    #The job is traced under the upload request that queued it
+    token = tracing.bind_request_id(job.get("request_id") or tracing.new_request_id())
+    try:
+        await _process_job(job)
+    finally:
+        tracing.reset_request_id(token)
+
+
+async def _process_job(job: Dict):
+    job_id = job["_id"]
+    stage = None
+    await _update_job(job_id, {"status": "running"})
+    try:
+        for stage in STAGES:
+            #Stages finished before a restart are not run again
+            if job["stages"][stage]["status"] == "done":
+                continue
+            await _update_job(job_id, {f"stages.{stage}.status": "running", f"stages.{stage}.started_at": _now()})
+            await _run_stage_with_retries(job, stage)
+            await _update_job(job_id, {f"stages.{stage}.status": "done", f"stages.{stage}.finished_at": _now()})
+
+        await _update_job(job_id, {"status": "done"})
+        logger.info(f"Ingestion job {job_id} finished")
+
+    except Exception as e:
+        logger.error(f"Ingestion job {job_id} failed: {e}", exc_info=True)
+        fields = {"status": "failed", "error": str(e)}
+        if stage:
+            fields[f"stages.{stage}.status"] = "failed"
+        await _update_job(job_id, fields)
+        #A document that is only partly searchable would give incomplete answers
+        if stage == "vector_store" and "pages_done" in job["stages"]["vector_store"] and job["metadata"].get("content_hash"):
+            try:
+                await vector_store_ops.delete_partial_document(job["metadata"]["filename"], job["metadata"]["content_hash"])
+            except Exception as cleanup_error:
+                logger.error(f"Could not delete the chunks stored by job {job_id}: {cleanup_error}")
+
+    _remove_spool_file(job["spool_path"])
+
+
+async def _worker(n: int):
+    while True:
+        job_id = await queue.get()
+        try:
+            await _run_job(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion worker {n} could not process job {job_id}: {e}")
+        finally:
+            queue.task_done()
+
+
+async def _recover_jobs(started_at: datetime):
+    """
+    Puts the jobs that were queued or running when the process stopped back on the queue.
+    Jobs created after this process started are already on the queue and are left alone
+    """
+    cursor = db[JOBS_COLLECTION].find(
+        {"status": {"$in": ["queued", "running"]}, "created_at": {"$lt": started_at}}
+    ).sort("created_at", 1)
+    async for job in cursor:
+        if not os.path.exists(job["spool_path"]):
+            await _update_job(job["_id"], {"status": "failed", "error": "Spooled file was lost before the job could finish"})
+            continue
+        logger.info(f"Resuming ingestion job {job['_id']}")
+        await queue.put(job["_id"])
+
+
+def _remove_spool_file(spool_path: str):
+    if spool_path and os.path.exists(spool_path):
+        try:
+            os.remove(spool_path)
+            logger.debug(f"Spooled file deleted: {spool_path}")
+        except OSError as e:
+            logger.error(f"Error deleting spooled file {spool_path}: {e}")
@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Tuple
+
+from fastapi import UploadFile
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+
+
+class UploadTooLarge(Exception):
+    """
+    Raised when an uploaded file is larger than the configured maximum
+    """
+
+    def __init__(self, filename: str, max_bytes: int):
+        super().__init__(f"'{filename}' is larger than the maximum upload size of {max_bytes} bytes")
+        self.filename = filename
+        self.max_bytes = max_bytes
+
+
+async def spool_upload(document: UploadFile, max_bytes: int = None) -> Tuple[str, str, int]:
+    """
+    Streams an uploaded file to the ingestion spool directory in UPLOAD_CHUNK_BYTES blocks, hashing it on the way,
+    so memory use stays the same whatever the size of the file. The spooled file is the only copy used by the
+    ingestion stages and is removed by them.
+    Args:
+        document (UploadFile) : The uploaded file
+        max_bytes (int) : Largest accepted size, defaults to MAX_UPLOAD_BYTES in the settings
+    Returns:
+        The path of the spooled file, the sha256 of its content and its size in bytes
+    Raises:
+        UploadTooLarge : If the file is larger than max_bytes, nothing is left on disk
+    """
+    if max_bytes is None:
+        max_bytes = settings.MAX_UPLOAD_BYTES
+
+    #The multipart parser already knows the size of the file, oversized files are rejected without copying them
+    if document.size is not None and document.size > max_bytes:
+        raise UploadTooLarge(document.filename, max_bytes)
+
+    os.makedirs(settings.INGESTION_SPOOL_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=settings.INGESTION_SPOOL_DIR) as temp_pdf:
+        spool_path = temp_pdf.name
+        try:
+            while block := await document.read(settings.UPLOAD_CHUNK_BYTES):
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(document.filename, max_bytes)
+                digest.update(block)
+                #Disk writes would block the event loop for every other request
+                await asyncio.to_thread(temp_pdf.write, block)
+        except BaseException:
+            temp_pdf.close()
+            os.remove(spool_path)
+            raise
+
+    logger.debug(f"Spooled '{document.filename}' ({size} bytes) to {spool_path}")
+    return spool_path, digest.hexdigest(), size
@@ -1,24 +1,44 @@
 import boto3
 import os
 import asyncio
+from typing import List, Dict, Optional, BinaryIO
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import NoCredentialsError, ClientError
 
 from src.core.config.settings import settings
 from src.core.logging.logger import logger
+from src.core.observability.tracing import span
 
 s3 = None
+transfer_config: TransferConfig = None
+
+#Most keys a single DeleteObjects call accepts
+DELETE_BATCH_SIZE = 1000
 
 async def connect_to_storage():
     """
     Establishes connection to object store using the credentials provided in the environment variables
     """
-    global s3
+    global s3, transfer_config
     s3 = boto3.client(
     service_name ="s3",
     endpoint_url = settings.R2_PUBLIC_ENDPOINT,
     aws_access_key_id = settings.R2_PUBLIC_ACCESS_KEY_ID,
     aws_secret_access_key = settings.R2_PUBLIC_SECRET_ACCESS_KEY,
-    region_name="auto",
+    region_name=settings.S3_REGION,
+    #One pool shared by every transfer, large enough for the parts of concurrent multipart transfers
+    config=Config(
+        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.S3_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=settings.S3_READ_TIMEOUT_SECONDS,
+        retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": "standard"},
+    ),
+    )
+    transfer_config = TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD_BYTES,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNK_BYTES,
+        max_concurrency=settings.S3_MAX_CONCURRENCY,
     )
     logger.info("Connected to object store")
     
@@ -32,7 +52,7 @@ async def close_storage_connection():
     logger.info("Connection to object store terminated")
 
 
-async def upload_file(file_path: str, folder_prefix: str= '', filename:str|None = None, bucket_name:str =settings.R2_PUBLIC_BUCKET):
+async def upload_file(file_path: str, folder_prefix: str= '', filename:str|None = None, bucket_name:str =settings.R2_PUBLIC_BUCKET, raise_errors: bool = False):
     """
     Uploads the given file to an Amazon S3/Cloudflare R2 bucket.
 
@@ -41,6 +61,7 @@ async def upload_file(file_path: str, folder_prefix: str= '', filename:str|None
         folder_prefix (str): An optional prefix to add to the S3 object keys.
         filename (str): An optional filename taht overrides the default file name
         bucket_name (str): The name of the R2 bucket.
+        raise_errors (bool): Re-raise upload errors after logging them instead of only logging them
         
     """
     global s3
@@ -53,21 +74,45 @@ async def upload_file(file_path: str, folder_prefix: str= '', filename:str|None
 
     try:
         
-        await asyncio.to_thread(s3.upload_file, file_path, bucket_name, s3_object_key)
+        with span("storage.upload"):
+            await asyncio.to_thread(s3.upload_file, file_path, bucket_name, s3_object_key, Config=transfer_config)
         logger.info(f"Successfully uploaded file to '{s3_object_key}'")
 
     except FileNotFoundError:
         logger.error(f"Error: The file '{file_path}' was not found.")
+        if raise_errors:
+            raise
     except NoCredentialsError:
         logger.error("Error: Credentials not found. Please configure your credentials.")
+        if raise_errors:
+            raise
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code")
         if error_code == 'NoSuchBucket':
             logger.error(f"Error: S3 bucket '{bucket_name}' does not exist or you don't have access.")
         else:
             logger.error(f"Error uploading '{file_path}': {e}")
+        if raise_errors:
+            raise
     except Exception as e:
         logger.error(f"An unexpected error occurred while uploading '{file_path}': {e}")
+        if raise_errors:
+            raise
+
+async def upload_fileobj(fileobj: BinaryIO, s3_object_key: str, bucket_name: str = settings.R2_PUBLIC_BUCKET):
+    """
+    Uploads from a readable binary file object or buffer (e.g. io.BytesIO) without writing it to disk first.
+    Objects over the multipart threshold are sent in parts, several at a time.
+    Args:
+        fileobj (BinaryIO): The file object to read from, from its current position
+        s3_object_key (str): Object key of the uploaded file
+        bucket_name (str): Name of the bucket to upload to. If unspecified, uses the bucket name in the config file
+    Raises:
+        ClientError: If the upload failed
+    """
+    with span("storage.upload"):
+        await asyncio.to_thread(s3.upload_fileobj, fileobj, bucket_name, s3_object_key, Config=transfer_config)
+    logger.info(f"Successfully uploaded file object to '{s3_object_key}'")
 
 async def delete_file(s3_object_key:str,  bucket_name:str =settings.R2_PUBLIC_BUCKET):
     """
@@ -80,7 +125,8 @@ async def delete_file(s3_object_key:str,  bucket_name:str =settings.R2_PUBLIC_BU
     logger.info(f"Trying to delete {s3_object_key} from '{settings.R2_PUBLIC_BUCKET}'...")
 
     try:
-        await asyncio.to_thread(s3.delete_object, Bucket= bucket_name, Key= s3_object_key)
+        with span("storage.delete"):
+            await asyncio.to_thread(s3.delete_object, Bucket= bucket_name, Key= s3_object_key)
         logger.info(f"Successfully deleted object '{s3_object_key}' from bucket '{bucket_name}'")
 
     except NoCredentialsError:
@@ -96,8 +142,67 @@ async def delete_file(s3_object_key:str,  bucket_name:str =settings.R2_PUBLIC_BU
     except Exception as e:
         logger.error(f"An unexpected error occurred while deleting object '{s3_object_key}': {e}")
 
+async def download_file(s3_object_key: str, file_path: str, bucket_name: str = settings.R2_PUBLIC_BUCKET):
+    """
+    Downloads the object with the given key to a local file.
+    Objects over the multipart threshold are fetched with parallel ranged GETs of the part size, written in place.
+    Args:
+        s3_object_key (str): Object key of the file to be downloaded
+        file_path (str): Local path the file is written to
+        bucket_name (str): Name of the bucket where the file is stored. If unspecified, uses the bucket name in the config file
+    Raises:
+        ClientError: If the object does not exist or cannot be read
+    """
+    logger.info(f"Downloading '{s3_object_key}' from '{bucket_name}'...")
+    with span("storage.download"):
+        await asyncio.to_thread(s3.download_file, bucket_name, s3_object_key, file_path, Config=transfer_config)
 
 
+async def copy_file(source_key: str, destination_key: str, bucket_name: str = settings.R2_PUBLIC_BUCKET):
+    """
+    Copies an object to another key within the bucket, without the data leaving the object store.
+    Args:
+        source_key (str): Object key of the file to be copied
+        destination_key (str): Object key of the copy
+        bucket_name (str): Name of the bucket where the file is stored. If unspecified, uses the bucket name in the config file
+    Raises:
+        ClientError: If the object does not exist or cannot be copied
+    """
+    with span("storage.copy"):
+        await asyncio.to_thread(s3.copy, {"Bucket": bucket_name, "Key": source_key}, bucket_name, destination_key, Config=transfer_config)
+    logger.info(f"Copied '{source_key}' to '{destination_key}'")
 
 
-
+async def delete_files(s3_object_keys: List[str], bucket_name: str = settings.R2_PUBLIC_BUCKET) -> Dict[str, Optional[str]]:
+    """
+    Deletes many objects with batched DeleteObjects calls of up to 1000 keys, sent concurrently.
+    Args:
+        s3_object_keys (list): Object keys of the files to be deleted
+        bucket_name (str): Name of the bucket where the files are stored. If unspecified, uses the bucket name in the config file
+    Returns:
+        The error message of every key, None for keys that were deleted (or did not exist)
+    """
+    outcomes: Dict[str, Optional[str]] = {key: None for key in s3_object_keys}
+
+    async def delete_batch(keys: List[str]):
+        try:
+            with span("storage.delete_batch", keys=len(keys)):
+                response = await asyncio.to_thread(
+                    s3.delete_objects,
+                    Bucket=bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+                )
+        except Exception as e:
+            logger.error(f"Error deleting a batch of {len(keys)} objects: {e}")
+            for key in keys:
+                outcomes[key] = str(e)
+            return
+        for error in response.get("Errors", []):
+            outcomes[error["Key"]] = f"{error.get('Code')}: {error.get('Message')}"
+
+    await asyncio.gather(*[
+        delete_batch(s3_object_keys[start:start + DELETE_BATCH_SIZE]) for start in range(0, len(s3_object_keys), DELETE_BATCH_SIZE)
+    ])
+    failed = sum(error is not None for error in outcomes.values())
+    logger.info(f"Deleted {len(s3_object_keys) - failed} objects from '{bucket_name}', {failed} failed")
+    return outcomes
@@ -0,0 +1,250 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, TYPE_CHECKING
+import re
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+#Shortest suffix of a chunk found again at the start of the next one for them to count as overlapping, for chunks stored without a start_index
+MIN_OVERLAP_CHARS = 20
+
+#Chunks of a page this few characters apart are merged as adjacent
+ADJACENT_GAP_CHARS = 2
+
+#Fewer tokens than this left in the budget are not worth a truncated passage
+MIN_PASSAGE_TOKENS = 20
+
+#Passages are compared by their sequences of this many words, single words are shared by unrelated passages of a document
+SHINGLE_WORDS = 3
+
+_WORD = re.compile(r"\w+")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(settings.CONTEXT_TOKENIZER_MODEL)
+    except Exception as e:
+        #tiktoken downloads its encodings on first use, offline hosts fall back to the estimate
+        logger.warning(f"Could not load the tokenizer of {settings.CONTEXT_TOKENIZER_MODEL}, estimating token counts: {e}")
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        # Roughly 4 characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class _Passage:
+    """
+    Text of one or more merged chunks of a page, with the best retrieval rank among them
+    """
+
+    __slots__ = ("filename", "page", "start", "end", "text", "rank", "words")
+
+    def __init__(self, doc: "Document", rank: int):
+        self.filename = doc.metadata.get("filename") or doc.metadata.get("source") or "unknown"
+        self.page = doc.metadata.get("page")
+        self.start = doc.metadata.get("start_index")
+        self.text = doc.page_content
+        self.end = self.start + len(self.text) if self.start is not None else None
+        self.rank = rank
+        self.words = None
+
+    def merge(self, other: "_Passage") -> bool:
+        """
+        Appends the next chunk of the page if it overlaps or directly follows this passage. Returns whether it did
+        """
+        if self.start is not None and other.start is not None:
+            if other.start > self.end + ADJACENT_GAP_CHARS:
+                return False
+            if other.end > self.end:
+                #A gap of a few characters is whitespace the splitter dropped
+                self.text += (" " if other.start > self.end else "") + other.text[max(self.end - other.start, 0):]
+                self.end = other.end
+        else:
+            overlap = _overlap(self.text, other.text)
+            if overlap is None:
+                return False
+            self.text += other.text[overlap:]
+            if self.start is not None:
+                self.end = self.start + len(self.text)
+        self.rank = min(self.rank, other.rank)
+        return True
+
+    def citation(self) -> str:
+        return f"{self.filename} p.{self.page + 1}" if isinstance(self.page, int) else self.filename
+
+
+def _overlap(text: str, following: str) -> Optional[int]:
+    """
+    Length of the longest suffix of text that starts following, None if shorter than MIN_OVERLAP_CHARS.
+    The text splitter repeats up to CHUNK_OVERLAP characters of a chunk at the start of the next one
+    """
+    if following in text:
+        return len(following)
+    for length in range(min(len(text), len(following), settings.CHUNK_OVERLAP + ADJACENT_GAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if text.endswith(following[:length]):
+            return length
+    return None
+
+
+def _compact(text: str) -> str:
+    text = _SPACES.sub(" ", text)
+    return _BLANK_LINES.sub("\n\n", "\n".join(line.strip() for line in text.split("\n"))).strip()
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    return {tuple(words[n:n + SHINGLE_WORDS]) for n in range(max(len(words) - SHINGLE_WORDS + 1, 1))}
+
+
+def _similarity(first: _Passage, second: _Passage) -> float:
+    """
+    Share of the word sequences of the shorter passage found in the other, so a passage contained in a longer one counts as a duplicate
+    """
+    if first.words is None:
+        first.words = _shingles(first.text)
+    if second.words is None:
+        second.words = _shingles(second.text)
+    if not first.words or not second.words:
+        return 0.0
+    return len(first.words & second.words) / min(len(first.words), len(second.words))
+
+
+def _merge_unordered(passages: List[_Passage]) -> List[_Passage]:
+    """
+    Merges chunks stored without their position by the text they share, trying every pair until none merges
+    """
+    passages = list(passages)
+    merging = True
+    while merging:
+        merging = False
+        for first in passages:
+            second = next((second for second in passages if second is not first and first.merge(second)), None)
+            if second is not None:
+                passages.remove(second)
+                merging = True
+                break
+    return passages
+
+
+def _merge(docs: List["Document"]) -> List[_Passage]:
+    """
+    Merges the overlapping and adjacent chunks of every page
+    """
+    pages: Dict[tuple, List[_Passage]] = {}
+    for rank, doc in enumerate(docs):
+        passage = _Passage(doc, rank)
+        pages.setdefault((passage.filename, passage.page), []).append(passage)
+    merged = []
+    for passages in pages.values():
+        #Chunks ingested before their start_index was stored
+        if any(passage.start is None for passage in passages):
+            merged.extend(_merge_unordered(passages))
+            continue
+        passages.sort(key=lambda passage: passage.start)
+        current = passages[0]
+        for passage in passages[1:]:
+            if not current.merge(passage):
+                merged.append(current)
+                current = passage
+        merged.append(current)
+    return merged
+
+
+def _select(passages: List[_Passage], mmr_lambda: float, duplicate_similarity: float) -> List[_Passage]:
+    """
+    Orders the passages by maximal marginal relevance: relevance from the retrieval rank, minus the word similarity to the
+    passages already chosen. Passages nearly identical to a chosen one are dropped
+    """
+    count = len(passages)
+    relevance = {id(passage): 1 - passage.rank / max(count, 1) for passage in passages}
+    remaining, selected = list(passages), []
+    while remaining:
+        scores = []
+        for passage in remaining:
+            redundancy = max((_similarity(passage, chosen) for chosen in selected), default=0.0)
+            scores.append((mmr_lambda * relevance[id(passage)] - (1 - mmr_lambda) * redundancy, redundancy, passage))
+        score, redundancy, best = max(scores, key=lambda entry: entry[0])
+        remaining.remove(best)
+        if redundancy < duplicate_similarity:
+            selected.append(best)
+    return selected
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """
+    Cuts the text at the word boundary keeping the most words within the given number of tokens, ellipsis included
+    """
+    if count_tokens(text) <= tokens:
+        return text
+    words = text.split(" ")
+    #Binary search on the number of words kept, token counts grow with it
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle]) + " …") <= tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " …"
+
+
+def assemble(
+    docs: List["Document"],
+    budget_tokens: int = None,
+    mmr_lambda: float = None,
+    duplicate_similarity: float = None,
+    cited: Optional[Dict[str, int]] = None,
+) -> str:
+    """
+    Turns retrieved chunks into the compact context returned to the agent: overlapping and adjacent chunks of a page are
+    merged, near-duplicate passages dropped, and the rest ordered by maximal marginal relevance and cut to the token budget.
+    Every passage is headed by a citation, "[n] filename p.X" with 1-based pages
+    Args:
+        docs (list) : Retrieved chunks, most relevant first
+        budget_tokens (int) : Tokens of context at most, RETRIEVAL_CONTEXT_TOKENS by default
+        mmr_lambda (float) : Weight of relevance against diversity, RETRIEVAL_MMR_LAMBDA by default
+        duplicate_similarity (float) : Word similarity over which a passage is dropped as a duplicate, RETRIEVAL_DUPLICATE_SIMILARITY by default
+        cited (dict) : Citation numbers of passages given earlier in the same tool result, updated with the new ones.
+            A passage given before is referred to by its number instead of being repeated
+    """
+    budget_tokens = settings.RETRIEVAL_CONTEXT_TOKENS if budget_tokens is None else budget_tokens
+    mmr_lambda = settings.RETRIEVAL_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    duplicate_similarity = settings.RETRIEVAL_DUPLICATE_SIMILARITY if duplicate_similarity is None else duplicate_similarity
+    cited = {} if cited is None else cited
+    if not docs:
+        return "No relevant documents found."
+
+    blocks, used = [], 0
+    separator = count_tokens("\n\n")
+    for passage in _select(_merge(docs), mmr_lambda, duplicate_similarity):
+        text = _compact(passage.text)
+        key = f"{passage.citation()}\n{text}"
+        if key in cited:
+            block = f"[{cited[key]}] {passage.citation()} (given above)"
+        else:
+            number = len(cited) + 1
+            header = f"[{number}] {passage.citation()}\n"
+            left = budget_tokens - used - count_tokens(header) - (separator if blocks else 0)
+            if count_tokens(text) > left:
+                #Only the most relevant passage is cut, the others are left out whole
+                if blocks or left < MIN_PASSAGE_TOKENS:
+                    continue
+                text = _truncate(text, left)
+            cited[key] = number
+            block = header + text
+        used += count_tokens(block) + (separator if blocks else 0)
+        blocks.append(block)
+    return "\n\n".join(blocks)
@@ -0,0 +1,173 @@
+from langchain_core.embeddings import Embeddings
+
+from typing import List, Optional, Dict, Any
+from array import array
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import os
+
+from src.core.logging.logger import logger
+
+#SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded LRU cache of chunk embeddings keyed by (model, SHA-256 of the chunk text).
+    Vectors are stored as float32 in a SQLite file; the least recently used entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Returns the cached vector for every text, or None where the text is not cached
+        """
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        now = time.time_ns()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+                found.update(rows)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now] + [row[0] for row in rows],
+                    )
+            self._conn.commit()
+
+        vectors = []
+        for text, key in zip(texts, keys):
+            if key in found:
+                self.hits += 1
+                self.saved_tokens += len(text) // 4
+                vectors.append(array("f", found[key]).tolist())
+            else:
+                self.misses += 1
+                vectors.append(None)
+        return vectors
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """
+        Stores the vectors of the given texts and evicts the least recently used entries if the cache is over its size limit
+        """
+        now = time.time_ns()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array("f", vector).tobytes()
+            rows.append((self.key(model, text), blob, len(blob), now))
+
+        with self._lock:
+            for start in range(0, len(rows), _SQL_BATCH):
+                batch = rows[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                replaced = self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})", [row[0] for row in batch]
+                ).fetchone()[0]
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", batch)
+                self.total_bytes += sum(row[2] for row in batch) - replaced
+            self._conn.commit()
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Evicting down to 90% of the limit so that every insert does not trigger an eviction
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while self.total_bytes > target:
+            rows = self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_used LIMIT ?", (_SQL_BATCH,)).fetchall()
+            if not rows:
+                break
+            keys = []
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                keys.append(key)
+                self.total_bytes -= size
+            self._conn.execute(f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(keys))})", keys)
+            evicted += len(keys)
+        self._conn.commit()
+        logger.info(f"Evicted {evicted} entries from the embedding cache")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_tokens_estimate": self.saved_tokens,
+            "entries": entries,
+            "size_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends chunks missing from the EmbeddingCache to the underlying model.
+    Queries are not cached and go straight to the underlying model.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = model
+
+    def _missing(self, texts: List[str], vectors: List[Optional[List[float]]]) -> List[str]:
+        # Unique texts that still need an embedding, boilerplate chunks repeated in a document are embedded once
+        return list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+    def _fill(self, texts, vectors, missing, missing_vectors) -> List[List[float]]:
+        computed = dict(zip(missing, missing_vectors))
+        return [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+        missing = self._missing(texts, vectors)
+        missing_vectors = self.underlying.embed_documents(missing) if missing else []
+        if missing:
+            self.cache.put_many(self.model, missing, missing_vectors)
+        return self._fill(texts, vectors, missing, missing_vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = await asyncio.to_thread(self.cache.get_many, self.model, texts)
+        missing = self._missing(texts, vectors)
+        missing_vectors = await self.underlying.aembed_documents(missing) if missing else []
+        if missing:
+            await asyncio.to_thread(self.cache.put_many, self.model, missing, missing_vectors)
+        logger.info(f"Embedding cache: embedded {len(missing)} new chunks for {len(texts)} requested")
+        return self._fill(texts, vectors, missing, missing_vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
@@ -0,0 +1,194 @@
+from langchain_core.embeddings import Embeddings
+
+from typing import List, Dict, Any, Optional
+from collections import deque
+import asyncio
+import random
+
+from src.core.logging.logger import logger
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text, good enough to stay under the provider's request limits
+    return len(text) // 4 + 1
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429 or (status_code is not None and status_code >= 500) or type(error).__name__ in ("RateLimitError", "APIConnectionError", "APITimeoutError")
+
+
+class _Request:
+    __slots__ = ("future", "vectors", "remaining")
+
+    def __init__(self, future: asyncio.Future, size: int):
+        self.future = future
+        self.vectors = [None] * size
+        self.remaining = size
+
+    def set_vector(self, index: int, vector: List[float]):
+        if self.future.done():
+            return
+        self.vectors[index] = vector
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.future.set_result(self.vectors)
+
+
+class EmbeddingScheduler:
+    """
+    Merges the chunks of every in-flight ingestion into size and token bounded batches, caps the number of embedding
+    requests in flight and retries rate limited requests with exponential backoff.
+    Each caller gets back the vectors of its own texts, in order.
+    """
+
+    def __init__(
+        self,
+        backend: Embeddings,
+        batch_size: int,
+        max_batch_tokens: int,
+        max_concurrency: int,
+        max_retries: int,
+        linger_seconds: float = 0.0,
+    ):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.linger_seconds = linger_seconds
+        self.batches_sent = 0
+        self.texts_embedded = 0
+        self.retries = 0
+        self._pending: deque = deque()
+        self._loop: asyncio.AbstractEventLoop = None
+        self._wakeup: asyncio.Event = None
+        self._semaphore: asyncio.Semaphore = None
+        self._dispatcher: asyncio.Task = None
+        self._in_flight: set = set()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher is None or self._dispatcher.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Queues the texts for embedding and waits for their vectors
+        """
+        if not texts:
+            return []
+        self._ensure_started()
+        request = _Request(self._loop.create_future(), len(texts))
+        for index, text in enumerate(texts):
+            self._pending.append((request, index, text, _estimate_tokens(text)))
+        self._wakeup.set()
+        return await request.future
+
+    def _take_batch(self) -> list:
+        batch = []
+        tokens = 0
+        while self._pending and len(batch) < self.batch_size:
+            request, index, text, text_tokens = self._pending[0]
+            if request.future.done():
+                # The caller went away or another batch of the same request failed
+                self._pending.popleft()
+                continue
+            if batch and tokens + text_tokens > self.max_batch_tokens:
+                break
+            batch.append(self._pending.popleft())
+            tokens += text_tokens
+        return batch
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            if self.linger_seconds and len(self._pending) < self.batch_size:
+                # Gives concurrent ingestions a moment to add their chunks to the same batch
+                await asyncio.sleep(self.linger_seconds)
+            await self._semaphore.acquire()
+            batch = self._take_batch()
+            if not self._pending:
+                self._wakeup.clear()
+            if not batch:
+                self._semaphore.release()
+                continue
+            task = asyncio.create_task(self._send(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: list):
+        try:
+            vectors = await self._embed_with_retry([item[2] for item in batch])
+            for (request, index, _, _), vector in zip(batch, vectors):
+                request.set_vector(index, vector)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch)} chunks failed: {e}")
+            for request in {item[0] for item in batch}:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._semaphore.release()
+
+    async def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                vectors = await self.backend.aembed_documents(texts)
+                self.batches_sent += 1
+                self.texts_embedded += len(texts)
+                return vectors
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                # The slot is kept while backing off, so a rate limited provider sees fewer requests overall
+                delay = _retry_after(e) or min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Embedding request rate limited or failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches_sent": self.batches_sent,
+            "texts_embedded": self.texts_embedded,
+            "retries": self.retries,
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+        }
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that routes asynchronous calls through an EmbeddingScheduler.
+    Synchronous calls go straight to the backend.
+    """
+
+    def __init__(self, scheduler: EmbeddingScheduler):
+        self.scheduler = scheduler
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.scheduler.backend.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.scheduler.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.scheduler.backend.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.scheduler.embed([text]))[0]
@@ -0,0 +1,90 @@
+from typing import Dict, List, Iterable
+import threading
+import sqlite3
+import os
+
+import numpy as np
+
+#SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def truncate(vectors: List[List[float]], dimensions: int) -> List[List[float]]:
+    """
+    Keeps the first dimensions of every vector and normalizes the result again. Matryoshka trained models such as
+    text-embedding-3 put most of the meaning in the leading dimensions, so the truncated vectors still rank chunks well
+    """
+    if not vectors or len(vectors[0]) <= dimensions:
+        return vectors
+    truncated = np.asarray(vectors, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (truncated / norms).tolist()
+
+
+class FullVectorStore:
+    """
+    Full dimension embeddings of the chunks, stored as float16 in SQLite next to the vector store when the vector store only holds
+    truncated vectors (EMBEDDING_DIMENSIONS). Never searched, only read by chunk id to re-rank the candidates of a query.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (chunk_id TEXT PRIMARY KEY, filename TEXT NOT NULL, vector BLOB NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_filename ON vectors (filename)")
+        self._conn.commit()
+
+    def add(self, chunk_ids: List[str], filenames: List[str], vectors: List[List[float]]):
+        """
+        Stores the full vectors of the given chunks, replacing vectors already stored under the same ids
+        """
+        encoded = np.asarray(vectors, dtype=np.float16)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (chunk_id, filename, vector) VALUES (?, ?, ?)",
+                [(chunk_id, filename, vector.tobytes()) for chunk_id, filename, vector in zip(chunk_ids, filenames, encoded)],
+            )
+            self._conn.commit()
+
+    def get(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns the full vectors of the given chunks as float32 arrays, chunks without one are left out
+        """
+        vectors = {}
+        with self._lock:
+            for start in range(0, len(chunk_ids), _SQL_BATCH):
+                batch = chunk_ids[start:start + _SQL_BATCH]
+                for chunk_id, vector in self._conn.execute(
+                    f"SELECT chunk_id, vector FROM vectors WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    vectors[chunk_id] = np.frombuffer(vector, dtype=np.float16).astype(np.float32)
+        return vectors
+
+    def _delete(self, column: str, values: List[str]) -> int:
+        removed = 0
+        with self._lock:
+            for start in range(0, len(values), _SQL_BATCH):
+                batch = values[start:start + _SQL_BATCH]
+                removed += self._conn.execute(f"DELETE FROM vectors WHERE {column} IN ({','.join('?' * len(batch))})", batch).rowcount
+            self._conn.commit()
+        return removed
+
+    def delete_filenames(self, filenames: Iterable[str]) -> int:
+        """
+        Removes the vectors of every chunk of the given files. Returns the number of vectors removed
+        """
+        return self._delete("filename", list(filenames))
+
+    def delete_ids(self, chunk_ids: List[str]) -> int:
+        """
+        Removes the vectors of the given chunks. Returns the number of vectors removed
+        """
+        return self._delete("chunk_id", chunk_ids)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
@@ -0,0 +1,160 @@
+from typing import List, Tuple, Iterable
+import threading
+import sqlite3
+import time
+import re
+import os
+
+from src.core.logging.logger import logger
+
+#Terms found in more than this share of the chunks are dropped from queries, their BM25 weight is close to zero
+#but ranking them means scanning most of the index
+_COMMON_TERM_RATIO = 0.5
+
+#How long the chunk count used for that cut off is reused before counting again
+_COUNT_REFRESH_SECONDS = 30
+
+#SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+#Query terms beyond this are ignored, long questions add little to a keyword ranking and slow it down
+_MAX_QUERY_TERMS = 32
+
+# Hyphens and underscores are part of a token so that part numbers and identifiers (e.g. PN-1234, ref_no) match as a whole.
+# Dotted references such as clause 4.2.1 are split into tokens and matched as a phrase
+_TOKENIZER = "unicode61 tokenchars '-_'"
+
+_QUERY_TERM = re.compile(r"[\w\-.]+", re.UNICODE)
+
+#Words that match most chunks, dropped from questions since they cost the most to rank and carry no signal
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or say says the this that to was what when where which who why will with".split()
+)
+
+
+class KeywordIndex:
+    """
+    BM25 keyword index of the chunks in the vector store, kept in a SQLite FTS5 inverted index on disk.
+    Chunks are added and removed incrementally along with the vector store, and the index is opened without loading it into memory.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._total = 0
+        self._total_at = float("-inf")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (rowid INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE NOT NULL, filename TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_filename ON chunks (filename)")
+        self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, tokenize=\"{_TOKENIZER}\")")
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks_vocab USING fts5vocab(chunks_fts, 'row')")
+        self._conn.commit()
+
+    def _delete_rowids(self, rowids: List[int]):
+        for start in range(0, len(rowids), _SQL_BATCH):
+            batch = rowids[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM chunks_fts WHERE rowid IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM chunks WHERE rowid IN ({placeholders})", batch)
+
+    def add(self, chunk_ids: List[str], filenames: List[str], texts: List[str]):
+        """
+        Indexes the given chunks, replacing chunks already indexed under the same ids
+        """
+        with self._lock:
+            existing = []
+            for start in range(0, len(chunk_ids), _SQL_BATCH):
+                batch = chunk_ids[start:start + _SQL_BATCH]
+                existing += [row[0] for row in self._conn.execute(
+                    f"SELECT rowid FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                )]
+            self._delete_rowids(existing)
+
+            for chunk_id, filename, text in zip(chunk_ids, filenames, texts):
+                rowid = self._conn.execute("INSERT INTO chunks (chunk_id, filename) VALUES (?, ?)", (chunk_id, filename)).lastrowid
+                self._conn.execute("INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)", (rowid, text))
+            self._conn.commit()
+
+    def delete_filenames(self, filenames: Iterable[str]) -> int:
+        """
+        Removes every chunk of the given files from the index. Returns the number of chunks removed
+        """
+        filenames = list(filenames)
+        with self._lock:
+            rowids = []
+            for start in range(0, len(filenames), _SQL_BATCH):
+                batch = filenames[start:start + _SQL_BATCH]
+                rowids += [row[0] for row in self._conn.execute(
+                    f"SELECT rowid FROM chunks WHERE filename IN ({','.join('?' * len(batch))})", batch
+                )]
+            self._delete_rowids(rowids)
+            self._conn.commit()
+        return len(rowids)
+
+    def delete_ids(self, chunk_ids: List[str]) -> int:
+        """
+        Removes the given chunks from the index. Returns the number of chunks removed
+        """
+        with self._lock:
+            rowids = []
+            for start in range(0, len(chunk_ids), _SQL_BATCH):
+                batch = chunk_ids[start:start + _SQL_BATCH]
+                rowids += [row[0] for row in self._conn.execute(
+                    f"SELECT rowid FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                )]
+            self._delete_rowids(rowids)
+            self._conn.commit()
+        return len(rowids)
+
+    def _match_expression(self, query: str) -> str:
+        terms = [term for term in dict.fromkeys(_QUERY_TERM.findall(query.lower())) if term not in _STOPWORDS][:_MAX_QUERY_TERMS]
+        if not terms:
+            return ""
+
+        #Document frequencies come straight from the index, single-token terms only since phrases such as 4.2.1 are rare by nature
+        single_tokens = [term for term in terms if "." not in term]
+        if single_tokens:
+            if time.monotonic() - self._total_at > _COUNT_REFRESH_SECONDS:
+                self._total = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+                self._total_at = time.monotonic()
+            total = self._total
+            frequencies = dict(self._conn.execute(
+                f"SELECT term, doc FROM chunks_vocab WHERE term IN ({','.join('?' * len(single_tokens))})", single_tokens
+            ))
+            selective = [term for term in terms if frequencies.get(term, 0) <= total * _COMMON_TERM_RATIO]
+            #A question made only of common terms is still answered, the ranking just costs more
+            terms = selective or terms
+
+        # Every term is quoted so FTS5 never reads user text as query syntax
+        return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Returns the ids of the k chunks that best match the query by BM25, best first, with their scores (higher is better)
+        """
+        with self._lock:
+            expression = self._match_expression(query)
+            if not expression:
+                return []
+            rows = self._conn.execute(
+                "SELECT c.chunk_id, chunks_fts.rank FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid "
+                "WHERE chunks_fts MATCH ? ORDER BY chunks_fts.rank LIMIT ?",
+                (expression, k),
+            ).fetchall()
+        # FTS5 ranks are negated BM25 scores
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def optimize(self):
+        """
+        Merges the index segments, worth running after large deletes
+        """
+        with self._lock:
+            self._conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('optimize')")
+            self._conn.commit()
+        logger.info("Optimized the keyword index")
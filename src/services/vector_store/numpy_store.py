@@ -0,0 +1,574 @@
+from typing import Dict, List, Optional, Any
+import operator
+import threading
+import sqlite3
+import json
+import time
+import os
+
+import numpy as np
+
+from src.core.logging.logger import logger
+from src.services.vector_store.vector_backend import VectorStoreBackend
+
+#SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+#Vectors are converted to float32 for scoring this many bytes at a time
+_SEARCH_BLOCK_BYTES = 32 * 1024**2
+
+#Vectors sampled to train the IVF quantizer, and k-means iterations
+_IVF_TRAIN_SAMPLE = 20_000
+_IVF_ITERATIONS = 10
+
+#Fewer vectors than this per list are not worth a coarse quantizer
+_IVF_MIN_VECTORS_PER_LIST = 40
+
+_ORDERING = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _json_value(value, kind: Optional[str]):
+    """
+    Python value of a field read with json_extract, which gives booleans as integers and arrays or objects as JSON text
+    """
+    if kind in ("true", "false"):
+        return kind == "true"
+    if kind in ("array", "object"):
+        return json.loads(value)
+    return value
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class NumpyVectorStore(VectorStoreBackend):
+    """
+    Vector store keeping normalized embeddings in memory-mapped int8 or float16 arrays, ranked by cosine similarity.
+    Ids, texts and metadata live in a SQLite table next to the arrays. In memory the store only keeps a liveness flag per row
+    and, for the metadata fields filters use, a NumPy column of their values.
+
+        - Only the pages of the arrays a query touches are read, the vectors are not held in memory
+        - Deletes and replaced chunks are tombstoned, compact() rewrites the arrays without them
+        - An optional IVF coarse quantizer limits each query to the ivf_nprobe lists closest to it
+
+    One process writes to the store. Every write stamps the rows it changes with the next sequence number, other processes
+    apply only the rows stamped after the last sequence they saw, and reload the store after a compaction.
+    int8 vectors are scaled per row, embeddings read back from the store are the normalized, quantized vectors.
+    """
+
+    def __init__(self, directory: str, dtype: str = "int8", ivf_lists: int = 0, ivf_nprobe: int = 8, compact_ratio: float = 0.2):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype '{dtype}', use 'float16' or 'int8'")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dtype = dtype
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = ivf_nprobe
+        self.compact_ratio = compact_ratio
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL, document TEXT, metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        #Stores created before rows were stamped with the sequence of their last write
+        if "seq" not in [column[1] for column in self._conn.execute("PRAGMA table_info(chunks)")]:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_id ON chunks (id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_seq ON chunks (seq)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    #State
+
+    def _meta(self) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT key, value FROM meta"))
+
+    def _set_meta(self, **values):
+        self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(key, str(value)) for key, value in values.items()])
+
+    def _path(self, name: str, generation: str) -> str:
+        return os.path.join(self.directory, f"{name}-{generation}.bin")
+
+    def _open_array(self, name: str, dtype, columns: int = 0) -> np.memmap:
+        path = self._path(name, self._generation)
+        row_bytes = np.dtype(dtype).itemsize * max(columns, 1)
+        #Growing a file keeps the rows already in it, arrays are resized in place
+        with open(path, "ab") as f:
+            if f.tell() < self.capacity * row_bytes:
+                f.truncate(self.capacity * row_bytes)
+        shape = (self.capacity, columns) if columns else (self.capacity,)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _open_arrays(self):
+        self._vectors = self._scales = self._assignments = None
+        if self.dims is None or self.capacity == 0:
+            return
+        self._vectors = self._open_array("vectors", self.dtype, self.dims)
+        if self.dtype == "int8":
+            self._scales = self._open_array("scales", np.float32)
+        if self._centroids is not None:
+            self._assignments = self._open_array("assignments", np.int32)
+
+    def _load(self):
+        meta = self._meta()
+        self._version = meta.get("version", "0")
+        self._generation = meta.get("generation", "0")
+        self.dims = int(meta["dims"]) if "dims" in meta else None
+        if self.dims is not None and meta["dtype"] != self.dtype:
+            raise ValueError(f"The vector store in {self.directory} holds {meta['dtype']} vectors, not {self.dtype}")
+        self.capacity = int(meta.get("capacity", 0))
+
+        self._seq = int(meta.get("seq", 0))
+
+        centroids_path = os.path.join(self.directory, f"centroids-{self._generation}.npy")
+        self._centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+
+        self.size = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+        self._live = np.zeros(self.capacity, dtype=bool)
+        live_rows = np.fromiter((row for row, in self._conn.execute("SELECT row FROM chunks WHERE deleted = 0")), dtype=np.int64)
+        self._live[live_rows] = True
+        self._live_count = len(live_rows)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._open_arrays()
+
+    def _refresh(self):
+        """
+        Applies the writes another process made since the last refresh, or reloads the store if it was compacted meanwhile
+        """
+        meta = self._meta()
+        if meta.get("version", "0") == self._version:
+            return
+        if meta.get("generation", "0") != self._generation:
+            self._load()
+            return
+        self._version = meta["version"]
+        if self.dims is None and "dims" in meta:
+            self.dims = int(meta["dims"])
+        capacity = int(meta.get("capacity", 0))
+        centroids_path = os.path.join(self.directory, f"centroids-{self._generation}.npy")
+        trained = self._centroids is None and os.path.exists(centroids_path)
+        if trained:
+            self._centroids = np.load(centroids_path)
+        if capacity != self.capacity or trained or self._vectors is None:
+            self.capacity = capacity
+            self._live = np.concatenate([self._live, np.zeros(max(capacity - len(self._live), 0), dtype=bool)])
+            self._open_arrays()
+
+        #Rows are read after the meta table, rows written in between are applied again on the next refresh
+        changed = self._conn.execute("SELECT row, metadata, deleted FROM chunks WHERE seq > ?", (self._seq,)).fetchall()
+        self._seq = int(meta.get("seq", 0))
+        if not changed:
+            return
+        rows = [row for row, _, _ in changed]
+        self.size = max(self.size, max(rows) + 1)
+        live = np.array([not deleted for _, _, deleted in changed], dtype=bool)
+        self._live_count += int(live.sum()) - int(self._live[rows].sum())
+        self._live[rows] = live
+        self._patch_columns(rows, [json.loads(metadata) for _, metadata, _ in changed])
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        self._set_meta(seq=self._seq)
+        return self._seq
+
+    def _commit(self):
+        self._version = str(time.time_ns())
+        self._set_meta(version=self._version)
+        self._conn.commit()
+
+    def _live_rows_of(self, ids: List[str]) -> Dict[str, int]:
+        """
+        Row of every given id that is stored and not deleted
+        """
+        found = {}
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = list(ids[start:start + _SQL_BATCH])
+            found.update(self._conn.execute(f"SELECT id, row FROM chunks WHERE deleted = 0 AND id IN ({','.join('?' * len(batch))})", batch))
+        return found
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        self.capacity = max(needed, self.capacity * 2, 1024)
+        self._live = np.concatenate([self._live, np.zeros(self.capacity - len(self._live), dtype=bool)])
+        self._open_arrays()
+        self._set_meta(capacity=self.capacity)
+
+    #Vectors
+
+    def _encode(self, vectors: np.ndarray, start: int):
+        """
+        Writes normalized vectors to the arrays from row start on
+        """
+        end = start + len(vectors)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self._vectors[start:end] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[start:end] = scales
+        else:
+            self._vectors[start:end] = vectors.astype(np.float16)
+        if self._centroids is not None:
+            self._assignments[start:end] = self._assign(vectors)
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        vectors = self._vectors[rows].astype(np.float32)
+        if self.dtype == "int8":
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def _flush(self):
+        for array in (self._vectors, self._scales, self._assignments):
+            if array is not None:
+                array.flush()
+
+    #Filters
+
+    def _column(self, field: str) -> np.ndarray:
+        column = self._columns.get(field)
+        if column is None:
+            values = [None] * self.size
+            #Only the field is read from SQLite, the metadata of every row is not parsed
+            path = '$."' + field.replace('"', '""') + '"'
+            for row, value, kind in self._conn.execute("SELECT row, json_extract(metadata, ?), json_type(metadata, ?) FROM chunks", (path, path)):
+                if row < self.size:
+                    values[row] = _json_value(value, kind)
+            if all(value is None or _is_number(value) for value in values):
+                column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            self._columns[field] = column
+        return column[:self.size]
+
+    def _patch_columns(self, rows: List[int], metadatas: List[Dict]):
+        """
+        Writes the metadata of the given rows into the cached filter columns, rather than rebuilding them from every row.
+        Columns grow to the capacity of the store, so appending rows does not copy them every time
+        """
+        for field, column in list(self._columns.items()):
+            values = [metadata.get(field) for metadata in metadatas]
+            numeric = column.dtype.kind == "f"
+            if numeric and not all(value is None or _is_number(value) for value in values):
+                #The column no longer holds only numbers, it is rebuilt as an object column on next use
+                del self._columns[field]
+                continue
+            if len(column) < self.size:
+                grown = np.full(self.capacity, np.nan if numeric else None, dtype=column.dtype)
+                grown[:len(column)] = column
+                column = self._columns[field] = grown
+            for row, value in zip(rows, values):
+                column[row] = np.nan if numeric and value is None else value
+
+    @staticmethod
+    def _compare(column: np.ndarray, op: str, value: Any) -> np.ndarray:
+        numeric = column.dtype.kind == "f"
+        present = ~np.isnan(column) if numeric else np.not_equal(column, None)
+
+        if op in ("$in", "$nin"):
+            values = set(value)
+            if numeric:
+                mask = np.isin(column, [v for v in values if _is_number(v)])
+            else:
+                mask = np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+            return mask if op == "$in" else present & ~mask
+
+        if numeric and not _is_number(value):
+            return present if op == "$ne" else np.zeros(len(column), dtype=bool)
+        if op == "$eq":
+            return np.asarray(column == value, dtype=bool)
+        if op == "$ne":
+            return present & np.asarray(column != value, dtype=bool)
+        if op in _ORDERING:
+            if numeric:
+                return _ORDERING[op](column, value)
+
+            def ordered(v) -> bool:
+                try:
+                    return v is not None and _ORDERING[op](v, value)
+                except TypeError:
+                    return False
+
+            return np.fromiter((ordered(v) for v in column), dtype=bool, count=len(column))
+        raise ValueError(f"Unsupported filter operator '{op}'")
+
+    def _mask(self, where: Optional[Dict]) -> np.ndarray:
+        mask = self._live[:self.size].copy()
+        for field, condition in (where or {}).items():
+            if field == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+            elif field == "$or":
+                mask &= np.logical_or.reduce([self._mask(clause) for clause in condition])
+            else:
+                column = self._column(field)
+                conditions = condition.items() if isinstance(condition, dict) else [("$eq", condition)]
+                for op, value in conditions:
+                    mask &= self._compare(column, op, value)
+        return mask
+
+    def _rows(self, ids: Optional[List[str]], where: Optional[Dict]) -> np.ndarray:
+        mask = self._mask(where)
+        if ids is None:
+            return np.flatnonzero(mask)
+        found = self._live_rows_of(ids)
+        rows = np.array([found[chunk_id] for chunk_id in ids if chunk_id in found], dtype=np.int64)
+        return rows[mask[rows]] if len(rows) else rows
+
+    def _chunks(self, rows: List[int]) -> Dict[int, tuple]:
+        """
+        Id, text and metadata of the given rows
+        """
+        chunks = {}
+        for start in range(0, len(rows), _SQL_BATCH):
+            batch = [int(row) for row in rows[start:start + _SQL_BATCH]]
+            chunks.update(
+                (row, (chunk_id, document, json.loads(metadata)))
+                for row, chunk_id, document, metadata in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+                )
+            )
+        return chunks
+
+    #IVF
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def train_ivf(self):
+        """
+        Trains the coarse quantizer with spherical k-means on a sample of the stored vectors and assigns every vector to a list
+        """
+        with self._lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._live[:self.size])
+            if not self.ivf_lists or len(live_rows) < self.ivf_lists * _IVF_MIN_VECTORS_PER_LIST:
+                return
+            start = time.perf_counter()
+            rng = np.random.default_rng(0)
+            sample = self._decode(np.sort(rng.choice(live_rows, size=min(len(live_rows), _IVF_TRAIN_SAMPLE), replace=False)))
+            centroids = sample[rng.choice(len(sample), size=self.ivf_lists, replace=False)]
+            for _ in range(_IVF_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for n in range(self.ivf_lists):
+                    members = sample[labels == n]
+                    if len(members):
+                        centroids[n] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+
+            self._centroids = centroids.astype(np.float32)
+            np.save(os.path.join(self.directory, f"centroids-{self._generation}.npy"), self._centroids)
+            self._assignments = self._open_array("assignments", np.int32)
+            for start_row in range(0, self.size, self._block_rows()):
+                rows = np.arange(start_row, min(start_row + self._block_rows(), self.size))
+                self._assignments[rows] = self._assign(self._decode(rows))
+            self._flush()
+            self._commit()
+            logger.info(f"Trained an IVF quantizer with {self.ivf_lists} lists on {len(sample)} vectors in {time.perf_counter() - start:.1f}s")
+
+    def _block_rows(self) -> int:
+        return max(1, _SEARCH_BLOCK_BYTES // (4 * self.dims))
+
+    #Maintenance
+
+    def compact(self):
+        """
+        Rewrites the arrays and the chunk table without tombstoned rows. The new arrays are written under a new generation
+        and switched to in the same SQLite transaction that renumbers the rows, so a crash leaves either the old or the new store
+        """
+        with self._lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._live[:self.size])
+            start = time.perf_counter()
+            old_generation, old_capacity = self._generation, self.capacity
+            old_vectors, old_scales, old_assignments = self._vectors, self._scales, self._assignments
+
+            self._generation = str(time.time_ns())
+            self.capacity = max(len(live_rows), 1024)
+            if self._centroids is not None:
+                np.save(os.path.join(self.directory, f"centroids-{self._generation}.npy"), self._centroids)
+            self._open_arrays()
+            if self._vectors is not None:
+                for new_start in range(0, len(live_rows), self._block_rows()):
+                    rows = live_rows[new_start:new_start + self._block_rows()]
+                    new_rows = slice(new_start, new_start + len(rows))
+                    self._vectors[new_rows] = old_vectors[rows]
+                    if self._scales is not None:
+                        self._scales[new_rows] = old_scales[rows]
+                    if self._assignments is not None:
+                        self._assignments[new_rows] = old_assignments[rows]
+                self._flush()
+
+            self._conn.execute("DROP TABLE IF EXISTS chunks_compacted")
+            self._conn.execute(
+                "CREATE TABLE chunks_compacted (row INTEGER PRIMARY KEY, id TEXT NOT NULL, document TEXT, metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0, seq INTEGER NOT NULL DEFAULT 0)"
+            )
+            cursor = self._conn.execute("SELECT id, document, metadata FROM chunks WHERE deleted = 0 ORDER BY row")
+            self._conn.executemany(
+                "INSERT INTO chunks_compacted (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                ((new_row, *chunk) for new_row, chunk in enumerate(cursor)),
+            )
+            self._conn.execute("DROP TABLE chunks")
+            self._conn.execute("ALTER TABLE chunks_compacted RENAME TO chunks")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_id ON chunks (id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_seq ON chunks (seq)")
+            self._set_meta(generation=self._generation, capacity=self.capacity)
+            self._commit()
+
+            del old_vectors, old_scales, old_assignments
+            for name in ("vectors", "scales", "assignments"):
+                path = self._path(name, old_generation)
+                if os.path.exists(path):
+                    os.remove(path)
+            old_centroids = os.path.join(self.directory, f"centroids-{old_generation}.npy")
+            if os.path.exists(old_centroids):
+                os.remove(old_centroids)
+
+            removed = self.size - len(live_rows)
+            self._load()
+            logger.info(f"Compacted the vector store, dropped {removed} tombstoned rows ({old_capacity} -> {self.capacity} slots) in {time.perf_counter() - start:.1f}s")
+
+    def maintain(self):
+        """
+        Compacts the store once tombstones exceed compact_ratio of its rows, and trains the IVF quantizer once there are enough vectors
+        """
+        with self._lock:
+            self._refresh()
+            tombstones = self.size - self._live_count
+            if self.size and tombstones / self.size > self.compact_ratio:
+                self.compact()
+            if self.ivf_lists and self._centroids is None:
+                self.train_ivf()
+
+    #VectorStoreBackend
+
+    def upsert(self, ids, texts, vectors, metadatas):
+        if not ids:
+            return
+        with self._lock:
+            self._refresh()
+            vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+            if self.dims is None:
+                self.dims = vectors.shape[1]
+                self._set_meta(dims=self.dims, dtype=self.dtype, generation=self._generation)
+            elif vectors.shape[1] != self.dims:
+                raise ValueError(f"Expected {self.dims} dimensional vectors, got {vectors.shape[1]}")
+
+            replaced = list(self._live_rows_of(ids).values())
+            start = self.size
+            self._ensure_capacity(start + len(ids))
+            self._encode(vectors, start)
+            self._flush()
+
+            seq = self._next_seq()
+            self._conn.executemany("UPDATE chunks SET deleted = 1, seq = ? WHERE row = ?", [(seq, row) for row in replaced])
+            self._conn.executemany(
+                "INSERT INTO chunks (row, id, document, metadata, seq) VALUES (?, ?, ?, ?, ?)",
+                [(start + n, chunk_id, text, json.dumps(metadata), seq) for n, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))],
+            )
+            self._commit()
+
+            self._live[replaced] = False
+            self._live[start:start + len(ids)] = True
+            self._live_count += len(ids) - len(replaced)
+            self.size += len(ids)
+            self._patch_columns(list(range(start, start + len(ids))), metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            self._refresh()
+            found = self._live_rows_of(ids)
+            updates = [(found[chunk_id], metadata) for chunk_id, metadata in zip(ids, metadatas) if chunk_id in found]
+            seq = self._next_seq()
+            self._conn.executemany("UPDATE chunks SET metadata = ?, seq = ? WHERE row = ?", [(json.dumps(metadata), seq, row) for row, metadata in updates])
+            self._commit()
+            self._patch_columns([row for row, _ in updates], [metadata for _, metadata in updates])
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include_embeddings=False):
+        with self._lock:
+            self._refresh()
+            rows = self._rows(ids, where)
+            rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+            found = self._chunks(rows)
+            chunks = {
+                "ids": [found[row][0] for row in rows],
+                "documents": [found[row][1] for row in rows],
+                "metadatas": [found[row][2] for row in rows],
+            }
+            if include_embeddings:
+                chunks["embeddings"] = self._decode(rows).tolist() if len(rows) else []
+            return chunks
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            self._refresh()
+            rows = self._rows(ids, where)
+            if not len(rows):
+                return
+            seq = self._next_seq()
+            for start in range(0, len(rows), _SQL_BATCH):
+                batch = [int(row) for row in rows[start:start + _SQL_BATCH]]
+                self._conn.execute(f"UPDATE chunks SET deleted = 1, seq = ? WHERE row IN ({','.join('?' * len(batch))})", [seq] + batch)
+            self._commit()
+            self._live[rows] = False
+            self._live_count -= len(rows)
+
+    def search(self, vector, k, where=None):
+        from langchain_core.documents import Document
+
+        with self._lock:
+            self._refresh()
+            if self._vectors is None:
+                return []
+            query = _normalize(np.asarray([vector], dtype=np.float32))[0]
+            mask = self._mask(where)
+            if self._centroids is not None:
+                probed = np.argsort(self._centroids @ query)[-self.ivf_nprobe:]
+                mask &= np.isin(self._assignments[:self.size], probed)
+
+            found_rows, found_scores = [], []
+            block = self._block_rows()
+            for start in range(0, self.size, block):
+                block_mask = mask[start:start + block]
+                count = int(block_mask.sum())
+                if not count:
+                    continue
+                if count > len(block_mask) // 2:
+                    #Mostly matching blocks are read sequentially, sparse ones only for their matching rows
+                    rows = np.arange(start, start + len(block_mask))
+                    scores = self._vectors[start:start + len(block_mask)].astype(np.float32) @ query
+                    rows, scores = rows[block_mask], scores[block_mask]
+                else:
+                    rows = np.flatnonzero(block_mask) + start
+                    scores = self._vectors[rows].astype(np.float32) @ query
+                if self._scales is not None:
+                    scores *= self._scales[rows]
+                #Only the block's own top k can make the overall top k
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k)[:k]
+                    rows, scores = rows[top], scores[top]
+                found_rows.append(rows)
+                found_scores.append(scores)
+
+            if not found_rows:
+                return []
+            rows, scores = np.concatenate(found_rows), np.concatenate(found_scores)
+            order = np.argsort(-scores)[:k]
+            rows = rows[order]
+            found = self._chunks(rows)
+            return [Document(id=found[row][0], page_content=found[row][1], metadata=found[row][2]) for row in rows]
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return self._live_count
@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from typing import List, Tuple, Dict, Optional, AsyncIterator, TYPE_CHECKING
+import asyncio
+import math
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+
+# LangChain and PyMuPDF are imported on first use, they are slow to import and not needed to start the API
+if TYPE_CHECKING:
+    from langchain_community.document_loaders import PyMuPDFLoader
+    from langchain_core.documents import Document
+
+pool: ProcessPoolExecutor = None
+pool_size: int = 0
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool used for parsing, creating it on first use
+    Args:
+        workers (int) : Number of processes in the pool
+    """
+    global pool, pool_size
+    if pool is None or pool_size != workers:
+        shutdown_pool()
+        # Spawned rather than forked, the API process runs threads (logging queue, boto3) that are unsafe to fork
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        pool_size = workers
+        logger.info(f"Started PDF parsing pool with {workers} processes")
+    return pool
+
+
+def shutdown_pool():
+    """
+    Shuts down the PDF parsing pool if it was started
+    """
+    global pool, pool_size
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = None
+        pool_size = 0
+
+
+def _extract_pages(pdf_path: str, start: int, end: int) -> List[str]:
+    """
+    Extracts the text of pages [start, end) the same way PyMuPDFLoader does. Runs in a worker process
+    """
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        return [doc[number].get_text().strip() for number in range(start, end)]
+
+
+def _metadata_template(loader: "PyMuPDFLoader") -> Tuple[Optional[Dict], int]:
+    """
+    Parses only the first page with the loader to get the document level metadata that PyMuPDFLoader attaches to every page
+    """
+    pages = loader.lazy_load()
+    try:
+        first_page = next(pages)
+    except StopIteration:
+        return None, 0
+    finally:
+        # Closing the generator releases the loader's parsing lock
+        pages.close()
+
+    template = dict(first_page.metadata)
+    template.pop("page", None)
+    return template, template["total_pages"]
+
+
+def _page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    pages_per_task = max(1, min(settings.PDF_PARSE_PAGES_PER_TASK, math.ceil(page_count / workers)))
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+
+async def _extract_window(pdf_path: str, start: int, end: int, workers: int) -> List[str]:
+    """
+    Extracts the text of pages [start, end), split into page ranges across the process pool when one is configured
+    """
+    if workers <= 1 or end - start < settings.PDF_PARSE_MIN_PAGES:
+        return await asyncio.to_thread(_extract_pages, pdf_path, start, end)
+
+    loop = asyncio.get_running_loop()
+    executor = get_pool(workers)
+    results = await asyncio.gather(
+        *[loop.run_in_executor(executor, _extract_pages, pdf_path, start + first, start + last) for first, last in _page_ranges(end - start, workers)]
+    )
+    return [text for texts in results for text in texts]
+
+
+async def iter_pages(pdf_path: str, start_page: int = 0, window: int | None = None, workers: int | None = None) -> AsyncIterator[List["Document"]]:
+    """
+    Yields the pages of a PDF from start_page on, window pages at a time, with the same content and metadata as PyMuPDFLoader.
+    The next window is extracted while the caller processes the current one, so at most two windows are held in memory
+    Args:
+        pdf_path (str) : The path to the PDF to be loaded
+        start_page (int) : First page to yield, to resume an interrupted ingestion
+        window (int) : Pages per window, defaults to INGEST_WINDOW_PAGES in the settings
+        workers (int) : Number of parsing processes, defaults to PDF_PARSE_WORKERS in the settings. 0 or 1 parses in a thread
+    """
+    from langchain_community.document_loaders import PyMuPDFLoader
+    from langchain_core.documents import Document
+
+    if window is None:
+        window = settings.INGEST_WINDOW_PAGES
+    if workers is None:
+        workers = settings.PDF_PARSE_WORKERS
+
+    template, page_count = await asyncio.to_thread(_metadata_template, PyMuPDFLoader(pdf_path))
+    windows = [(start, min(start + window, page_count)) for start in range(start_page, page_count, window)]
+    if not windows:
+        return
+
+    pending = asyncio.ensure_future(_extract_window(pdf_path, *windows[0], workers))
+    try:
+        for n, (start, _) in enumerate(windows):
+            texts = await pending
+            if n + 1 < len(windows):
+                pending = asyncio.ensure_future(_extract_window(pdf_path, *windows[n + 1], workers))
+            yield [Document(page_content=text, metadata=template | {"page": start + offset}) for offset, text in enumerate(texts)]
+    finally:
+        #The consumer stopped early, the window extracted ahead is not needed
+        if not pending.done():
+            pending.cancel()
@@ -0,0 +1,134 @@
+from typing import List, Dict, Optional, TYPE_CHECKING
+import asyncio
+import time
+
+from src.core.config.settings import settings
+from src.core.logging.logger import logger
+from src.core.observability.tracing import span
+from src.services.vector_store import vector_store_ops
+from src.services.vector_store.retrieval_cache import RetrievalCache
+from src.services.expiry.policy import unexpired_filter
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+cache = RetrievalCache(
+    embedding_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    result_entries=settings.RETRIEVAL_CACHE_SIZE,
+    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+)
+
+
+async def _embed_questions(questions: List[str]) -> List[List[float]]:
+    """
+    Embeds the questions in one batched call, questions asked before are served from the cache
+    """
+    vectors = [cache.get_embedding(question) for question in questions]
+    missing = list(dict.fromkeys(question for question, vector in zip(questions, vectors) if vector is None))
+    if missing:
+        start = time.perf_counter()
+        with span("retrieval.embed", questions=len(missing)):
+            missing_vectors = await vector_store_ops.get_query_embeddings().aembed_documents(missing)
+        cost = (time.perf_counter() - start) / len(missing)
+        for question, vector in zip(missing, missing_vectors):
+            cache.put_embedding(question, vector, cost)
+        computed = dict(zip(missing, missing_vectors))
+        vectors = [vector if vector is not None else computed[question] for question, vector in zip(questions, vectors)]
+    return vectors
+
+
+def _vector_search(vector: List[float], k: int, where: Optional[Dict] = None) -> List["Document"]:
+    """
+    Returns the k closest chunks to the vector. With EMBEDDING_DIMENSIONS set, RERANK_CANDIDATES chunks are found with the truncated
+    vector and re-ranked by their full vectors
+    """
+    vector_store = vector_store_ops.get_vector_store()
+    full_store = vector_store_ops.get_full_vectors()
+    if full_store is None or len(vector) <= settings.EMBEDDING_DIMENSIONS:
+        return vector_store.search(vector, k, where)
+
+    import numpy as np
+    from src.services.vector_store.full_vectors import truncate
+
+    candidates = vector_store.search(truncate([vector], settings.EMBEDDING_DIMENSIONS)[0], max(k, settings.RERANK_CANDIDATES), where)
+    full = full_store.get([doc.id for doc in candidates])
+    if not full:
+        return candidates[:k]
+    query = np.asarray(vector, dtype=np.float32)
+    #Chunks without a full vector keep their place after the re-ranked ones
+    scores = {chunk_id: float(full_vector @ query) / (float(np.linalg.norm(full_vector)) or 1.0) for chunk_id, full_vector in full.items()}
+    ranked = sorted(candidates, key=lambda doc: scores.get(doc.id, float("-inf")), reverse=True)
+    return ranked[:k]
+
+
+def _hybrid_search(question: str, vector: List[float], k: int, where: Optional[Dict] = None) -> List["Document"]:
+    """
+    Ranks chunks by vector similarity and by BM25 keyword score separately and fuses the two rankings with reciprocal rank fusion,
+    so exact identifiers and clause references that embeddings miss still surface
+    """
+    from langchain_core.documents import Document
+
+    vector_store = vector_store_ops.get_vector_store()
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+    vector_docs = _vector_search(vector, candidates, where)
+    keyword_ids = [chunk_id for chunk_id, _ in vector_store_ops.get_keyword_index().search(question, candidates)]
+
+    scores: Dict[str, float] = {}
+    for rank, chunk_id in enumerate([doc.id for doc in vector_docs]):
+        scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (settings.RRF_K + rank + 1)
+    for rank, chunk_id in enumerate(keyword_ids):
+        scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (settings.RRF_K + rank + 1)
+
+    docs = {doc.id: doc for doc in vector_docs}
+    #Chunks found only by keyword are fetched from the vector store, which also applies the metadata filter to them
+    missing = [chunk_id for chunk_id in keyword_ids if chunk_id not in docs]
+    if missing:
+        fetched = vector_store.get(ids=missing, where=where)
+        for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+            docs[chunk_id] = Document(id=chunk_id, page_content=text, metadata=metadata)
+
+    ranked = sorted((chunk_id for chunk_id in scores if chunk_id in docs), key=scores.get, reverse=True)
+    return [docs[chunk_id] for chunk_id in ranked[:k]]
+
+
+async def _search(question: str, vector: List[float], k: int, where: Optional[Dict] = None) -> List["Document"]:
+    hybrid = settings.RETRIEVAL_MODE == "hybrid"
+    #Keyword rankings depend on the question text, not only on its embedding
+    key = cache.result_key(vector, k, where) + ((settings.RETRIEVAL_MODE, question) if hybrid else ())
+    docs = cache.get_results(key)
+    if docs is None:
+        start = time.perf_counter()
+        with span("retrieval.search", mode=settings.RETRIEVAL_MODE):
+            if hybrid:
+                docs = await asyncio.to_thread(_hybrid_search, question, vector, k, where)
+            else:
+                docs = await asyncio.to_thread(_vector_search, vector, k, where)
+        cache.put_results(key, docs, time.perf_counter() - start)
+    return docs
+
+
+async def retrieve(question: str, k: int = settings.RETRIEVAL_K) -> List["Document"]:
+    """
+    Retrieves the k closest unexpired chunks to the question without blocking the event loop.
+    With RETRIEVAL_MODE set to "hybrid", vector and keyword rankings are fused
+    Args:
+        question (str) : The question to retrieve context for
+        k (int) : Number of chunks to retrieve
+    """
+    vectors = await _embed_questions([question])
+    return await _search(question, vectors[0], k, unexpired_filter())
+
+
+async def retrieve_many(questions: List[str], k: int = settings.RETRIEVAL_K) -> List[List["Document"]]:
+    """
+    Retrieves the k closest unexpired chunks for every question. The questions are embedded in one batched call and the vector queries run concurrently
+    Args:
+        questions (list) : The questions to retrieve context for
+        k (int) : Number of chunks to retrieve per question
+    Returns:
+        One list of chunks per question, in the order of the questions
+    """
+    vectors = await _embed_questions(questions)
+    logger.info(f"Embedded {len(questions)} questions, querying the vector store...")
+    where = unexpired_filter()
+    return await asyncio.gather(*[_search(question, vector, k, where) for question, vector in zip(questions, vectors)])
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Hashable
+from array import array
+import hashlib
+import json
+import time
+import os
+
+from src.core.config.settings import settings
+
+
+#Last corpus generation read or written by this process, and when
+_generation_cache: tuple = (None, 0.0)
+
+
+def _generation_path() -> str:
+    return os.path.join(settings.VECTOR_DB_DIR, "corpus_generation")
+
+
+def bump_generation():
+    """
+    Marks the corpus as changed so that every process drops the retrieval results it has cached.
+    A unique timestamp is written rather than an incremented counter, so concurrent writers can never produce the same generation twice
+    """
+    os.makedirs(settings.VECTOR_DB_DIR, exist_ok=True)
+    path = _generation_path()
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    generation = str(time.time_ns())
+    with open(temp_path, "w") as f:
+        f.write(generation)
+    os.replace(temp_path, path)
+    _remember_generation(generation)
+
+
+def _remember_generation(generation: str):
+    global _generation_cache
+    _generation_cache = (generation, time.monotonic())
+
+
+def current_generation() -> str:
+    """
+    Returns the corpus generation. The file is read at most every CORPUS_GENERATION_CHECK_SECONDS, lookups from the async
+    handlers do not hit the disk every time. Changes made by this process are seen at once
+    """
+    generation, read_at = _generation_cache
+    if generation is not None and time.monotonic() - read_at < settings.CORPUS_GENERATION_CHECK_SECONDS:
+        return generation
+    try:
+        with open(_generation_path()) as f:
+            generation = f.read()
+    except FileNotFoundError:
+        generation = "0"
+    _remember_generation(generation)
+    return generation
+
+
+class LRUCache:
+    """
+    Least recently used cache bounded by its number of entries
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, is_valid=None):
+        """
+        Returns the cached value or None. Entries rejected by is_valid are dropped and count as misses
+        """
+        if key in self._entries:
+            value = self._entries[key]
+            if is_valid is None or is_valid(value):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RetrievalCache:
+    """
+    Two-level cache for the retrieval path:
+        1. LRU of question -> embedding
+        2. TTL cache of (embedding, k, filter) -> retrieved chunks, dropped as soon as the corpus generation changes
+    Both levels are bounded by their number of entries. Hits remember how long the cached work took, to report the latency saved.
+    """
+
+    def __init__(self, embedding_entries: int, result_entries: int, ttl_seconds: float):
+        self.embeddings = LRUCache(embedding_entries)
+        self.results = LRUCache(result_entries)
+        self.ttl_seconds = ttl_seconds
+        self.saved_seconds = 0.0
+        self._generation = None
+
+    def get_embedding(self, question: str) -> Optional[List[float]]:
+        entry = self.embeddings.get(question)
+        if entry is None:
+            return None
+        vector, cost = entry
+        self.saved_seconds += cost
+        return vector.tolist()
+
+    def put_embedding(self, question: str, vector: List[float], cost: float):
+        # float32 arrays take a fraction of the memory of a list of Python floats
+        self.embeddings.put(question, (array("f", vector), cost))
+
+    @staticmethod
+    def result_key(vector: List[float], k: int, where: Optional[Dict] = None) -> tuple:
+        digest = hashlib.sha1(array("f", vector).tobytes()).hexdigest()
+        return (digest, k, json.dumps(where, sort_keys=True) if where else None)
+
+    def _check_generation(self):
+        generation = current_generation()
+        if generation != self._generation:
+            self.results.clear()
+            self._generation = generation
+
+    def get_results(self, key: tuple) -> Optional[List]:
+        self._check_generation()
+        now = time.monotonic()
+        entry = self.results.get(key, is_valid=lambda value: now <= value[1])
+        if entry is None:
+            return None
+        docs, _, cost = entry
+        self.saved_seconds += cost
+        return docs
+
+    def put_results(self, key: tuple, docs: List, cost: float):
+        #Results computed while the corpus changed may already be stale
+        if current_generation() != self._generation:
+            return
+        self.results.put(key, (docs, time.monotonic() + self.ttl_seconds, cost))
+
+    def stats(self) -> Dict[str, Any]:
+        def level(cache: LRUCache) -> Dict[str, Any]:
+            lookups = cache.hits + cache.misses
+            return {
+                "entries": len(cache),
+                "max_entries": cache.max_entries,
+                "hits": cache.hits,
+                "misses": cache.misses,
+                "hit_rate": cache.hits / lookups if lookups else 0.0,
+            }
+
+        return {
+            "question_embeddings": level(self.embeddings),
+            "results": level(self.results) | {"ttl_seconds": self.ttl_seconds, "corpus_generation": self._generation},
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
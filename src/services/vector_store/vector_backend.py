@@ -0,0 +1,83 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+    from langchain_core.documents import Document
+
+
+class VectorStoreBackend(ABC):
+    """
+    Storage of embedded chunks used by ingestion, deletion and retrieval. Methods are blocking and are called through asyncio.to_thread.
+    Filters ("where") use the Chroma syntax: {field: value}, {field: {"$gt": value}}, {"$and": [...]}, {"$or": [...]}
+    """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], texts: List[str], vectors: List[List[float]], metadatas: List[Dict]):
+        """
+        Stores chunks along with their embeddings, replacing chunks with the same ids
+        """
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+        """
+        Replaces the metadata of existing chunks
+        """
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: int = 0, include_embeddings: bool = False) -> Dict[str, List[Any]]:
+        """
+        Returns the chunks matching the ids and/or filter as {"ids", "documents", "metadatas"} lists, plus "embeddings" if requested
+        """
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        """
+        Deletes the chunks matching the ids and/or filter
+        """
+
+    @abstractmethod
+    def search(self, vector: List[float], k: int, where: Optional[Dict] = None) -> List["Document"]:
+        """
+        Returns the k chunks closest to the vector that match the filter, closest first
+        """
+
+    @abstractmethod
+    def count(self) -> int:
+        """
+        Returns the number of chunks stored
+        """
+
+
+class ChromaBackend(VectorStoreBackend):
+    """
+    Chunks stored in a Chroma collection, either on local disk or on a Chroma server
+    """
+
+    def __init__(self, chroma: "Chroma"):
+        self.chroma = chroma
+        self.collection = chroma._collection
+
+    def upsert(self, ids, texts, vectors, metadatas):
+        self.collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        result = self.collection.get(ids=ids, where=where, limit=limit, offset=offset or None, include=include)
+        chunks = {"ids": result["ids"], "documents": result["documents"], "metadatas": result["metadatas"]}
+        if include_embeddings:
+            chunks["embeddings"] = [list(vector) for vector in result["embeddings"]]
+        return chunks
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def search(self, vector, k, where=None):
+        return self.chroma.similarity_search_by_vector(vector, k=k, filter=where)
+
+    def count(self):
+        return self.collection.count()
@@ -1,54 +1,394 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-
-from typing import Dict
+from typing import Dict, List, Optional, Callable, Awaitable, TYPE_CHECKING
+import threading
 import asyncio
+import time
+import uuid
 
 from src.core.config.settings import settings
 from src.core.logging.logger import logger
+from src.core.observability import tracing
+from src.core.observability.tracing import span
+from src.services.vector_store.retrieval_cache import bump_generation
+from src.services.expiry.policy import expiry_timestamp
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+    from src.services.vector_store.embedding_cache import EmbeddingCache, CachedEmbeddings
+    from src.services.vector_store.embedding_scheduler import EmbeddingScheduler
+    from src.services.vector_store.keyword_index import KeywordIndex
+    from src.services.vector_store.full_vectors import FullVectorStore
+    from src.services.vector_store.vector_backend import VectorStoreBackend
+
+#Chunks written to the vector store per upsert call
+UPSERT_BATCH_SIZE = 1000
+
+#Namespace of the chunk ids derived from the file and the chunk position
+CHUNK_ID_NAMESPACE = uuid.UUID("5f0c8e3a-2d1b-4c7e-9a61-3b8f4d2e7c10")
+
+#Chunks read from the vector store per call when rebuilding the keyword index or backfilling metadata
+REBUILD_BATCH_SIZE = 5000
+
+#The embedding model and the vector store are created on first use, importing LangChain, Chroma and OpenAI
+#takes seconds and processes that never touch them (or only later) should not pay for it at start up
+embedding_scheduler: "EmbeddingScheduler" = None
+query_embeddings: "Embeddings" = None
+embedding_cache: "EmbeddingCache" = None
+embeddings: "CachedEmbeddings" = None
+vector_store: "VectorStoreBackend" = None
+keyword_index: "KeywordIndex" = None
+full_vectors: "FullVectorStore" = None
+_init_lock = threading.RLock()
+
+#Time spent in each stage of embed_and_store, summed over all ingestions. Parsing runs ahead of the other stages,
+#only the time spent waiting for a parsed window is counted
+ingest_metrics: Dict[str, float] = {
+    "documents": 0,
+    "pages": 0,
+    "chunks": 0,
+    "parse_seconds": 0.0,
+    "split_seconds": 0.0,
+    "embed_seconds": 0.0,
+    "store_seconds": 0.0,
+}
+
+
+def _init_embeddings():
+    global embedding_scheduler, query_embeddings, embedding_cache, embeddings
+    from src.services.vector_store.embedding_cache import EmbeddingCache, CachedEmbeddings
+    from src.services.vector_store.embedding_scheduler import EmbeddingScheduler, ScheduledEmbeddings
+
+    #Declaring the embedding model
+    if settings.EMBEDDING_BACKEND == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        embedding_model = DeterministicFakeEmbedding(size=settings.FAKE_EMBEDDING_DIMENSIONS)
+        embedding_model_name = f"fake-{settings.FAKE_EMBEDDING_DIMENSIONS}"
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        embedding_model = OpenAIEmbeddings(model=settings.EMBEDDING_MODEL)
+        embedding_model_name = settings.EMBEDDING_MODEL
+
+    #All embedding requests of the process are batched and rate limited by one scheduler
+    embedding_scheduler = EmbeddingScheduler(
+        embedding_model,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        max_batch_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+        max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+        max_retries=settings.EMBEDDING_MAX_RETRIES,
+        linger_seconds=settings.EMBEDDING_BATCH_LINGER_MS / 1000,
+    )
+
+    #Questions are embedded through the scheduler too, but are not worth keeping in the chunk cache
+    query_embeddings = ScheduledEmbeddings(embedding_scheduler)
+
+    #Chunk embeddings are served from the on-disk cache when possible
+    embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_BYTES)
+    embeddings = CachedEmbeddings(query_embeddings, embedding_cache, embedding_model_name)
+    logger.info(f"Initialized {embedding_model_name} embeddings")
+
+
+def get_embeddings() -> "CachedEmbeddings":
+    """
+    Returns the embeddings used for document chunks, backed by the embedding cache
+    """
+    with _init_lock:
+        if embeddings is None:
+            _init_embeddings()
+    return embeddings
+
+
+def get_query_embeddings() -> "Embeddings":
+    """
+    Returns the embeddings used for questions, which bypass the chunk cache
+    """
+    with _init_lock:
+        if query_embeddings is None:
+            _init_embeddings()
+    return query_embeddings
+
+
+def get_embedding_cache() -> "EmbeddingCache":
+    with _init_lock:
+        if embedding_cache is None:
+            _init_embeddings()
+    return embedding_cache
+
+
+def get_vector_store() -> "VectorStoreBackend":
+    """
+    Returns the vector store selected by VECTOR_BACKEND: Chroma, from the local directory or from a Chroma server shared by several processes,
+    or the memory-mapped NumPy store
+    """
+    global vector_store
+    with _init_lock:
+        if vector_store is None:
+            if settings.VECTOR_BACKEND == "numpy":
+                from src.services.vector_store.numpy_store import NumpyVectorStore
+
+                vector_store = NumpyVectorStore(
+                    settings.NUMPY_STORE_DIR,
+                    dtype=settings.NUMPY_STORE_DTYPE,
+                    ivf_lists=settings.NUMPY_STORE_IVF_LISTS,
+                    ivf_nprobe=settings.NUMPY_STORE_IVF_NPROBE,
+                    compact_ratio=settings.NUMPY_STORE_COMPACT_RATIO,
+                )
+            else:
+                from langchain_chroma import Chroma
+                from src.services.vector_store.vector_backend import ChromaBackend
+
+                #Instantiating the vector store
+                if settings.CHROMA_HOST:
+                    import chromadb
+                    chroma = Chroma(
+                    collection_name="documents_colelction",
+                    embedding_function=get_embeddings(),
+                    client=chromadb.HttpClient(host=settings.CHROMA_HOST, port=settings.CHROMA_PORT),
+                    )
+                else:
+                    chroma = Chroma(
+                    collection_name="documents_colelction",
+                    embedding_function=get_embeddings(),
+                    persist_directory=settings.VECTOR_DB_DIR,
+                    )
+                vector_store = ChromaBackend(chroma)
+            logger.info(f"Opened the {settings.VECTOR_BACKEND} vector store")
+    return vector_store
+
+
+def _rebuild_keyword_index(index: "KeywordIndex"):
+    """
+    Indexes every chunk already in the vector store, for stores created before the keyword index existed
+    """
+    offset = 0
+    while True:
+        batch = get_vector_store().get(limit=REBUILD_BATCH_SIZE, offset=offset)
+        if not batch["ids"]:
+            break
+        index.add(batch["ids"], [metadata.get("filename", "") for metadata in batch["metadatas"]], batch["documents"])
+        offset += len(batch["ids"])
+    if offset:
+        logger.info(f"Rebuilt the keyword index from {offset} chunks in the vector store")
+
+
+def get_keyword_index() -> "KeywordIndex":
+    """
+    Returns the BM25 keyword index kept alongside the vector store, building it from the vector store if it is empty
+    """
+    global keyword_index
+    with _init_lock:
+        if keyword_index is None:
+            from src.services.vector_store.keyword_index import KeywordIndex
+
+            index = KeywordIndex(settings.KEYWORD_INDEX_PATH)
+            if index.count() == 0:
+                _rebuild_keyword_index(index)
+            keyword_index = index
+    return keyword_index
+
+
+def get_full_vectors() -> Optional["FullVectorStore"]:
+    """
+    Returns the store of full dimension vectors used for re-ranking, or None when the vector store keeps full vectors itself
+    """
+    global full_vectors
+    if not settings.EMBEDDING_DIMENSIONS:
+        return None
+    with _init_lock:
+        if full_vectors is None:
+            from src.services.vector_store.full_vectors import FullVectorStore
+            full_vectors = FullVectorStore(settings.FULL_VECTOR_STORE_PATH)
+    return full_vectors
 
 
-#Declaring the embedding model
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+def _upsert_chunks(ids: List[str], texts: List[str], vectors: List[List[float]], metadatas: List[Dict]):
+    """
+    Writes already embedded chunks to the vector store. With EMBEDDING_DIMENSIONS set, the vector store gets the truncated vectors
+    and the full ones are kept aside for re-ranking
+    """
+    filenames = [metadata.get("filename", "") for metadata in metadatas]
+    full_store = get_full_vectors()
+    if full_store is not None and vectors and len(vectors[0]) > settings.EMBEDDING_DIMENSIONS:
+        from src.services.vector_store.full_vectors import truncate
+
+        full_store.add(ids, filenames, vectors)
+        vectors = truncate(vectors, settings.EMBEDDING_DIMENSIONS)
 
-#Instantiating the vector store
-vector_store = Chroma(
-collection_name="documents_colelction",
-embedding_function=embeddings,
-persist_directory="./document_vector_db",
-)
+    for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+        end = start + UPSERT_BATCH_SIZE
+        get_vector_store().upsert(ids[start:end], texts[start:end], vectors[start:end], metadatas[start:end])
+    get_keyword_index().add(ids, filenames, texts)
 
 
-async def embed_and_store(pdf_path: str, metadata: Dict):
+def _reuse_existing_chunks(metadata: Dict) -> bool:
+    """
+    Looks for chunks of a previously uploaded file with the same content hash and, if found, stores them under the new metadata without embedding them again.
+    Returns True if the existing chunks could be reused
+    """
+    vector_store = get_vector_store()
+    existing = vector_store.get(where={"content_hash": metadata["content_hash"]}, include_embeddings=True)
+    if not existing["ids"]:
+        return False
+
+    #The same content may have been uploaded under several names, copying the chunks of one of them is enough
+    source_filename = existing["metadatas"][0].get("filename")
+    rows = [
+        (chunk_id, text, vector, chunk_metadata)
+        for chunk_id, text, vector, chunk_metadata in zip(existing["ids"], existing["documents"], existing["embeddings"], existing["metadatas"])
+        if chunk_metadata.get("filename") == source_filename
+    ]
+
+    if source_filename == metadata["filename"]:
+        #Same file uploaded again, only the metadata (e.g. the expiry date) needs refreshing
+        vector_store.update_metadata([row[0] for row in rows], [row[3] | metadata for row in rows])
+        logger.info(f"{metadata['filename']} is already stored with the same content, refreshed its metadata")
+        return True
+
+    #The vector store only holds truncated vectors, the copies get the full ones again
+    full_store = get_full_vectors()
+    full = full_store.get([row[0] for row in rows]) if full_store is not None else {}
+    _upsert_chunks(
+        [str(uuid.uuid4()) for _ in rows],
+        [row[1] for row in rows],
+        [list(full[row[0]]) if row[0] in full else list(row[2]) for row in rows],
+        [row[3] | metadata for row in rows],
+    )
+    logger.info(f"Reused {len(rows)} chunks of {source_filename} for {metadata['filename']}, identical content")
+    return True
+
+
+def _chunk_ids(metadata: Dict, chunks: List["Document"]) -> List[str]:
+    """
+    Derives the id of every chunk from the file, its content and the chunk's position in its page, so storing a window again
+    after an interrupted ingestion replaces its chunks instead of duplicating them
     """
-    Accepts a PDF path, converts it to embedding and stores it in a vector database
+    ids = []
+    positions: Dict[int, int] = {}
+    for chunk in chunks:
+        page = chunk.metadata.get("page", 0)
+        positions[page] = positions.get(page, -1) + 1
+        ids.append(str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{metadata.get('content_hash', '')}/{metadata['filename']}/{page}/{positions[page]}")))
+    return ids
+
+
+async def embed_and_store(
+    pdf_path: str,
+    metadata: Dict,
+    start_page: int = 0,
+    on_progress: Optional[Callable[[int, Optional[int], int], Awaitable[None]]] = None,
+):
+    """
+    Accepts a PDF path, converts it to embedding and stores it in a vector database.
+    The PDF is streamed INGEST_WINDOW_PAGES pages at a time: each window is parsed, split, embedded and stored before the next one,
+    so memory does not grow with the document and its first chunks are searchable while the rest is still being processed
     Args:
         pdf_path (str) : THe path to the PDF to be processed
-        metadata (dict) : Metadata related to teh PDF document
+        metadata (dict) : Metadata related to teh PDF document. If it holds a "content_hash", a file with identical content is not embedded again
+        start_page (int) : First page to process, to resume an interrupted ingestion from its last checkpoint
+        on_progress (callable) : Awaited with (pages done, total pages, chunks stored) once before the first window and after every stored window
     """
     logger.info(f"Metadata:  {metadata}")
-    
-    #Loading the PDF
-    loader = PyMuPDFLoader(pdf_path)
-    data = await asyncio.to_thread(loader.load)
-    
 
-    #Splitting the document into text chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    all_splits = await asyncio.to_thread(text_splitter.split_documents, data)
+    #A resumed ingestion already stored chunks of this content, they must not be mistaken for an earlier upload
+    if start_page == 0 and metadata.get("content_hash"):
+        with span("vector_store.reuse"):
+            reused = await asyncio.to_thread(_reuse_existing_chunks, metadata)
+        if reused:
+            bump_generation()
+            await delete_stale_versions(metadata["filename"], metadata["content_hash"])
+            return
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from src.services.vector_store import pdf_loader
+
+    if on_progress:
+        await on_progress(start_page, None, 0)
+
+    #Pages are split one by one, so splitting a window gives the same chunks as splitting the whole document.
+    #The position of every chunk in its page lets retrieval merge overlapping chunks back together
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP, add_start_index=True)
+    pages_done, stored = start_page, 0
+    windows = pdf_loader.iter_pages(pdf_path, start_page)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                pages = await anext(windows)
+            except StopAsyncIteration:
+                break
+            split_started = time.perf_counter()
+            splits = await asyncio.to_thread(text_splitter.split_documents, pages)
+            embed_started = time.perf_counter()
+
+            #Injecting custom metadata
+            for doc in splits:
+                doc.metadata.update(metadata)
+
+            #Embedding the chunks, chunks seen before are served from the embedding cache
+            texts = [doc.page_content for doc in splits]
+            if texts:
+                vectors = await get_embeddings().aembed_documents(texts)
+                store_started = time.perf_counter()
+                await asyncio.to_thread(_upsert_chunks, _chunk_ids(metadata, splits), texts, vectors, [doc.metadata for doc in splits])
+                bump_generation()
+                stored_at = time.perf_counter()
+                ingest_metrics["embed_seconds"] += store_started - embed_started
+                ingest_metrics["store_seconds"] += stored_at - store_started
+                tracing.record("vector_store.embed", store_started - embed_started, chunks=len(texts))
+                tracing.record("vector_store.store", stored_at - store_started, chunks=len(texts))
+            ingest_metrics["parse_seconds"] += split_started - started
+            ingest_metrics["split_seconds"] += embed_started - split_started
+            tracing.record("vector_store.parse", split_started - started, pages=len(pages))
+            tracing.record("vector_store.split", embed_started - split_started, chunks=len(splits))
+            ingest_metrics["pages"] += len(pages)
+            ingest_metrics["chunks"] += len(splits)
+
+            pages_done = pages[-1].metadata["page"] + 1
+            stored += len(splits)
+            if on_progress:
+                await on_progress(pages_done, pages[-1].metadata["total_pages"], len(splits))
+    finally:
+        await windows.aclose()
+    ingest_metrics["documents"] += 1
+    #The new content is fully stored, the chunks of an earlier upload under the same name can go
+    if metadata.get("content_hash"):
+        await delete_stale_versions(metadata["filename"], metadata["content_hash"])
+
+    logger.info(f"Successfully added {metadata["filename"]} to vector store, {stored} chunks from pages {start_page}-{pages_done}")
 
-    #Injecting custom metadata
-    for doc in all_splits:
-        doc.metadata.update(metadata)
 
-    
+async def delete_partial_document(filename: str, content_hash: str):
+    """
+    Deletes the chunks an ingestion of the given file and content stored before it failed for good
+    """
+    where = {"$and": [{"filename": filename}, {"content_hash": content_hash}]}
+    chunk_ids = (await asyncio.to_thread(get_vector_store().get, where=where))["ids"]
+    if not chunk_ids:
+        return
+    with span("vector_store.delete", chunks=len(chunk_ids)):
+        await asyncio.to_thread(get_vector_store().delete, ids=chunk_ids)
+        await asyncio.to_thread(get_keyword_index().delete_ids, chunk_ids)
+        if get_full_vectors() is not None:
+            await asyncio.to_thread(get_full_vectors().delete_ids, chunk_ids)
+    bump_generation()
+    logger.info(f"Deleted {len(chunk_ids)} chunks stored by the failed ingestion of {filename}")
+
 
-    #Adding chunks to the vector store
-    await vector_store.aadd_documents(all_splits)
+async def delete_stale_versions(filename: str, content_hash: str):
+    """
+    Deletes the chunks of the given file whose content differs from content_hash, left by earlier uploads of the same filename
+    """
+    where = {"$and": [{"filename": filename}, {"content_hash": {"$ne": content_hash}}]}
+    chunk_ids = (await asyncio.to_thread(get_vector_store().get, where=where))["ids"]
+    if not chunk_ids:
+        return
+    with span("vector_store.delete", chunks=len(chunk_ids)):
+        await asyncio.to_thread(get_vector_store().delete, ids=chunk_ids)
+        await asyncio.to_thread(get_keyword_index().delete_ids, chunk_ids)
+        if get_full_vectors() is not None:
+            await asyncio.to_thread(get_full_vectors().delete_ids, chunk_ids)
+    bump_generation()
+    logger.info(f"Deleted {len(chunk_ids)} chunks of earlier versions of {filename}")
 
-    logger.info(f"Successfully added {metadata["filename"]} to vector store")
 
 async def delete_by_filename(filename: str):
     """
@@ -56,11 +396,84 @@ async def delete_by_filename(filename: str):
     Args:
         filename (str) : The file to be deleted
     """
-    logger.info(f"Deleting vector chunks for file: {filename}") 
-    try:  
-        await vector_store.adelete(where={"filename": filename})
+    logger.info(f"Deleting vector chunks for file: {filename}")
+    try:
+        with span("vector_store.delete", files=1):
+            await asyncio.to_thread(get_vector_store().delete, where={"filename": filename})
+            await asyncio.to_thread(get_keyword_index().delete_filenames, [filename])
+            if get_full_vectors() is not None:
+                await asyncio.to_thread(get_full_vectors().delete_filenames, [filename])
+        bump_generation()
     except Exception as e:
         logger.error(f"Failed to delete file chunks from vector store. Error: {e}")
     logger.info("Successfully deleted chunks for the file")
 
 
+async def delete_by_filenames(filenames: List[str]):
+    """
+    Deletes the chunks of all the given files from the vector store with a single filtered delete, and from the keyword index
+    Args:
+        filenames (list) : The files to be deleted
+    Raises:
+        Exception : If the vector store delete failed, so the caller can report it and retry
+    """
+    logger.info(f"Deleting vector chunks for {len(filenames)} files")
+    with span("vector_store.delete", files=len(filenames)):
+        await asyncio.to_thread(get_vector_store().delete, where={"filename": {"$in": filenames}})
+        await asyncio.to_thread(get_keyword_index().delete_filenames, filenames)
+        if get_full_vectors() is not None:
+            await asyncio.to_thread(get_full_vectors().delete_filenames, filenames)
+    bump_generation()
+    logger.info(f"Successfully deleted chunks for {len(filenames)} files")
+
+
+def backfill_expiry() -> int:
+    """
+    Adds the numeric "expiry_ts" to chunks stored before it existed, computed from their "expiry date".
+    Retrieval filters on "expiry_ts", chunks without it would never be returned. Returns the number of chunks updated
+    """
+    vector_store = get_vector_store()
+    updated = 0
+    offset = 0
+    while True:
+        batch = vector_store.get(limit=REBUILD_BATCH_SIZE, offset=offset)
+        if not batch["ids"]:
+            break
+        legacy = [(chunk_id, metadata) for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]) if "expiry_ts" not in metadata]
+        if legacy:
+            vector_store.update_metadata(
+                [chunk_id for chunk_id, _ in legacy],
+                [metadata | {"expiry_ts": expiry_timestamp(metadata.get("expiry date"))} for _, metadata in legacy],
+            )
+            updated += len(legacy)
+        offset += len(batch["ids"])
+
+    if updated:
+        bump_generation()
+        logger.info(f"Backfilled the expiry timestamp of {updated} chunks")
+    return updated
+
+
+def delete_expired_chunks(cutoff: int, limit: int) -> List[str]:
+    """
+    Deletes up to limit chunks that expired at or before cutoff (epoch seconds) from the vector store and the keyword index.
+    Returns the filenames the deleted chunks belonged to
+    """
+    expired = get_vector_store().get(where={"expiry_ts": {"$lte": cutoff}}, limit=limit)
+    if not expired["ids"]:
+        return []
+    get_vector_store().delete(ids=expired["ids"])
+    get_keyword_index().delete_ids(expired["ids"])
+    if get_full_vectors() is not None:
+        get_full_vectors().delete_ids(expired["ids"])
+    bump_generation()
+    return [metadata.get("filename", "") for metadata in expired["metadatas"]]
+
+
+async def maintain():
+    """
+    Runs the periodic maintenance of the vector store backend, if it has any (compaction and quantizer training for the NumPy store)
+    """
+    vector_store = get_vector_store()
+    if hasattr(vector_store, "maintain"):
+        await asyncio.to_thread(vector_store.maintain)
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+
+from langchain_core.documents import Document
+
+from src.mcp.conversation_context import ConversationContext, message_tokens
+from src.services.vector_store.context_assembly import assemble, count_tokens
+
+SENTENCE = "The supplier agreement sets the maintenance interval of part PN4711 to twelve months. "
+
+
+class _Summarizer:
+    def __init__(self):
+        self.calls = 0
+        #The summary every call extended
+        self.extended = []
+
+    async def __call__(self, summary: str, messages: list) -> str:
+        self.calls += 1
+        self.extended.append(summary)
+        return f"summary {self.calls}"
+
+
+class ConversationContextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.summarize = _Summarizer()
+        self.context = ConversationContext("You answer questions about documents.", self.summarize, history_budget=600, summary_tokens=50)
+
+    def chat(self, turns: int, answer_parts: int = 1, answer_sentences: int = 2) -> list:
+        """
+        Runs the turns through build and after_turn like the chat handler, with answers streamed around tool calls as several
+        assistant messages. Returns the prompt of every turn
+        """
+        async def run():
+            history, prompts = [], []
+            for turn in range(turns):
+                message = f"Question {turn}: " + SENTENCE
+                prompts.append(await self.context.build("session", history, message))
+                answer = [{"role": "assistant", "content": f"Part {part} of answer {turn}: " + SENTENCE * answer_sentences} for part in range(answer_parts)]
+                response = "\n\n".join(part["content"] for part in answer)
+                tool_call = {"role": "assistant", "content": "search_documents", "metadata": {"title": "Searching the documents"}}
+                history = history + [{"role": "user", "content": message}, tool_call] + answer
+                self.context.after_turn("session", history[:-len(answer) - 2], message, response)
+                await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return prompts
+        return asyncio.run(run())
+
+    def test_prompts_stay_within_the_history_budget(self):
+        prompts = self.chat(30)
+        for prompt in prompts:
+            self.assertLessEqual(message_tokens(prompt[1:]), self.context.history_budget)
+        self.assertTrue(prompts[-1][1]["content"].startswith("Summary of the earlier conversation:"))
+        #The recent turns are kept verbatim, the new message last
+        self.assertEqual(prompts[-1][-1]["content"], "Question 29: " + SENTENCE)
+
+    def test_summary_survives_answers_split_around_tool_calls(self):
+        #Answers longer than the verbatim part of the history, so folds cover the answer just given
+        prompts = self.chat(30, answer_parts=2, answer_sentences=6)
+        #The summary is extended turn after turn, never thrown away and rebuilt from scratch
+        self.assertGreater(self.summarize.calls, 10)
+        self.assertEqual(self.summarize.extended, [""] + [f"summary {call}" for call in range(1, self.summarize.calls)])
+        for prompt in prompts:
+            self.assertLessEqual(message_tokens(prompt[1:]), self.context.history_budget)
+
+
+def _chunk(text: str, page: int, start: int, filename: str = "manual.pdf") -> Document:
+    return Document(page_content=text, metadata={"filename": filename, "page": page, "start_index": start})
+
+
+class AssembleTest(unittest.TestCase):
+
+    def test_overlapping_chunks_of_a_page_are_merged_under_one_citation(self):
+        text = SENTENCE * 4
+        context = assemble([_chunk(text[:200], 0, 0), _chunk(text[150:], 0, 150)], budget_tokens=1000)
+        self.assertEqual(context, "[1] manual.pdf p.1\n" + text.strip())
+
+    def test_near_duplicate_passages_are_dropped(self):
+        docs = [_chunk(SENTENCE * 3, 0, 0), _chunk(SENTENCE * 3, 4, 0, "copy.pdf"), _chunk("Warranty claims are handled by the vendor.", 2, 0)]
+        context = assemble(docs, budget_tokens=1000)
+        self.assertIn("[1] manual.pdf p.1", context)
+        self.assertNotIn("copy.pdf", context)
+        self.assertIn("[2] manual.pdf p.3\nWarranty claims", context)
+
+    def test_context_fits_the_token_budget(self):
+        docs = [_chunk(f"Section {n}. " + SENTENCE * 10, n, 0, f"{n}.pdf") for n in range(10)]
+        for budget in (30, 100, 250, 1000):
+            context = assemble(docs, budget_tokens=budget, duplicate_similarity=1.1)
+            self.assertLessEqual(count_tokens(context), budget)
+            self.assertTrue(context.startswith("[1] 0.pdf p.1\nSection 0."))
+        #The most relevant passage is cut to the budget rather than left out
+        self.assertTrue(assemble(docs, budget_tokens=30, duplicate_similarity=1.1).endswith(" …"))
+
+    def test_passages_given_earlier_are_referred_to(self):
+        cited = {}
+        assemble([_chunk(SENTENCE, 0, 0)], budget_tokens=1000, cited=cited)
+        context = assemble([_chunk(SENTENCE, 0, 0), _chunk("Warranty claims are handled by the vendor.", 1, 0)], budget_tokens=1000, cited=cited)
+        self.assertEqual(context, "[1] manual.pdf p.1 (given above)\n\n[2] manual.pdf p.2\nWarranty claims are handled by the vendor.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from bson import ObjectId
+
+from src.database import database
+
+
+def _matches(document: dict, filter: dict) -> bool:
+    """
+    The subset of the MongoDB query language list_documents uses
+    """
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(_matches(document, clause) for clause in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(field)
+            for op, bound in condition.items():
+                if op == "$gt" and not value > bound:
+                    return False
+                if op == "$gte" and not value >= bound:
+                    return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self):
+        return self.documents
+
+
+class _Collection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, filter, projection=None):
+        found = [dict(document) for document in self.documents if _matches(document, filter)]
+        if projection:
+            found = [{field: value for field, value in document.items() if field in projection or field == "_id"} for document in found]
+        return _Cursor(found)
+
+
+class KeysetPaginationTest(unittest.TestCase):
+
+    def setUp(self):
+        #Many documents share an expiry, pages must break ties on _id
+        self.documents = [
+            {"_id": ObjectId(), "filename": f"{n:03}.pdf", "expiry_ts": 1000 + n // 7, "owner": "a" if n % 3 else "b"}
+            for n in range(50)
+        ]
+        patch = mock.patch.object(database, "db", {"documents_collection": _Collection(self.documents)})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def pages(self, filter: dict, order: str, limit: int, projection=None) -> list:
+        async def walk():
+            pages, cursor = [], None
+            while True:
+                page, cursor = await database.list_documents(filter, order, limit, cursor, projection)
+                pages.append(page)
+                if cursor is None:
+                    return pages
+        return asyncio.run(walk())
+
+    def test_every_document_is_listed_once_in_order(self):
+        for order, key in (("filename", lambda d: d["filename"]), ("expiry", lambda d: (d["expiry_ts"], d["_id"]))):
+            pages = self.pages({}, order, 6)
+            listed = [document["id"] for page in pages for document in page]
+            expected = [str(document["_id"]) for document in sorted(self.documents, key=key)]
+            self.assertEqual(listed, expected, order)
+            self.assertTrue(all(len(page) == 6 for page in pages[:-1]))
+
+    def test_filter_and_projection_apply_on_every_page(self):
+        pages = self.pages({"owner": "b"}, "expiry", 4, ["filename"])
+        listed = [document for page in pages for document in page]
+        self.assertEqual(len(listed), sum(document["owner"] == "b" for document in self.documents))
+        #The keyset fields are read to build the cursor but only the requested fields are returned
+        self.assertTrue(all(set(document) == {"id", "filename"} for document in listed))
+
+    def test_cursor_round_trip(self):
+        values = [1234, ObjectId()]
+        self.assertEqual(database.decode_cursor(database.encode_cursor(values)), values)
+        with self.assertRaises(ValueError):
+            database.decode_cursor("not a cursor")
+
+
+if __name__ == "__main__":
+    unittest.main()
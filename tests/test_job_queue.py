@@ -0,0 +1,131 @@
+import asyncio
+import copy
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.core.config.settings import settings
+from src.services.ingestion import job_queue
+
+
+class _Jobs:
+    """
+    In-memory stand-in for the jobs collection
+    """
+
+    def __init__(self, insert_delay: float = 0.0):
+        self.documents = {}
+        self.insert_delay = insert_delay
+
+    async def insert_one(self, document):
+        await asyncio.sleep(self.insert_delay)
+        self.documents[document["_id"]] = copy.deepcopy(document)
+
+    async def delete_one(self, filter):
+        self.documents.pop(filter["_id"], None)
+
+    async def find_one(self, filter, projection=None):
+        document = self.documents.get(filter["_id"])
+        return copy.deepcopy(document)
+
+    async def update_one(self, filter, update):
+        document = self.documents[filter["_id"]]
+        for path, value in update["$set"].items():
+            *parents, field = path.split(".")
+            target = document
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[field] = value
+
+
+class JobQueueTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.jobs = _Jobs(insert_delay=0.01)
+        for patch in (
+            mock.patch.object(job_queue, "db", {job_queue.JOBS_COLLECTION: self.jobs}),
+            mock.patch.object(job_queue, "queue", None),
+            mock.patch.object(settings, "INGESTION_STAGE_ATTEMPTS", 3),
+            mock.patch.object(settings, "INGESTION_RETRY_DELAY_SECONDS", 0),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def spool_file(self) -> str:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as f:
+            f.write(b"%PDF")
+        self.addCleanup(lambda: os.path.exists(f.name) and os.remove(f.name))
+        return f.name
+
+    async def test_concurrent_submissions_never_overfill_the_queue(self):
+        job_queue.queue = asyncio.Queue(maxsize=2)
+        outcomes = await asyncio.gather(*[job_queue.submit_job("/spool", {"filename": f"{n}.pdf"}) for n in range(5)], return_exceptions=True)
+        accepted = [outcome for outcome in outcomes if isinstance(outcome, str)]
+        self.assertEqual(len(accepted), 2)
+        self.assertTrue(all(isinstance(outcome, asyncio.QueueFull) for outcome in outcomes if not isinstance(outcome, str)))
+        #Rejected jobs leave nothing behind for the recovery to resume
+        self.assertEqual(set(self.jobs.documents), set(accepted))
+
+    async def test_a_job_that_cannot_be_queued_is_not_recorded(self):
+        job_queue.queue = asyncio.Queue(maxsize=1)
+        submission = asyncio.create_task(job_queue.submit_job("/spool", {"filename": "a.pdf"}))
+        await asyncio.sleep(0)
+        job_queue.queue.put_nowait("recovered job")
+        with self.assertRaises(asyncio.QueueFull):
+            await submission
+        self.assertEqual(self.jobs.documents, {})
+
+    async def run_job(self, run_stage) -> dict:
+        job_queue.queue = asyncio.Queue(maxsize=10)
+        spool_path = self.spool_file()
+        job_id = await job_queue.submit_job(spool_path, {"filename": "a.pdf", "content_hash": "h"})
+        with mock.patch.object(job_queue, "_run_stage", run_stage):
+            await job_queue._run_job(job_id)
+        self.assertFalse(os.path.exists(spool_path))
+        return self.jobs.documents[job_id]
+
+    async def test_stages_run_in_order_and_failed_attempts_are_retried(self):
+        calls = []
+
+        async def run_stage(job, stage):
+            calls.append(stage)
+            if calls.count(stage) == 1 and stage == "vector_store":
+                raise RuntimeError("embedding API unavailable")
+
+        job = await self.run_job(run_stage)
+        self.assertEqual(calls, ["object_store", "vector_store", "vector_store", "metadata"])
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["stages"]["vector_store"]["attempts"], 1)
+        self.assertTrue(all(stage["status"] == "done" for stage in job["stages"].values()))
+
+    async def test_a_failed_vector_store_stage_removes_its_partial_chunks(self):
+        async def run_stage(job, stage):
+            if stage == "vector_store":
+                job["stages"]["vector_store"]["pages_done"] = 4
+                raise RuntimeError("parse error on page 5")
+
+        with mock.patch.object(job_queue.vector_store_ops, "delete_partial_document", mock.AsyncMock()) as delete_partial_document:
+            job = await self.run_job(run_stage)
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["error"], "parse error on page 5")
+        self.assertEqual(job["stages"]["vector_store"]["status"], "failed")
+        self.assertEqual(job["stages"]["metadata"]["status"], "pending")
+        delete_partial_document.assert_awaited_once_with("a.pdf", "h")
+
+    async def test_stages_done_before_a_restart_are_skipped(self):
+        job_queue.queue = asyncio.Queue(maxsize=10)
+        job_id = await job_queue.submit_job(self.spool_file(), {"filename": "a.pdf"})
+        self.jobs.documents[job_id]["stages"]["object_store"]["status"] = "done"
+        calls = []
+
+        async def run_stage(job, stage):
+            calls.append(stage)
+
+        with mock.patch.object(job_queue, "_run_stage", run_stage):
+            await job_queue._run_job(job_id)
+        self.assertEqual(calls, ["vector_store", "metadata"])
+
+
+if __name__ == "__main__":
+    unittest.main()
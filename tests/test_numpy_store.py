@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.services.vector_store.numpy_store import NumpyVectorStore
+
+
+def unit(n: int, dims: int = 8) -> list:
+    vector = [0.0] * dims
+    vector[n] = 1.0
+    return vector
+
+
+class NumpyVectorStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = NumpyVectorStore(self.directory.name)
+        self.store.upsert(
+            ["a", "b", "c"],
+            ["text a", "text b", "text c"],
+            [unit(0), unit(1), unit(2)],
+            [{"filename": "x.pdf", "expiry_ts": 100}, {"filename": "x.pdf", "expiry_ts": 200}, {"filename": "y.pdf", "expiry_ts": 300}],
+        )
+
+    def test_search_ranks_by_cosine_similarity(self):
+        docs = self.store.search([0.9, 0.1, 0, 0, 0, 0, 0, 0], 2)
+        self.assertEqual([doc.id for doc in docs], ["a", "b"])
+        self.assertEqual(docs[0].page_content, "text a")
+        self.assertEqual(docs[0].metadata, {"filename": "x.pdf", "expiry_ts": 100})
+
+    def test_filters(self):
+        self.assertEqual(self.store.get(where={"expiry_ts": {"$gt": 150}})["ids"], ["b", "c"])
+        self.assertEqual(self.store.get(where={"filename": {"$in": ["y.pdf"]}})["ids"], ["c"])
+        self.assertEqual(self.store.get(where={"$and": [{"filename": "x.pdf"}, {"expiry_ts": {"$lte": 100}}]})["ids"], ["a"])
+        self.assertEqual([doc.id for doc in self.store.search(unit(0), 3, {"filename": {"$ne": "x.pdf"}})], ["c"])
+
+    def test_updates_and_deletes_are_seen_by_filters(self):
+        self.assertEqual(self.store.get(where={"filename": "x.pdf"})["ids"], ["a", "b"])
+        self.store.update_metadata(["a"], [{"filename": "z.pdf", "expiry_ts": 100}])
+        self.assertEqual(self.store.get(where={"filename": "x.pdf"})["ids"], ["b"])
+        self.store.delete(where={"filename": "y.pdf"})
+        self.assertEqual(self.store.get()["ids"], ["a", "b"])
+        self.assertEqual(self.store.count(), 2)
+
+    def test_upserting_an_id_again_replaces_the_chunk(self):
+        self.store.upsert(["a"], ["new text a"], [unit(3)], [{"filename": "x.pdf", "expiry_ts": 400}])
+        self.assertEqual(self.store.count(), 3)
+        self.assertEqual(self.store.get(ids=["a"])["documents"], ["new text a"])
+        self.assertEqual([doc.id for doc in self.store.search(unit(3), 1)], ["a"])
+
+    def test_another_process_sees_writes_and_compactions(self):
+        reader = NumpyVectorStore(self.directory.name)
+        self.assertEqual(reader.count(), 3)
+
+        self.store.upsert(["d"], ["text d"], [unit(4)], [{"filename": "y.pdf", "expiry_ts": 500}])
+        self.store.delete(ids=["a"])
+        self.store.update_metadata(["b"], [{"filename": "y.pdf", "expiry_ts": 200}])
+        self.assertEqual(reader.get(where={"filename": "y.pdf"})["ids"], ["b", "c", "d"])
+        self.assertEqual(reader.count(), 3)
+
+        self.store.compact()
+        self.assertEqual(reader.get(where={"filename": "y.pdf"})["ids"], ["b", "c", "d"])
+        self.assertEqual([doc.id for doc in reader.search(unit(4), 1)], ["d"])
+
+    def test_int8_vectors_keep_the_ranking(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(200, 8))
+        self.store.upsert([str(n) for n in range(200)], ["t"] * 200, vectors.tolist(), [{} for _ in range(200)])
+        query = vectors[17] + rng.normal(scale=0.01, size=8)
+        self.assertEqual(self.store.search(query.tolist(), 1)[0].id, "17")
+
+
+if __name__ == "__main__":
+    unittest.main()
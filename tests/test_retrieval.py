@@ -0,0 +1,91 @@
+import tempfile
+import time
+import os
+import unittest
+from datetime import datetime, timezone, timedelta
+from unittest import mock
+
+from src.core.config.settings import settings
+from src.services.expiry.policy import NEVER_EXPIRES, expiry_timestamp, unexpired_filter
+from src.services.vector_store import retrieval, vector_store_ops
+from src.services.vector_store.keyword_index import KeywordIndex
+from src.services.vector_store.numpy_store import NumpyVectorStore
+
+
+def unit(n: int, dims: int = 8) -> list:
+    vector = [0.0] * dims
+    vector[n] = 1.0
+    return vector
+
+
+class HybridSearchTest(unittest.TestCase):
+    """
+    Reciprocal rank fusion of the vector and BM25 rankings, on a real NumPy store and keyword index
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = NumpyVectorStore(os.path.join(directory.name, "vectors"))
+        index = KeywordIndex(os.path.join(directory.name, "keywords.sqlite3"))
+        future, past = int(time.time()) + 3600, int(time.time()) - 3600
+        chunks = [
+            ("semantic", "general overview of the maintenance programme", unit(0), future),
+            ("both", "part PN4711 clause 7.3", unit(1), future),
+            ("keyword", "PN4711 is listed in the annex of the supplier agreement", unit(3), future),
+            ("expired", "part PN4711 clause 7.3 in an expired copy of the supplier agreement", unit(4), past),
+        ]
+        store.upsert(
+            [chunk[0] for chunk in chunks],
+            [chunk[1] for chunk in chunks],
+            [chunk[2] for chunk in chunks],
+            [{"filename": f"{chunk[0]}.pdf", "expiry_ts": chunk[3]} for chunk in chunks],
+        )
+        index.add([chunk[0] for chunk in chunks], [f"{chunk[0]}.pdf" for chunk in chunks], [chunk[1] for chunk in chunks])
+
+        for patch in (
+            mock.patch.object(vector_store_ops, "vector_store", store),
+            mock.patch.object(vector_store_ops, "keyword_index", index),
+            mock.patch.object(settings, "EMBEDDING_DIMENSIONS", 0),
+            mock.patch.object(settings, "HYBRID_CANDIDATES", 2),
+            mock.patch.object(settings, "RRF_K", 60),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.query = [1.0, 0.8, 0, 0, 0, 0, 0, 0]
+
+    def test_chunks_ranked_by_both_come_first(self):
+        docs = retrieval._hybrid_search("PN4711 clause 7.3", self.query, 2, unexpired_filter())
+        self.assertEqual([doc.id for doc in docs], ["both", "semantic"])
+
+    def test_keyword_only_chunks_surface(self):
+        docs = retrieval._hybrid_search("annex", self.query, 2, unexpired_filter())
+        self.assertEqual({doc.id for doc in docs}, {"semantic", "keyword"})
+        self.assertEqual(next(doc for doc in docs if doc.id == "keyword").metadata["filename"], "keyword.pdf")
+
+    def test_keyword_matches_are_filtered_by_expiry(self):
+        docs = retrieval._hybrid_search("expired copy", self.query, 4, unexpired_filter())
+        self.assertNotIn("expired", [doc.id for doc in docs])
+
+
+class ExpiryPolicyTest(unittest.TestCase):
+
+    def test_expiry_timestamp(self):
+        self.assertEqual(expiry_timestamp(None), NEVER_EXPIRES)
+        self.assertEqual(expiry_timestamp("2030-01-01T00:00:00"), int(datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp()))
+        paris = timezone(timedelta(hours=1))
+        self.assertEqual(expiry_timestamp(datetime(2030, 1, 1, 1, tzinfo=paris)), expiry_timestamp("2030-01-01T00:00:00"))
+
+    def test_unexpired_filter_is_stable_and_never_late(self):
+        with mock.patch.object(settings, "EXPIRY_FILTER_GRANULARITY_SECONDS", 300):
+            with mock.patch("time.time", return_value=1_000_001.0):
+                first = unexpired_filter()
+            with mock.patch("time.time", return_value=1_000_200.0):
+                second = unexpired_filter()
+        self.assertEqual(first, second)
+        #Rounded up, a chunk is hidden before it expires and never served after
+        self.assertEqual(first, {"expiry_ts": {"$gt": 1_000_200}})
+
+
+if __name__ == "__main__":
+    unittest.main()